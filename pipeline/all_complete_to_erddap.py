@@ -1,8 +1,8 @@
 import pathlib
-import pandas as pd
 import logging
 import subprocess
 from votoutils.upload.sync_functions import sync_script_dir
+from votoutils.utilities import job_state
 
 _log = logging.getLogger(__name__)
 
@@ -17,18 +17,13 @@ if __name__ == "__main__":
         datefmt="%Y-%m-%d %H:%M:%S",
     )
     _log.info("Start send to erddap")
-    df_reprocess = pd.read_csv(
-        "/home/pipeline/reprocess.csv",
-        parse_dates=["proc_time"],
-    )
-    df_reprocess.sort_values("proc_time", inplace=True)
-    df_reprocess.reset_index(inplace=True)
-    total = len(df_reprocess)
+    df_jobs = job_state.jobs(kind="raw", status="done")
+    total = len(df_jobs)
     _log.info(f"will send {total} files to erddap")
-    for i, row in df_reprocess.iterrows():
-        glider, mission, proc = row.glider, row.mission, row.proc_time
-        print(f"Will send file {i}/{total}: SEA{glider} M{mission}")
-        _log.info(f"Send file {i}/{total}: SEA{glider} M{mission}")
+    for i, row in df_jobs.iterrows():
+        glider, mission = row.platform_serial, row.mission
+        print(f"Will send file {i}/{total}: {glider} M{mission}")
+        _log.info(f"Send file {i}/{total}: {glider} M{mission}")
         subprocess.check_call(
             [
                 "/usr/bin/bash",
@@ -38,9 +33,9 @@ if __name__ == "__main__":
             ],
         )
         if pathlib.Path(
-            f"/data/data_l0_pyglider/complete_mission/SEA{glider}/M{mission}/ADCP/adcp.nc",
+            f"/data/data_l0_pyglider/complete_mission/{glider}/M{mission}/ADCP/adcp.nc",
         ).exists():
-            _log.info(f"Send adcp file {i}/{total}: SEA{glider} M{mission}")
+            _log.info(f"Send adcp file {i}/{total}: {glider} M{mission}")
             subprocess.check_call(
                 [
                     "/usr/bin/bash",
@@ -9,7 +9,7 @@ from votoutils.ctd.ctd import (
     ds_from_df,
     flag_ctd,
 )
-from votoutils.utilities.utilities import encode_times, mailer
+from votoutils.utilities.utilities import encode_times, mailer, apply_encoding_profile
 
 _log = logging.getLogger(__name__)
 
@@ -78,6 +78,7 @@ def main():
     ds = ds.rename(rename_dict)
     ds = flag_ctd(ds)
     ds = encode_times(ds)
+    ds = apply_encoding_profile(ds, "erddap")
     ds.to_netcdf("/data/ctd/ctd_deployment.nc")
     _log.info("Send ctds to ERDDAP")
     subprocess.check_call(
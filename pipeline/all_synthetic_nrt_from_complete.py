@@ -6,6 +6,8 @@ import polars as pl
 import shutil
 import gzip
 from votoutils.utilities.utilities import missions_no_proc
+from votoutils.utilities import raw_catalog
+from votoutils.utilities.seaexplorer_csv import read_seaexplorer_csv
 
 _log = logging.getLogger(__name__)
 logging.basicConfig(
@@ -17,43 +19,6 @@ logging.basicConfig(
 )
 
 
-def match_input_files(gli_infiles, pld_infiles):
-    gli_nums = []
-    for fname in gli_infiles:
-        parts = fname.name.split(".")
-        try:
-            gli_nums.append(int(parts[-1]))
-        except ValueError:
-            try:
-                gli_nums.append(int(parts[-2]))
-            except ValueError:
-                raise ValueError(
-                    "Unexpected gli file filename found in input. Aborting",
-                )
-    pld_nums = []
-    for fname in pld_infiles:
-        parts = fname.name.split(".")
-        try:
-            pld_nums.append(int(parts[-1]))
-        except ValueError:
-            try:
-                pld_nums.append(int(parts[-2]))
-            except ValueError:
-                raise ValueError(
-                    "Unexpected pld file filename found in input. Aborting",
-                )
-    good_cycles = set(pld_nums) & set(gli_nums)
-    good_gli_files = []
-    good_pld_files = []
-    for i, num in enumerate(gli_nums):
-        if num in good_cycles:
-            good_gli_files.append(gli_infiles[i])
-    for i, num in enumerate(pld_nums):
-        if num in good_cycles:
-            good_pld_files.append(pld_infiles[i])
-    return good_gli_files, good_pld_files
-
-
 def fix_seconds(first_timestamp):
     seconds = int(str(first_timestamp)[-2:])
     if seconds in [1, 31]:
@@ -77,7 +42,7 @@ def subsample_pld_file(pldfile):
     _log.debug(f"proc {pldfile}")
     fn = pldfile.name
     platform_serial, mission, _ = fn.split(".", maxsplit=2)
-    df = pl.read_csv(pldfile, separator=";", truncate_ragged_lines=True)
+    df = read_seaexplorer_csv(pldfile, truncate_ragged_lines=True, cast_numeric=False, parse_time=False)
     df = df.with_columns(
         (pl.col("PLD_REALTIMECLOCK").str.slice(0, 18) + "1").alias("time_seconds"),
     )
@@ -118,18 +83,11 @@ def synthetic_nrt_files_from_complete(platform_serial, mission, dive_stride=5):
     nrt_path = Path(
         f"/data/data_raw/nrt/{platform_serial}/{str(mission).zfill(6)}/C-Csv/",
     )
-    delayed_path = Path(f"/data/data_raw/complete_mission/{platform_serial}/M{mission}")
     if not nrt_path.exists():
         nrt_path.mkdir(parents=True)
-    in_files_gli = sorted(
-        delayed_path.glob("*gli.sub*.gz"),
-        key=lambda path: int(path.stem.split(".")[4]),
-    )
-    in_files_pld = sorted(
-        delayed_path.glob("*pld1.raw*.gz"),
-        key=lambda path: int(path.stem.split(".")[4]),
-    )
-    in_files_gli, in_files_pld = match_input_files(in_files_gli, in_files_pld)
+    in_files_gli, in_files_pld = raw_catalog.matched_files(platform_serial, mission, gli_pattern="*gli.sub*.gz")
+    in_files_gli = [Path(path) for path in in_files_gli]
+    in_files_pld = [Path(path) for path in in_files_pld]
 
     with open(nrt_path / "synthetic_nrt_data.txt", "w") as f_out:
         f_out.write("synthetic")
@@ -144,6 +102,7 @@ def synthetic_nrt_files_from_complete(platform_serial, mission, dive_stride=5):
 
 def all_nrt_from_complete(reprocess=True):
     _log.info("Start nrt from complete")
+    raw_catalog.refresh_catalog()
     glider_paths = list(Path("/data/data_l0_pyglider/complete_mission").glob("S*"))
     glidermissions = []
     for glider_path in glider_paths:
@@ -4,6 +4,7 @@ import pathlib
 import logging
 import datetime
 from votoutils.utilities.utilities import missions_no_proc
+from votoutils.utilities import job_state
 from pyglider_single_mission import process
 
 script_dir = pathlib.Path(__file__).parent.absolute()
@@ -21,6 +22,14 @@ logging.basicConfig(
 
 
 def proc_all_complete(reprocess=True, min_date=datetime.datetime(2026,1,5)):
+    with job_state.named_lock("pyglider_all_complete") as locked:
+        if not locked:
+            _log.info("complete reprocessing is already running")
+            return
+        reprocess_missions(reprocess=reprocess, min_date=min_date)
+
+
+def reprocess_missions(reprocess=True, min_date=datetime.datetime(2026,1,5)):
     _log.info("Start complete reprocessing")
     yml_files = list(pathlib.Path("/data/deployment_yaml/mission_yaml").glob("*.yml"))
     yml_files.sort()
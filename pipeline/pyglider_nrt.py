@@ -1,13 +1,14 @@
-import glob
 import os
 import sys
+import datetime
 import pathlib
 import logging
 import numpy as np
 import xarray as xr
 import pandas as pd
 from votoutils.glider.process_pyglider import proc_pyglider_l0
-from votoutils.utilities.utilities import natural_sort, platforms_no_proc, missions_no_proc
+from votoutils.utilities.utilities import platforms_no_proc, missions_no_proc
+from votoutils.utilities import raw_catalog, job_state
 from votoutils.glider.metocc import create_csv
 
 script_dir = pathlib.Path(__file__).parent.absolute()
@@ -15,80 +16,131 @@ sys.path.append(str(script_dir))
 os.chdir(script_dir)
 
 _log = logging.getLogger(__name__)
-logging.basicConfig(
-    filename="/data/log/pyglider_nrt.log",
-    filemode="a",
-    format="%(asctime)s %(levelname)-8s %(message)s",
-    level=logging.INFO,
-    datefmt="%Y-%m-%d %H:%M:%S",
-)
 
 
 def proc_nrt():
     _log.info("Start nrt processing")
-    all_glider_paths = pathlib.Path("/data/data_raw/nrt").glob("*")
-    for glider_path in all_glider_paths:
-        platform_serial = str(glider_path.parts[-1])
-        if platform_serial in platforms_no_proc:
-            _log.info(f"{platform_serial} is not to be processed. Skipping")
-            continue
+    raw_catalog.refresh_catalog()
+    latest_missions = dict(raw_catalog.missions(source="nrt", with_files_dir=True))
+    for platform_serial in sorted({platform for platform, mission in raw_catalog.missions(source="nrt")}):
         _log.info(f"Checking {platform_serial}")
-        mission_paths = list(glider_path.glob("00*/C-Csv"))
-        if not mission_paths:
+        if platform_serial not in latest_missions.keys():
             _log.warning(f"No missions found for {platform_serial}. Skipping")
             continue
-        mission_paths.sort()
-        mission = str(mission_paths[-1].parts[-2]).lstrip("0")
-        if (platform_serial, int(mission)) in missions_no_proc:
-            _log.info(f"Will not process {platform_serial}, M{mission} as it is in missions_no_proc")
-            continue
-        _log.info(f"Checking {platform_serial} M{mission}")
-        input_dir = f"/data/data_raw/nrt/{platform_serial}/{mission.zfill(6)}/C-Csv/"
-        output_dir = f"/data/data_l0_pyglider/nrt/{platform_serial}/M{mission}/"
-        gridfiles_dir = f"{output_dir}gridfiles/"
-        ts_dir = f"{output_dir}/timeseries/"
+        proc_nrt_mission(platform_serial, latest_missions[platform_serial])
+    _log.info("Finished nrt processing")
+
+
+def _newer_than_timeseries(platform_serial, mission, in_files):
+    # fallback for missions without an input hash in the job store
+    ts_dir = f"/data/data_l0_pyglider/nrt/{platform_serial}/M{mission}/timeseries/"
+    try:
+        nc_file = list(pathlib.Path(ts_dir).glob("*.nc"))[0]
+        ds = xr.open_dataset(nc_file)
+        max_time = ds.time.values.max()
+        ds.close()
+    except IndexError:
+        _log.info(f"no nc file found in {ts_dir}. Reprocessing all data")
+        return True
+    max_dive_file = in_files[-1]
+    df = pd.read_csv(
+        max_dive_file,
+        sep=";",
+        parse_dates=True,
+        index_col=0,
+        dayfirst=True,
+        nrows=10,
+    )
+    try:
+        file_time = pd.Timestamp(df.index.max())
+        return pd.Timestamp(max_time + np.timedelta64(10, "m")) <= file_time
+    except:
+        _log.info(f"failed time check on {max_dive_file}")
+        return True
+
+
+def has_new_input(platform_serial, mission, in_files, pld_files=()):
+    """
+    Compare the gli and pld input files with the hash recorded when the mission was last processed, so unchanged
+    missions are skipped without opening their timeseries
+    """
+    job = job_state.get_job(platform_serial, mission, "sub")
+    if not job or not job["input_hash"]:
+        return _newer_than_timeseries(platform_serial, mission, in_files)
+    if job["status"] == "failed":
+        return True
+    return job["input_hash"] != job_state.input_hash(list(in_files) + list(pld_files))
+
+
+def proc_nrt_mission(platform_serial, mission):
+    """Process the nrt data of one mission if it has new input files. Returns True if it was processed"""
+    mission = str(mission)
+    if platform_serial in platforms_no_proc:
+        _log.info(f"{platform_serial} is not to be processed. Skipping")
+        return False
+    if (platform_serial, int(mission)) in missions_no_proc:
+        _log.info(f"Will not process {platform_serial}, M{mission} as it is in missions_no_proc")
+        return False
+    _log.info(f"Checking {platform_serial} M{mission}")
+    input_dir = f"/data/data_raw/nrt/{platform_serial}/{mission.zfill(6)}/C-Csv/"
+    output_dir = f"/data/data_l0_pyglider/nrt/{platform_serial}/M{mission}/"
+    in_files = raw_catalog.mission_files(platform_serial, int(mission), source="nrt", pattern="*gli*")
+    if len(in_files) == 0:
+        _log.info(f"no input gli files for {input_dir}. Skipping")
+        return False
+    # pld files can arrive after the gli file of the same dive, so they are part of the input hash too
+    pld_files = raw_catalog.mission_files(platform_serial, int(mission), source="nrt", pattern="*pld*")
+    if not has_new_input(platform_serial, mission, in_files, pld_files):
+        _log.info(f"No new {platform_serial} M{mission} input files")
+        return False
+    if not pathlib.Path(
+        f"/data/deployment_yaml/mission_yaml/{platform_serial}_M{mission}.yml",
+    ).exists():
+        _log.warning(f"yml file for {platform_serial} M{mission} not found.")
+        return False
+    with job_state.mission_lock(platform_serial, mission, "sub") as locked:
+        if not locked:
+            _log.info(f"{platform_serial} M{mission} is already being processed. Skipping")
+            return False
+        _log.info(f"Processing {platform_serial} M{mission}")
+        start = datetime.datetime.now()
+        job_state.start_job(platform_serial, mission, "sub", input_hash=job_state.input_hash(in_files + pld_files))
         try:
-            nc_file = list(pathlib.Path(ts_dir).glob("*.nc"))[0]
-            ds = xr.open_dataset(nc_file)
-            max_time = ds.time.values.max()
-            ds.close()
-        except IndexError:
-            _log.info(f"no nc file found int {gridfiles_dir}. Reprocessing all data")
-            max_time = np.datetime64("1970-01-01")
-        in_files = natural_sort(glob.glob(f"{input_dir}*gli*"))
-        if len(in_files) == 0:
-            _log.info(f"no input gli files for {input_dir}. Skipping")
-            continue
-        max_dive_file = in_files[-1]
-        df = pd.read_csv(
-            max_dive_file,
-            sep=";",
-            parse_dates=True,
-            index_col=0,
-            dayfirst=True,
-            nrows=10,
+            proc_pyglider_l0(
+                platform_serial,
+                mission,
+                "sub",
+                input_dir,
+                output_dir,
+                incremental_grid=True,
+                columnar_store=True,
+            )
+        except Exception as e:
+            job_state.fail_job(platform_serial, mission, "sub", e)
+            raise
+        # cleaning may have repaired or removed input files, record their state after processing
+        processed = [path for path in in_files + pld_files if os.path.exists(path)]
+        job_state.finish_job(
+            platform_serial,
+            mission,
+            "sub",
+            datetime.datetime.now() - start,
+            input_hash=job_state.input_hash(processed),
         )
-        try:
-            file_time = pd.Timestamp(df.index.max())
-            if pd.Timestamp(max_time + np.timedelta64(10, "m")) > file_time:
-                _log.info(f"No new {platform_serial} M{mission} input files")
-                continue
-        except:
-            _log.info(f"failed time check on {max_dive_file}")
-        if not pathlib.Path(
-            f"/data/deployment_yaml/mission_yaml/{platform_serial}_M{mission}.yml",
-        ).exists():
-            _log.warning(f"yml file for {platform_serial} M{mission} not found.")
-            continue
-        _log.info(f"Processing {platform_serial} M{mission}")
-        proc_pyglider_l0(platform_serial, mission, "sub", input_dir, output_dir)
-        _log.info("creating metocc csv")
-        timeseries_dir = pathlib.Path(output_dir) / "timeseries"
-        timeseries_nc = list(timeseries_dir.glob("*.nc"))[0]
-        metocc_base = create_csv(timeseries_nc)
-        _log.info(f"created metocc files with base {metocc_base}")
-    _log.info("Finished nrt processing")
+    _log.info("creating metocc csv")
+    timeseries_dir = pathlib.Path(output_dir) / "timeseries"
+    timeseries_nc = list(timeseries_dir.glob("*.nc"))[0]
+    metocc_base = create_csv(timeseries_nc)
+    _log.info(f"created metocc files with base {metocc_base}")
+    return True
 
 
 if __name__ == "__main__":
+    logging.basicConfig(
+        filename="/data/log/pyglider_nrt.log",
+        filemode="a",
+        format="%(asctime)s %(levelname)-8s %(message)s",
+        level=logging.INFO,
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
     proc_nrt()
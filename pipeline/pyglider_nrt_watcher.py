@@ -0,0 +1,40 @@
+"""
+Long-running replacement for the cron driven nrt processing. New files in /data/data_raw/nrt/*/*/C-Csv trigger
+processing of only that glider mission, seconds after the upload settles.
+
+python pyglider_nrt_watcher.py --interval 10 --debounce 60
+"""
+import argparse
+import logging
+from votoutils.utilities import nrt_watcher, raw_catalog
+from pyglider_nrt import proc_nrt_mission
+
+_log = logging.getLogger(__name__)
+
+
+def process_changed_mission(platform_serial, mission):
+    raw_catalog.refresh_catalog()
+    proc_nrt_mission(platform_serial, mission)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="process nrt glider missions as their files arrive")
+    parser.add_argument("--interval", type=float, default=10, help="Seconds between directory scans")
+    parser.add_argument("--debounce", type=float, default=60, help="Seconds without new files before processing")
+    parser.add_argument("--max-wait", type=float, default=600, help="Process after this many seconds of uploads")
+    args = parser.parse_args()
+    logging.basicConfig(
+        filename="/data/log/pyglider_nrt_watcher.log",
+        filemode="a",
+        format="%(asctime)s %(levelname)-8s %(message)s",
+        level=logging.INFO,
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+    _log.info("Start nrt watcher")
+    nrt_watcher.watch(
+        process_changed_mission,
+        interval=args.interval,
+        debounce=args.debounce,
+        max_wait=args.max_wait,
+        heartbeat_file="/data/log/pyglider_nrt_watcher_heartbeat.log",
+    )
@@ -2,14 +2,13 @@ import os
 import sys
 import pathlib
 import argparse
-import numpy as np
 import logging
-import glob
-import pandas as pd
 import datetime
 import subprocess
 import shutil
-from votoutils.utilities.utilities import natural_sort, match_input_files, missions_no_proc
+from votoutils.utilities.utilities import missions_no_proc
+from votoutils.utilities import raw_catalog, job_state
+from votoutils.fixers.merge_fragments import merge_mission_fragments
 from votoutils.glider.process_pyglider import proc_pyglider_l0
 from votoutils.upload.sync_functions import sync_script_dir
 
@@ -32,29 +31,8 @@ def remove_proc_files(platform_serial, mission):
 
 
 def update_processing_time(platform_serial, mission, start):
-    df_reprocess = pd.read_csv(
-        "/home/pipeline/reprocess.csv",
-        parse_dates=["proc_time"],
-    )
-    a = [np.logical_and(df_reprocess.glider == platform_serial, df_reprocess.mission == mission)]
-    if df_reprocess.index[tuple(a)].any():
-        ind = df_reprocess.index[tuple(a)].values[0]
-        df_reprocess.at[ind, "proc_time"] = datetime.datetime.now()
-        df_reprocess.at[ind, "duration"] = datetime.datetime.now() - start
-    else:
-        new_row = pd.DataFrame(
-            {
-                "glider": platform_serial,
-                "mission": mission,
-                "proc_time": datetime.datetime.now(),
-                "duration": datetime.datetime.now() - start,
-            },
-            index=[len(df_reprocess)],
-        )
-        df_reprocess = pd.concat((df_reprocess, new_row))
-    df_reprocess.sort_values("proc_time", inplace=True)
+    job_state.finish_job(platform_serial, mission, "raw", datetime.datetime.now() - start)
     _log.info(f"updated processing time to {datetime.datetime.now()}")
-    df_reprocess.to_csv("/home/pipeline/reprocess.csv", index=False)
 
 
 def process(platform_serial, mission):
@@ -72,20 +50,33 @@ def process(platform_serial, mission):
         level=logging.INFO,
         datefmt="%Y-%m-%d %H:%M:%S",
     )
+    with job_state.mission_lock(platform_serial, mission, "raw") as locked:
+        if not locked:
+            _log.warning(f"{platform_serial} M{mission} is already being processed. Skipping")
+            return
+        try:
+            process_mission(platform_serial, mission)
+        except Exception as e:
+            job_state.fail_job(platform_serial, mission, "raw", e)
+            raise
+
+
+def process_mission(platform_serial, mission):
     start = datetime.datetime.now()
     input_dir = f"/data/data_raw/complete_mission/{platform_serial}/M{mission}/"
     if not input_dir:
         raise ValueError(f"Input dir {input_dir} not found")
     output_dir = f"/data/data_l0_pyglider/complete_mission/{platform_serial}/M{mission}/"
 
-    in_files_gli = natural_sort(glob.glob(f"{input_dir}*gli*.gz"))
-    in_files_pld = natural_sort(glob.glob(f"{input_dir}*pld1.raw*.gz"))
-    in_files_gli, in_files_pld = match_input_files(in_files_gli, in_files_pld)
+    raw_catalog.refresh_catalog()
+    merge_mission_fragments(platform_serial, mission)
+    in_files_gli, in_files_pld = raw_catalog.matched_files(platform_serial, mission)
 
     if len(in_files_gli) == 0 or len(in_files_pld) == 0:
         raise ValueError(f"input dir {input_dir} does not contain gli and/or pld files")
+    job_state.start_job(platform_serial, mission, "raw", input_hash=job_state.input_hash(in_files_gli + in_files_pld))
     _log.info(f"Processing glider {platform_serial} mission {mission}")
-    proc_pyglider_l0(platform_serial, mission, "raw", input_dir, output_dir)
+    proc_pyglider_l0(platform_serial, mission, "raw", input_dir, output_dir, columnar_store=True)
     _log.info(f"Finished processing glider{platform_serial} mission {mission}")
     sys.path.append(str(parent_dir / "voto-web/voto/bin"))
     # noinspection PyUnresolvedReferences
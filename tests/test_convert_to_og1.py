@@ -0,0 +1,93 @@
+import dask
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+from votoutils.glider.convert_to_og1 import convert_to_og1, standardise_og10, timeseries_to_og1
+
+
+def make_timeseries(n=5000, seed=0):
+    # minimal pyglider timeseries with qc, as-is and untranslated variables
+    rng = np.random.default_rng(seed)
+    ds = xr.Dataset(
+        coords={"time": ("time", pd.date_range("2024-03-01", periods=n, freq="2s").values, {"axis": "T"})},
+    )
+    ds["latitude"] = ("time", 57 + np.cumsum(rng.normal(0, 1e-5, n)), {"long_name": "latitude", "axis": "Y"})
+    ds["longitude"] = ("time", 18 + np.cumsum(rng.normal(0, 1e-5, n)), {"long_name": "longitude", "axis": "X"})
+    ds["depth"] = ("time", np.abs(rng.normal(50, 20, n)), {"long_name": "glider depth", "axis": "Z"})
+    ds = ds.set_coords(["latitude", "longitude", "depth"])
+    for var_name in ["temperature", "salinity", "conductivity", "pressure"]:
+        values = rng.normal(10, 2, n)
+        values[rng.random(n) < 0.05] = np.nan
+        ds[var_name] = ("time", values, {"long_name": var_name, "valid_min": 0, "valid_max": 50})
+        flags = rng.choice([1.0, 2.0, 3.0, 4.0, np.nan], n)
+        ds[f"{var_name}_qc"] = ("time", flags, {"long_name": f"{var_name} qc", "valid_min": 1, "valid_max": 9})
+    ds["profile_index"] = ("time", np.arange(n) // 200 + 0.5 * (np.arange(n) % 2), {"long_name": "profile index"})
+    ds["nav_state"] = ("time", rng.choice([100, 110, 115, 116, 117, 118, 119, 123, 124], n).astype(float), {})
+    ds["ballast_pos"] = ("time", rng.normal(0, 100, n), {"long_name": "ballast"})
+    ds["unknown_sensor"] = ("time", rng.normal(0, 1, n), {"long_name": "not in vocabulary"})
+    ds.attrs = {
+        "glider_serial": "70",
+        "dataset_id": "delayed_SEA070_M30",
+        "contributor_name": "a, b",
+        "comment": "test",
+        "id": "SEA070_M30",
+        "wmo_id": "6801573",
+        "glider_model": "SeaExplorer",
+        "ctd": str({"make_model": "RBR legato CTD", "serial": 12345, "calibration_date": "2023-01-01"}),
+    }
+    return ds
+
+
+def two_step(ds, num_vals=None):
+    dsa = convert_to_og1(standardise_og10(ds.copy()), num_vals=num_vals)
+    dsa.attrs.pop("date_created")
+    return dsa
+
+
+@pytest.mark.parametrize("num_vals", [None, 1000])
+def test_timeseries_to_og1_matches_two_step(num_vals):
+    ds = make_timeseries()
+    expected = two_step(ds, num_vals=num_vals)
+    result = timeseries_to_og1(ds, num_vals=num_vals)
+    result.attrs.pop("date_created")
+    xr.testing.assert_identical(result, expected)
+    for var_name in expected.variables:
+        assert result[var_name].dtype == expected[var_name].dtype
+        assert result[var_name].encoding.get("dtype") == expected[var_name].encoding.get("dtype")
+
+
+def test_timeseries_to_og1_lazy():
+    ds = make_timeseries()
+    expected = two_step(ds)
+    result = timeseries_to_og1(ds.chunk({"time": 700}))
+    assert result["TEMP"].chunks is not None
+    result.attrs.pop("date_created")
+    xr.testing.assert_identical(result.compute(), expected)
+
+
+def test_timeseries_to_og1_lazy_plans_dtypes_in_one_pass():
+    ds = make_timeseries()
+    # integer counts, whose storage dtype depends on their value range
+    ds["chlorophyll_raw"] = ("time", np.arange(len(ds.time), dtype=np.int32), {"long_name": "chlorophyll counts"})
+    ds["cdom_raw"] = ("time", np.arange(len(ds.time), dtype=np.int64) * 10, {"long_name": "cdom counts"})
+    computes = []
+    with dask.callbacks.Callback(start=lambda dsk: computes.append(dsk)):
+        result = timeseries_to_og1(ds.chunk({"time": 700}))
+    # TIME units check and deployment start, then the value ranges of every variable in one pass
+    assert len(computes) == 3
+    assert result["FLUOCHLA"].encoding["dtype"] == np.int16
+    assert result["FLUOCDOM"].encoding["dtype"] == np.int32
+    expected = two_step(ds)
+    result.attrs.pop("date_created")
+    xr.testing.assert_identical(result.compute(), expected)
+    for var_name in expected.variables:
+        assert result[var_name].encoding.get("dtype") == expected[var_name].encoding.get("dtype")
+
+
+def test_timeseries_to_og1_does_not_modify_input():
+    ds = make_timeseries(n=500)
+    attrs = dict(ds.attrs)
+    timeseries_to_og1(ds)
+    assert ds.attrs == attrs
+    assert ds["temperature"].attrs["valid_min"] == 0
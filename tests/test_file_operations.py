@@ -0,0 +1,42 @@
+from votoutils.fixers.file_operations import repair_nrt_file
+
+
+def two_pass_repair(content):
+    content = content.replace(" ", "")
+    goodlines = []
+    goodline_len = 0
+    i = 0
+    num_semi = 0
+    for line in content.splitlines(keepends=True):
+        if i > 3:
+            if not num_semi:
+                num_semi = line.count(";")
+            if line.count("9999.0") < 4 and not goodline_len:
+                goodline_len = len(line)
+        if line.count(";") < num_semi:
+            continue
+        if len(line) + 30 < goodline_len:
+            continue
+        goodlines.append(line)
+        i += 1
+    return "".join(goodlines)
+
+
+def test_repair_nrt_file(tmp_path):
+    lines = ["Timestamp;NavState;Heading;Pitch;Roll;Temperature;Pressure\n"]
+    for i in range(20):
+        lines.append(f"01/05/2024 10:00:{i:02d};110;{i}.123456;-20.123456;1.123456;12.345678;10.123456\n")
+    lines.insert(10, "01/05/2024 10:00:30;110;1.5\n")
+    lines.insert(12, "01/05/2024 10:00:31;1;1;1;1;1;1\n")
+    lines.append("01/05/2024 10:00:40;110;1.0;2.0")
+    content = "".join(lines)
+    csv_file = tmp_path / "sea070.29.gli.sub.4"
+    csv_file.write_text(content)
+    stats = repair_nrt_file(csv_file)
+    assert csv_file.read_text() == two_pass_repair(content)
+    assert stats["lines"] == len(lines)
+    assert stats["missing_delimiter"] == 2
+    assert stats["short"] == 1
+    assert stats["kept"] == len(lines) - 3
+    assert stats["spaces_removed"] == len(lines) - 1
+    assert [path.name for path in tmp_path.iterdir()] == ["sea070.29.gli.sub.4"]
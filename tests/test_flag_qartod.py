@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+import xarray as xr
+from votoutils.qc.flag_qartod import flag_ioos
+
+
+def make_timeseries(n=3000):
+    rng = np.random.default_rng(0)
+    ds = xr.Dataset(coords={"time": ("time", pd.date_range("2024-05-01", periods=n, freq="1s").values)})
+
+    def add(name, values, units="1"):
+        ds[name] = ("time", values, {"long_name": name, "standard_name": name, "units": units})
+
+    add("longitude", 17 + np.cumsum(rng.normal(0, 1e-5, n)))
+    add("latitude", 57 + np.cumsum(rng.normal(0, 1e-5, n)))
+    ds = ds.set_coords(["longitude", "latitude"])
+    depth = 50 + 45 * np.sin(np.arange(n) / 300)
+    add("depth", depth)
+    add("pressure", depth * 1.01)
+    add("temperature", 10 - depth / 20 + rng.normal(0, 0.05, n))
+    add("salinity", 7 + depth / 20 + rng.normal(0, 0.02, n))
+    add("conductivity", 1.0 + depth / 200, "S m-1")
+    add("oxygen_concentration", 300 - depth + rng.normal(0, 2, n))
+    add("chlorophyll", np.abs(rng.normal(1, 0.5, n)))
+    add("potential_density", 1005 + depth / 10)
+    # spikes and out of range values so that every flag value is present
+    ds["temperature"].values[[100, 2000]] = [25.0, 45.0]
+    ds["salinity"].values[500] = 1.0
+    ds["longitude"].values[1500] = 30.0
+    return ds
+
+
+def test_flag_ioos_parallel_matches_serial():
+    serial = flag_ioos(make_timeseries(), max_workers=1)
+    parallel = flag_ioos(make_timeseries(), max_workers=3)
+    qc_names = [name for name in serial.variables if name.endswith("_qc")]
+    assert len(qc_names) == 10
+    assert (serial["temperature_qc"] == 4).any()
+    assert (serial["longitude_qc"] > 1).any()
+    xr.testing.assert_identical(serial, parallel)
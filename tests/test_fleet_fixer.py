@@ -0,0 +1,94 @@
+import logging
+import os
+import numpy as np
+import pandas as pd
+import xarray as xr
+from votoutils.fixers import fleet_fixer
+
+
+def make_timeseries(nc_path):
+    n = 2000
+    time = pd.date_range("2024-05-01", periods=n, freq="2s")
+    ds = xr.Dataset(coords={"time": ("time", time)})
+    ds["depth"] = ("time", np.linspace(0, 100, n), {"units": "m"})
+    ds["chlorophyll_raw"] = ("time", np.linspace(50, 150, n))
+    ds["chlorophyll"] = ("time", (ds.chlorophyll_raw.values - 48) * 0.01, {"units": "mg m-3"})
+    ds["temperature"] = ("time", np.linspace(5, 15, n), {"units": "Celsius"})
+    ds["ad2cp_time"] = ("time", time + pd.Timedelta("1s"))
+    ds["ad2cp_time"].encoding["units"] = "days since 2000-01-01"
+    ds["ad2cp_time"].encoding["dtype"] = "float64"
+    ds["chlorophyll"].encoding["zlib"] = True
+    ds.attrs["optics"] = str({"calibration_parameters": {"Chl_DarkCounts": 48, "Chl_SF": 0.01}})
+    ds.to_netcdf(nc_path)
+
+
+def test_fix_mission_patches_in_place(tmp_path):
+    nc_path = tmp_path / "mission_timeseries.nc"
+    make_timeseries(nc_path)
+    inode = os.stat(nc_path).st_ino
+    with xr.open_dataset(nc_path) as ds:
+        ds_before = ds.load()
+
+    row = fleet_fixer.fix_mission("adcp_times", nc_path)
+    assert row["changed"] == "ad2cp_time"
+    row = fleet_fixer.fix_mission("adcp_times", nc_path)
+    assert row["changed"] == ""
+    row = fleet_fixer.fix_mission("dark_counts", nc_path)
+    assert row["changed"].split() == ["chlorophyll", "chlorophyll_uncorrected", "optics"]
+    assert os.stat(nc_path).st_ino == inode
+
+    with xr.open_dataset(nc_path, decode_times=False) as ds:
+        assert ds.ad2cp_time.attrs["units"].startswith("seconds since 1970-01-01T00:00:00")
+    with xr.open_dataset(nc_path) as ds:
+        ds = ds.load()
+    assert np.abs(ds.ad2cp_time.values - ds_before.ad2cp_time.values).max() < np.timedelta64(1, "ms")
+    assert ds.temperature.identical(ds_before.temperature)
+    np.testing.assert_allclose(ds.chlorophyll_uncorrected.values, ds_before.chlorophyll.values)
+    assert not np.allclose(ds.chlorophyll.values, ds_before.chlorophyll.values)
+    assert eval(ds.attrs["optics"])["calibration_parameters"]["Chl_DarkCounts"] != 48
+    assert ds.chlorophyll.attrs["units"] == "mg m-3"
+    assert ds.chlorophyll_uncorrected.encoding["zlib"]
+
+
+def test_run_fix_skips_done_missions(tmp_path, monkeypatch, caplog):
+    nc_path = tmp_path / "mission_timeseries.nc"
+    make_timeseries(nc_path)
+    monkeypatch.setattr(fleet_fixer, "manifest_file", tmp_path / "fixer_manifest.csv")
+    monkeypatch.setattr(fleet_fixer, "mission_files", lambda kinds, missions: [nc_path])
+    fleet_fixer.run_fix("adcp_times", max_workers=1)
+    # a nanosecond mtime that a float read back from the csv does not hold exactly
+    os.utime(nc_path, ns=(1714557600123456789, 1714557600123456789))
+    rows = fleet_fixer.read_manifest().to_dict("records")
+    rows[0]["mtime_ns"] = os.stat(nc_path).st_mtime_ns
+    fleet_fixer.write_manifest(rows)
+    manifest = fleet_fixer.read_manifest()
+    assert len(manifest) == 1
+    done = manifest.done[0]
+    with caplog.at_level(logging.INFO, logger=fleet_fixer.__name__):
+        fleet_fixer.run_fix("adcp_times", max_workers=1)
+    assert "adcp_times: 0 missions to fix" in caplog.messages
+    assert fleet_fixer.read_manifest().done[0] == done
+
+
+def test_fix_mission_keeps_int64_times(tmp_path):
+    nc_path = tmp_path / "mission_timeseries.nc"
+    time = pd.date_range("2024-05-01", periods=200, freq="2s")
+    ad2cp_time = (time + pd.Timedelta("1250ms")).values.astype("datetime64[ns]")
+    ds = xr.Dataset(coords={"time": ("time", time)})
+    ds["ad2cp_time"] = ("time", ad2cp_time)
+    ds["ad2cp_time"].encoding.update({"units": "nanoseconds since 1970-01-01", "dtype": "int64"})
+    ds.to_netcdf(nc_path)
+
+    with xr.open_dataset(nc_path) as ds_file:
+        ds_orig = ds_file.load()
+    ds_fixed = fleet_fixer.fixes["adcp_times"]["function"](ds_orig.copy(deep=True))
+    # encoded as float64 seconds, the variable cannot be written to the int64 variable on disk
+    ds_fixed["ad2cp_time"].encoding["dtype"] = "float64"
+    assert fleet_fixer.patch_netcdf(nc_path, ds_fixed, ds_orig, ["ad2cp_time"]) == ["ad2cp_time"]
+    assert fleet_fixer.fix_mission("adcp_times", nc_path)["changed"] == ""
+
+    with xr.open_dataset(nc_path, decode_times=False) as ds_raw:
+        assert ds_raw.ad2cp_time.dtype == np.int64
+        assert not ds_raw.ad2cp_time.attrs["units"].startswith("nanoseconds")
+    with xr.open_dataset(nc_path) as ds_new:
+        np.testing.assert_array_equal(ds_new.ad2cp_time.values, ad2cp_time)
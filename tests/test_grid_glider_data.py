@@ -0,0 +1,196 @@
+import timeit
+import numpy as np
+import pytest
+import scipy.stats as stats
+from gliderad2cp.tools import grid2d
+import pandas as pd
+import xarray as xr
+from votoutils.glider import grid_glider_data
+from votoutils.glider.grid_glider_data import gappy_fill_vertical, grid_variables
+
+
+def gappy_fill_vertical_loop(data):
+    # Original column-by-column implementation, kept as a reference
+    m, n = np.shape(data)
+    for j in range(n):
+        ind = np.where(~np.isnan(data[:, j]))[0]
+        if (0 < len(ind) < (ind[-1] - ind[0])
+                and len(ind) > (ind[-1] - ind[0]) * 0.05):
+            int = np.arange(ind[0], ind[-1])
+            data[:, j][ind[0]:ind[-1]] = np.interp(int, ind, data[ind, j])
+    return data
+
+
+def make_gappy_grid(m=150, n=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    data = rng.normal(10, 2, (m, n))
+    data[rng.random((m, n)) < 0.4] = np.nan
+    # columns that are empty, have a single value, are sparse or full
+    data[:, 0] = np.nan
+    data[:, 1] = np.nan
+    data[m // 2, 1] = 3.0
+    data[:, 2] = np.nan
+    data[[0, m - 1], 2] = [1.0, 2.0]
+    data[:, 3] = 1.0
+    # top and bottom of some columns without data
+    data[:m // 8, 10:n // 2] = np.nan
+    data[-m // 5:, n // 4:] = np.nan
+    return data
+
+
+@pytest.mark.parametrize("dtype", [np.float64, np.float32])
+def test_gappy_fill_vertical_matches_loop(dtype):
+    data = make_gappy_grid().astype(dtype)
+    expected = gappy_fill_vertical_loop(data.copy())
+    result = gappy_fill_vertical(data.copy())
+    np.testing.assert_array_equal(result, expected)
+
+
+def test_gappy_fill_vertical_in_place():
+    data = make_gappy_grid(m=40, n=30, seed=1)
+    result = gappy_fill_vertical(data)
+    assert result is data
+
+
+def test_gappy_fill_vertical_sparse_columns_untouched():
+    data = np.full((100, 2), np.nan)
+    data[[0, 99], 0] = [0.0, 99.0]
+    data[0::2, 1] = 1.0
+    result = gappy_fill_vertical(data.copy())
+    # only 2 % of the first column has data, so it is not filled
+    assert np.isnan(result[1:99, 0]).all()
+    np.testing.assert_array_equal(result[:99, 1], np.ones(99))
+
+
+@pytest.mark.parametrize("shape", [(0, 0), (0, 5), (5, 0)])
+def test_gappy_fill_vertical_empty(shape):
+    data = np.full(shape, np.nan)
+    assert gappy_fill_vertical(data) is data
+    np.testing.assert_array_equal(gappy_fill_vertical_loop(data.copy()), data)
+
+
+def make_samples(n_profiles=40, samples_per_profile=300, seed=0):
+    # dives and climbs to different depths, with nan gaps and samples between profiles
+    rng = np.random.default_rng(seed)
+    profile_num = np.repeat(np.arange(1, n_profiles + 1), samples_per_profile).astype(np.float64)
+    max_depth = rng.uniform(20, 90, n_profiles)
+    phase = np.tile(np.linspace(0, 1, samples_per_profile), n_profiles)
+    depth = np.repeat(max_depth, samples_per_profile) * phase + rng.normal(0, 0.2, len(phase))
+    profile_index = profile_num.copy()
+    profile_index[rng.random(len(phase)) < 0.05] += 0.5
+    temperature = (12 - depth / 10 + rng.normal(0, 0.1, len(phase))).astype(np.float32)
+    temperature[rng.random(len(phase)) < 0.1] = np.nan
+    chlorophyll = np.exp(rng.normal(0, 1, len(phase)))
+    chlorophyll[rng.random(len(phase)) < 0.2] = np.nan
+    return profile_num, depth, profile_index, temperature, chlorophyll
+
+
+def test_grid_variables_matches_grid2d():
+    profile_num, depth, profile_index, temperature, chlorophyll = make_samples()
+    xi = np.arange(1, profile_num.max() + 1)
+    yi = np.arange(0, np.nanmax(depth) + 2, 2)
+    mask = profile_index % 1 == 0
+    methods = {
+        "temperature_median": (temperature, "median"),
+        "temperature_mean": (temperature, "mean"),
+        "chlorophyll_median": (chlorophyll, "median"),
+        "chlorophyll_mean": (chlorophyll, "mean"),
+        "chlorophyll_gmean": (chlorophyll, stats.gmean),
+    }
+    grids = grid_variables(profile_num, depth, methods, xi, yi, mask=mask)
+    for var_name, (values, average_method) in methods.items():
+        expected = grid2d(profile_num[mask], depth[mask], values[mask], xi=xi, yi=yi, fn=average_method)[0]
+        assert np.isfinite(expected).sum() > 1000
+        if average_method is stats.gmean:
+            np.testing.assert_allclose(grids[var_name], expected, rtol=1e-5)
+            assert np.array_equal(np.isnan(grids[var_name]), np.isnan(expected))
+        else:
+            np.testing.assert_array_equal(grids[var_name], expected)
+
+
+def make_timeseries(profile_depths, seed=0, samples_per_profile=200):
+    # a glider diving and climbing to profile_depths, sampled every 5 s
+    rng = np.random.default_rng(seed)
+    n_profiles = len(profile_depths)
+    phase = np.abs(np.linspace(-1, 1, samples_per_profile))
+    depth = (np.outer(profile_depths, 1 - phase) + rng.normal(0, 0.3, (n_profiles, samples_per_profile))).ravel()
+    depth = np.abs(depth)
+    profile_num = np.repeat(np.arange(1, n_profiles + 1), samples_per_profile).astype(np.float64)
+    profile_index = profile_num.copy()
+    profile_index[rng.random(len(depth)) < 0.03] += 0.5
+    time = pd.date_range("2024-05-01", periods=len(depth), freq="5s").values
+    ds = xr.Dataset(coords={"time": ("time", time)})
+    ds["depth"] = ("time", depth, {"units": "m", "long_name": "depth"})
+    ds["profile_num"] = ("time", profile_num)
+    ds["profile_index"] = ("time", profile_index)
+    ds["temperature"] = ("time", 12 - depth / 10 + rng.normal(0, 0.1, len(depth)), {"units": "Celsius"})
+    chlorophyll = np.exp(rng.normal(0, 1, len(depth)))
+    ds["chlorophyll"] = ("time", chlorophyll, {"units": "mg m-3", "average_method": "geometric mean"})
+    ds["longitude"] = ("time", 17 + np.linspace(0, 0.1, len(depth)), {"units": "degrees_east"})
+    ds["latitude"] = ("time", 57 + np.linspace(0, 0.05, len(depth)), {"units": "degrees_north"})
+    ds.attrs = {
+        "cdm_data_type": "TrajectoryProfile",
+        "deployment_start": "2024-05-01T00:00:00",
+        "deployment_end": "2024-05-02T00:00:00",
+        "time_coverage_start": "2024-05-01T00:00:00",
+        "time_coverage_end": "2024-05-02T00:00:00",
+    }
+    return ds
+
+
+def grid_timeseries(monkeypatch, l0_dir, ds, kind="sub", **kwargs):
+    monkeypatch.setattr(grid_glider_data, "l0_dir", l0_dir)
+    ts_dir = l0_dir / ("nrt" if kind == "sub" else "complete_mission") / "SEA045" / "M12" / "timeseries"
+    ts_dir.mkdir(parents=True, exist_ok=True)
+    ds.to_netcdf(ts_dir / "mission_timeseries.nc")
+    outname = grid_glider_data.make_gridfile_gliderad2cp("SEA045", 12, kind, **kwargs)
+    with xr.open_dataset(outname) as ds_grid:
+        return ds_grid.load()
+
+
+@pytest.mark.parametrize(
+    "first_depths, new_depths",
+    [
+        ([50, 60, 55, 58, 40, 60], [45, 52, 50, 48]),
+        # the new dives go deeper than the existing grid
+        ([50, 60, 55, 58, 40, 60], [80, 92, 70, 88]),
+    ],
+)
+def test_incremental_grid_matches_full_grid(tmp_path, monkeypatch, first_depths, new_depths):
+    monkeypatch.setattr(grid_glider_data, "adcp_data_present", lambda platform_serial, mission: False)
+    ds = make_timeseries(first_depths + new_depths)
+    # the deepest sample of the first dives lies on the bottom edge of their grid, so it is only gridded
+    # once the grid extends below it
+    n_first = len(first_depths) * 200 - 50
+    ds["depth"].values[np.argmax(ds.depth.values[:n_first])] = 60.0
+    full = grid_timeseries(monkeypatch, tmp_path / "full", ds)
+    # the first grid is made while the last of the first profiles is still being uploaded
+    grid_timeseries(monkeypatch, tmp_path / "incremental", ds.isel(time=slice(0, n_first)))
+    incremental = grid_timeseries(monkeypatch, tmp_path / "incremental", ds, incremental=True)
+    xr.testing.assert_identical(incremental, full)
+
+
+@pytest.mark.parametrize("chunk_profiles", [1, 3, 4])
+def test_chunked_grid_matches_in_memory_grid(tmp_path, monkeypatch, chunk_profiles):
+    monkeypatch.setattr(grid_glider_data, "adcp_data_present", lambda platform_serial, mission: False)
+    ds = make_timeseries([50, 60, 55, 58, 40, 60, 80, 92, 70, 88, 30])
+    # the end of each profile is numbered between profiles, so the samples of profile bins 3 and 4 span
+    # the boundaries of chunks of 3 and 4 profiles
+    profile_num = ds.profile_num.values
+    profile_num[np.r_[np.diff(profile_num) > 0, False] | (np.arange(len(profile_num)) % 200 > 185)] += 0.5
+    assert np.all(np.diff(profile_num) >= 0)
+    in_memory = grid_timeseries(monkeypatch, tmp_path / "in_memory", ds, kind="raw")
+    chunked = grid_timeseries(monkeypatch, tmp_path / "chunked", ds, kind="raw", chunk_profiles=chunk_profiles)
+    assert np.isfinite(in_memory.temperature.values).sum() > 300
+    xr.testing.assert_identical(chunked, in_memory)
+
+
+if __name__ == "__main__":
+    # benchmark against the column-by-column loop on a mission-sized grid with a few gaps
+    grid = np.tile(np.linspace(5, 15, 250)[:, np.newaxis], (1, 5000))
+    grid[np.random.default_rng(0).random(grid.shape) < 0.03] = np.nan
+    grid[:5] = np.nan
+    loop_time = timeit.timeit(lambda: gappy_fill_vertical_loop(grid.copy()), number=5) / 5
+    vector_time = timeit.timeit(lambda: gappy_fill_vertical(grid.copy()), number=5) / 5
+    print(f"loop: {loop_time * 1000:.1f} ms, vectorized: {vector_time * 1000:.1f} ms, "
+          f"speedup: {loop_time / vector_time:.1f}x")
@@ -0,0 +1,58 @@
+import datetime
+from votoutils.utilities import job_state
+
+
+def test_job_lifecycle(tmp_path):
+    db = tmp_path / "jobs.sqlite"
+    assert job_state.get_job("SEA070", 29, "raw", db_path=db) is None
+    job_state.start_job("SEA070", 29, "raw", input_hash="abc", db_path=db)
+    job_state.fail_job("SEA070", 29, "raw", ValueError("no pld files"), db_path=db)
+    job_state.start_job("SEA070", 29, "raw", input_hash="abd", db_path=db)
+    job_state.finish_job("SEA070", 29, "raw", datetime.timedelta(minutes=3), db_path=db)
+    job_state.finish_job("SEA045", 12, "raw", 60, db_path=db)
+    job = job_state.get_job("SEA070", 29, "raw", db_path=db)
+    assert job["status"] == "done"
+    assert job["attempts"] == 2
+    assert job["input_hash"] == "abd"
+    assert job["duration"] == 180
+    assert job["error"] is None
+    df = job_state.jobs(kind="raw", status="done", db_path=db)
+    assert list(df.platform_serial) == ["SEA070", "SEA045"]
+    assert job_state.jobs(kind="sub", db_path=db).empty
+
+
+def test_mission_lock(tmp_path, monkeypatch):
+    monkeypatch.setattr(job_state, "lock_dir", tmp_path / "locks")
+    with job_state.mission_lock("SEA070", 29, "raw") as locked:
+        assert locked
+        with job_state.mission_lock("SEA070", 29, "raw") as locked_again:
+            assert not locked_again
+        with job_state.mission_lock("SEA070", 30, "raw") as other_mission:
+            assert other_mission
+    with job_state.mission_lock("SEA070", 29, "raw") as locked:
+        assert locked
+
+
+def test_can_retry(tmp_path, monkeypatch):
+    db = tmp_path / "jobs.sqlite"
+    monkeypatch.setattr(job_state, "lock_dir", tmp_path / "locks")
+    # a failure before start_job counts as an attempt
+    job_state.fail_job("SEA070", 29, "raw", ValueError("no pld files"), db_path=db)
+    job = job_state.get_job("SEA070", 29, "raw", db_path=db)
+    assert job["attempts"] == 1
+    assert job_state.can_retry(job, max_attempts=3)
+    job_state.fail_job("SEA070", 29, "raw", ValueError("no pld files"), db_path=db)
+    job_state.start_job("SEA070", 29, "raw", db_path=db)
+    job_state.fail_job("SEA070", 29, "raw", ValueError("bad gli file"), db_path=db)
+    job = job_state.get_job("SEA070", 29, "raw", db_path=db)
+    assert job["attempts"] == 3
+    assert not job_state.can_retry(job, max_attempts=3)
+
+    # a job left running is retried once no process holds its mission lock
+    job_state.start_job("SEA045", 12, "raw", db_path=db)
+    job = job_state.get_job("SEA045", 12, "raw", db_path=db)
+    with job_state.mission_lock("SEA045", 12, "raw"):
+        assert not job_state.can_retry(job, max_attempts=3)
+    assert job_state.can_retry(job, max_attempts=3)
+    job_state.finish_job("SEA045", 12, "raw", 60, db_path=db)
+    assert not job_state.can_retry(job_state.get_job("SEA045", 12, "raw", db_path=db), max_attempts=3)
@@ -0,0 +1,59 @@
+from pathlib import Path
+import pandas as pd
+import pytest
+from votoutils.glider import make_og1
+
+
+def fake_export_og1(infile, outfile):
+    Path(outfile).write_bytes(Path(infile).read_bytes())
+    return f"{Path(infile).parts[-4]}_{Path(infile).parts[-3]}_og1"
+
+
+@pytest.fixture
+def archive(tmp_path, monkeypatch):
+    monkeypatch.setattr(make_og1, "l0_dir", tmp_path)
+    monkeypatch.setattr(make_og1, "og1_dir", tmp_path / "og1")
+    monkeypatch.setattr(make_og1, "manifest_file", tmp_path / "og1" / "og1_manifest.csv")
+    monkeypatch.setattr(make_og1, "export_og1", fake_export_og1)
+    paths = []
+    for platform_serial, mission in [("SEA045", 12), ("SEA076", 21)]:
+        nc_path = tmp_path / "complete_mission" / platform_serial / f"M{mission}" / "timeseries" / "mission_timeseries.nc"
+        nc_path.parent.mkdir(parents=True)
+        nc_path.write_bytes(f"{platform_serial} {mission}".encode())
+        paths.append(nc_path)
+    return paths
+
+
+def exported_files(entries):
+    return sorted(entry["og1_file"] for entry in entries)
+
+
+def test_export_fleet_skips_unchanged_missions(archive, monkeypatch):
+    first = make_og1.export_fleet(kinds=("raw",), max_workers=1)
+    assert exported_files(first) == ["SEA045_M12_og1.nc", "SEA076_M21_og1.nc"]
+    manifest = pd.read_csv(make_og1.manifest_file)
+    assert list(manifest.glider) == ["SEA045", "SEA076"]
+    assert make_og1.export_fleet(kinds=("raw",), max_workers=1) == []
+
+    # a changed source timeseries or a missing OG1 file are exported again
+    archive[0].write_bytes(b"reprocessed")
+    (make_og1.og1_dir / "SEA076_M21_og1.nc").unlink()
+    assert exported_files(make_og1.export_fleet(kinds=("raw",), max_workers=1)) == [
+        "SEA045_M12_og1.nc",
+        "SEA076_M21_og1.nc",
+    ]
+    assert (make_og1.og1_dir / "SEA045_M12_og1.nc").read_bytes() == b"reprocessed"
+
+    # so is everything after a change to the converter, or when reprocessing
+    monkeypatch.setattr(make_og1, "converter_version", lambda: "new")
+    assert len(make_og1.export_fleet(kinds=("raw",), max_workers=1)) == 2
+    assert make_og1.export_fleet(kinds=("raw",), max_workers=1) == []
+    assert len(make_og1.export_fleet(kinds=("raw",), max_workers=1, reprocess=True)) == 2
+    assert set(pd.read_csv(make_og1.manifest_file).converter_version) == {"new"}
+
+
+def test_converter_version_covers_imported_modules():
+    names = [path.name for path in make_og1.converter_modules()]
+    for name in ["convert_to_og1.py", "utilities.py", "vocabularies.py", "vocab_registry.py"]:
+        assert name in names
+    assert "make_og1.py" not in names
@@ -0,0 +1,94 @@
+import gzip
+from votoutils.fixers import merge_fragments
+from votoutils.fixers.merge_fragments import merge_files, merge_dive_fragments
+from votoutils.utilities import raw_catalog
+
+header = "PLD_REALTIMECLOCK;NAV_DEPTH;LEGATO_TEMPERATURE;\n"
+
+
+def rows(seconds, value=1.0):
+    return [f"01/05/2024 10:{second // 60:02d}:{second % 60:02d}.000;{second};{value};\n" for second in seconds]
+
+
+def test_merge_files(tmp_path):
+    first = tmp_path / "sea061.48.pld1.raw.12.gz"
+    with gzip.open(first, "wt") as fout:
+        fout.write(header + "".join(rows(range(0, 100, 2))))
+    second = tmp_path / "sea061.48.pld1.raw.12"
+    second.write_text(header + "".join(rows(range(1, 100, 2))))
+    # duplicated transfer of part of the dive, plus a different row at an existing timestamp
+    third = tmp_path / "sea061.48.pld1.raw.1248.gz"
+    with gzip.open(third, "wt") as fout:
+        fout.write(header + "".join(rows(range(50, 61)) + rows([60], value=2.0) + rows(range(61, 80))))
+    outfile = tmp_path / "merged.gz"
+    stats = merge_files([first, second, third], outfile)
+    with gzip.open(outfile, "rt") as fin:
+        merged = fin.readlines()
+    expected = sorted(rows(range(100)) + rows([60], value=2.0))
+    assert merged[0] == header
+    assert merged[1:] == expected
+    assert stats == {"rows_in": 131, "rows_out": 101}
+
+
+def test_merge_dive_fragments(tmp_path):
+    db = tmp_path / "catalog.sqlite"
+    mission_dir = tmp_path / "raw" / "complete_mission" / "SEA061" / "M48"
+    mission_dir.mkdir(parents=True)
+    with gzip.open(mission_dir / "sea061.48.pld1.raw.12.gz", "wt") as fout:
+        fout.write(header + "".join(rows(range(0, 10))))
+    (mission_dir / "sea061.48.pld1.raw.12").write_text(header + "".join(rows(range(5, 20))))
+    with gzip.open(mission_dir / "sea061.48.pld1.raw.13.gz", "wt") as fout:
+        fout.write(header + "".join(rows(range(20, 30))))
+    raw_catalog.refresh_catalog(db_path=db, root=tmp_path / "raw")
+    groups = raw_catalog.fragments("SEA061", 48, db_path=db)
+    assert len(groups) == 1
+    outfile = merge_dive_fragments(groups[0])
+    assert outfile == mission_dir / "sea061.48.pld1.raw.12.gz"
+    with gzip.open(outfile, "rt") as fin:
+        assert fin.readlines()[1:] == rows(range(20))
+    assert sorted(path.name for path in (mission_dir / "fragments").iterdir()) == [
+        "sea061.48.pld1.raw.12",
+        "sea061.48.pld1.raw.12.gz",
+    ]
+    raw_catalog.refresh_catalog(db_path=db, root=tmp_path / "raw")
+    assert raw_catalog.fragments("SEA061", 48, db_path=db) == []
+
+
+def test_merge_dive_fragments_rerun_keeps_original(tmp_path):
+    original = header + "".join(rows(range(0, 10)))
+    first = tmp_path / "sea061.48.pld1.raw.12.gz"
+    with gzip.open(first, "wt") as fout:
+        fout.write(original)
+    second = tmp_path / "sea061.48.pld1.raw.1248.gz"
+    with gzip.open(second, "wt") as fout:
+        fout.write(header + "".join(rows(range(10, 20))))
+    # a run interrupted after the merged file replaced the first fragment, before the second was moved aside
+    merge_dive_fragments([first, second])
+    (tmp_path / "fragments" / second.name).rename(second)
+    merge_dive_fragments([first, second])
+    with gzip.open(tmp_path / "fragments" / first.name, "rt") as fin:
+        assert fin.read() == original
+    with gzip.open(first, "rt") as fin:
+        assert fin.readlines()[1:] == rows(range(20))
+
+
+def test_merge_mission_fragments_skips_failed_dives(tmp_path, monkeypatch):
+    with gzip.open(tmp_path / "sea061.48.pld1.raw.12.gz", "wt") as fout:
+        fout.write(header + "".join(rows(range(0, 10))))
+    (tmp_path / "sea061.48.pld1.raw.12").write_text("PLD_REALTIMECLOCK;NAV_DEPTH;\n")
+    with gzip.open(tmp_path / "sea061.48.pld1.raw.13.gz", "wt") as fout:
+        fout.write(header + "".join(rows(range(20, 30))))
+    (tmp_path / "sea061.48.pld1.raw.13").write_text(header + "".join(rows(range(25, 40))))
+    groups = [
+        [tmp_path / "sea061.48.pld1.raw.12.gz", tmp_path / "sea061.48.pld1.raw.12"],
+        [tmp_path / "sea061.48.pld1.raw.13.gz", tmp_path / "sea061.48.pld1.raw.13"],
+    ]
+    monkeypatch.setattr(raw_catalog, "fragments", lambda platform_serial, mission, source: groups)
+    monkeypatch.setattr(raw_catalog, "refresh_catalog", lambda: None)
+    merged = merge_fragments.merge_mission_fragments("SEA061", 48, max_workers=1)
+    assert merged == [tmp_path / "sea061.48.pld1.raw.13.gz"]
+    assert (tmp_path / "sea061.48.pld1.raw.12").exists()
+    assert sorted(path.name for path in (tmp_path / "fragments").iterdir()) == [
+        "sea061.48.pld1.raw.13",
+        "sea061.48.pld1.raw.13.gz",
+    ]
@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import xarray as xr
+from votoutils.glider import metocc
+
+
+def make_timeseries(n):
+    time = pd.date_range("2024-05-01", periods=n, freq="1500ms")
+    ds = xr.Dataset(coords={"time": ("time", time)})
+    for i, var in enumerate(metocc.metocc_vars):
+        values = np.linspace(i, i + 1, n)
+        values[::7] = np.nan
+        ds[var] = ("time", values, {"standard_name": f"sea_{var}", "units": "1"})
+    ds.attrs = {
+        "glider_serial": "SEA070",
+        "deployment_id": 29,
+        "sea_name": "Baltic Sea",
+        "geospatial_lat_max": 58.0,
+        "geospatial_lat_min": 57.0,
+        "geospatial_lon_max": 18.0,
+        "geospatial_lon_min": 17.0,
+        "time_coverage_end": str(time[-1]),
+    }
+    return ds
+
+
+def test_metocc_append_matches_rewrite(tmp_path, monkeypatch):
+    monkeypatch.setattr(metocc, "state_dir", tmp_path / "state")
+    monkeypatch.setattr(metocc, "metocc_dir", lambda meta: tmp_path / "metocc")
+    ds = make_timeseries(1000)
+    nc_file = tmp_path / "mission_timeseries.nc"
+    ds.isel(time=slice(0, 600)).to_netcdf(nc_file)
+    base = metocc.create_csv(nc_file)
+    csv_file = base.with_suffix(".csv")
+    first_size = csv_file.stat().st_size
+    ds.to_netcdf(nc_file)
+    metocc.create_csv(nc_file)
+    appended = csv_file.read_text()
+    assert csv_file.stat().st_size > first_size
+    metocc.create_csv(nc_file, rewrite=True)
+    assert appended == csv_file.read_text()
+    # same text as the pandas writer this replaced, with missing values as empty fields
+    baseline = pd.DataFrame(
+        {
+            f"{ds[var].attrs['standard_name']} ({ds[var].attrs['units']})": ds[var].values
+            for var in metocc.metocc_vars
+        },
+        index=pd.Index(ds.time.values, name="datetime"),
+    )
+    assert appended == baseline.to_csv()
+    assert "NaN" not in appended
+    df = pd.read_csv(csv_file, parse_dates=["datetime"])
+    assert len(df) == 1000
+    assert (df["datetime"].values == ds.time.values).all()
+    np.testing.assert_allclose(df["sea_salinity (1)"].values, ds.salinity.values)
+    # re-running without new data leaves the csv untouched
+    metocc.create_csv(nc_file)
+    assert appended == csv_file.read_text()
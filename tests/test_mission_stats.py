@@ -0,0 +1,31 @@
+import logging
+import pandas as pd
+from votoutils.monitor import mission_stats
+from votoutils.utilities import raw_catalog, utilities
+
+
+def sampling_period(glider, mission):
+    return {"glider": glider, "mission": mission, "ctd_period": 2.0, "oxy_period": 4.0}
+
+
+def test_old_stats_rows_are_recomputed(tmp_path, monkeypatch, caplog):
+    stats_file = tmp_path / "stats.csv"
+    # written before periods were total seconds: 2 s and 4 s periods were recorded as 0
+    pd.DataFrame({"glider": [70, 45], "mission": [29, 12], "ctd_period": [0.0, 0.0], "oxy_period": [0.0, 0.0]}).to_csv(
+        stats_file,
+        index=False,
+    )
+    monkeypatch.setattr(mission_stats, "stats_file", stats_file)
+    monkeypatch.setattr(raw_catalog, "refresh_catalog", lambda: None)
+    monkeypatch.setattr(raw_catalog, "missions", lambda source: [("SEA070", 29), ("SEA045", 12)])
+    monkeypatch.setattr(utilities, "sensor_sampling_period", sampling_period)
+    mission_stats.compute_glider_stats(max_workers=1)
+    df = pd.read_csv(stats_file)
+    assert list(zip(df.glider, df.mission)) == [(45, 12), (70, 29)]
+    assert (df.ctd_period == 2.0).all() and (df.oxy_period == 4.0).all()
+    assert (df.version == mission_stats.stats_version).all()
+    # current rows are not computed again
+    with caplog.at_level(logging.INFO, logger=mission_stats.__name__):
+        mission_stats.compute_glider_stats(max_workers=1)
+    assert "computing sampling periods for 0 missions" in caplog.messages
+    assert pd.read_csv(stats_file).equals(df)
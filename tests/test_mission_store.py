@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+import xarray as xr
+from votoutils.utilities.mission_store import (
+    write_mission_store,
+    read_mission_store,
+    read_last_profiles,
+    profile_range,
+)
+
+
+def make_timeseries(n=50000):
+    rng = np.random.default_rng(0)
+    time = pd.date_range("2024-05-01", periods=n, freq="1s")
+    profile_num = np.arange(n) // 250
+    ds = xr.Dataset(coords={"time": ("time", time)})
+    ds["profile_num"] = ("time", profile_num.astype(float))
+    ds["dive_num"] = ("time", (profile_num // 2).astype(float))
+    ds["temperature"] = ("time", rng.normal(10, 1, n))
+    ds["salinity"] = ("time", rng.normal(7, 0.1, n))
+    ds["nav_state"] = ("time", rng.choice([110.0, 117.0, np.nan], n))
+    ds["nav_state"].encoding["dtype"] = np.dtype("int16")
+    return ds
+
+
+def test_mission_store_round_trip(tmp_path):
+    ds = make_timeseries()
+    store = tmp_path / "mission_timeseries.parquet"
+    write_mission_store(ds, store)
+    df = read_mission_store(store)
+    np.testing.assert_array_equal(df.index.values, ds.time.values)
+    np.testing.assert_array_equal(df["temperature"].values, ds["temperature"].values)
+    np.testing.assert_array_equal(df["nav_state"].astype(float).values, ds["nav_state"].values)
+    assert profile_range(store) == (0, 199)
+
+
+def test_mission_store_subsets(tmp_path):
+    ds = make_timeseries()
+    store = tmp_path / "mission_timeseries.parquet"
+    write_mission_store(ds, store)
+    df = read_last_profiles(store, 20, columns=["temperature", "salinity"])
+    assert list(df.columns) == ["temperature", "salinity"]
+    expected = ds.where(ds.profile_num >= 180, drop=True)
+    np.testing.assert_array_equal(df["salinity"].values, expected["salinity"].values)
+    df = read_mission_store(store, columns=["temperature"], start="2024-05-01T01:00", end="2024-05-01T02:00")
+    assert len(df) == 3600
+    assert df.index[0] == pd.Timestamp("2024-05-01T01:00")
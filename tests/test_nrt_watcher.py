@@ -0,0 +1,55 @@
+import os
+from votoutils.utilities import nrt_watcher
+
+
+def _mission_dir(root, platform_serial, mission):
+    files_dir = root / "nrt" / platform_serial / str(mission).zfill(6) / "C-Csv"
+    files_dir.mkdir(parents=True)
+    return files_dir
+
+
+def test_dir_mtimes(tmp_path):
+    _mission_dir(tmp_path, "SEA070", 28)
+    files_dir = _mission_dir(tmp_path, "SEA070", 29)
+    _mission_dir(tmp_path, "SEA045", 12)
+    (tmp_path / "nrt" / "SEA045" / "000013").mkdir()
+    mtimes = nrt_watcher.dir_mtimes(tmp_path)
+    assert set(mtimes.keys()) == {("SEA070", 28), ("SEA070", 29), ("SEA045", 12)}
+    assert nrt_watcher.latest_missions(mtimes) == [("SEA045", 12), ("SEA070", 29)]
+    before = mtimes[("SEA070", 29)]
+    (files_dir / "sea070.29.gli.sub.12").write_text("Timestamp;NavState\n")
+    os.utime(files_dir, (before + 5, before + 5))
+    after = nrt_watcher.dir_mtimes(tmp_path)
+    assert after[("SEA070", 29)] != before
+    assert after[("SEA070", 28)] == mtimes[("SEA070", 28)]
+
+
+def test_debounce():
+    pending = {}
+    previous = {("SEA070", 29): 1.0, ("SEA045", 12): 1.0}
+    # a burst of uploads keeps SEA070 M29 pending until it has been quiet for debounce seconds
+    nrt_watcher.update_pending(pending, previous, {("SEA070", 29): 2.0, ("SEA045", 12): 1.0}, now=100)
+    assert list(pending.keys()) == [("SEA070", 29)]
+    nrt_watcher.update_pending(pending, previous, {("SEA070", 29): 3.0, ("SEA045", 12): 1.0}, now=130)
+    assert nrt_watcher.pop_due(pending, now=150, debounce=60, max_wait=600) == []
+    assert pending[("SEA070", 29)] == (100, 130)
+    assert nrt_watcher.pop_due(pending, now=190, debounce=60, max_wait=600) == [("SEA070", 29)]
+    assert pending == {}
+    # a new mission directory is pending too, and continuous uploads are processed after max_wait
+    for now in range(0, 700, 30):
+        nrt_watcher.update_pending(pending, {}, {("SEA045", 13): float(now)}, now=now)
+        due = nrt_watcher.pop_due(pending, now=now, debounce=60, max_wait=600)
+        if due:
+            break
+    assert due == [("SEA045", 13)]
+    assert now == 600
+
+
+def test_write_heartbeat(tmp_path):
+    heartbeat_file = tmp_path / "watcher_heartbeat.log"
+    nrt_watcher.write_heartbeat(heartbeat_file, "watching 3 nrt missions, 1 pending")
+    nrt_watcher.write_heartbeat(heartbeat_file, "watching 3 nrt missions, 0 pending")
+    lines = heartbeat_file.read_text().splitlines()
+    assert len(lines) == 1
+    assert lines[0].endswith(" watching 3 nrt missions, 0 pending")
+    assert list(tmp_path.iterdir()) == [heartbeat_file]
@@ -0,0 +1,116 @@
+import os
+import sqlite3
+import time
+from votoutils.utilities import raw_catalog
+
+
+def make_raw_tree(root):
+    complete = root / "complete_mission" / "SEA070" / "M29"
+    complete.mkdir(parents=True)
+    for dive in [1, 2, 10]:
+        (complete / f"sea070.29.gli.sub.{dive}.gz").write_text(f"gli {dive}")
+    for dive in [2, 10, 11]:
+        (complete / f"sea070.29.pld1.raw.{dive}.gz").write_text(f"pld {dive}")
+    for mission in [3, 12]:
+        nrt = root / "nrt" / "SEA045" / str(mission).zfill(6) / "C-Csv"
+        nrt.mkdir(parents=True)
+        (nrt / f"sea045.{mission}.gli.sub.9").write_text("gli")
+        (nrt / f"sea045.{mission}.gli.sub.10").write_text("gli")
+    (root / "nrt" / "SEA045" / "000013").mkdir()
+    return complete
+
+
+def test_catalog_queries(tmp_path):
+    db = tmp_path / "catalog.sqlite"
+    raw_catalog.refresh_catalog(db_path=db, root=tmp_path / "raw")
+    assert raw_catalog.missions(db_path=db) == []
+    complete = make_raw_tree(tmp_path / "raw")
+    raw_catalog.refresh_catalog(db_path=db, root=tmp_path / "raw")
+    assert raw_catalog.missions(db_path=db) == [("SEA070", 29)]
+    assert raw_catalog.missions(source="nrt", db_path=db) == [("SEA045", 3), ("SEA045", 12), ("SEA045", 13)]
+    assert raw_catalog.missions(source="nrt", with_files_dir=True, db_path=db)[-1] == ("SEA045", 12)
+    gli, pld = raw_catalog.matched_files("SEA070", 29, db_path=db)
+    assert [os.path.basename(path) for path in gli] == ["sea070.29.gli.sub.2.gz", "sea070.29.gli.sub.10.gz"]
+    assert [os.path.basename(path) for path in pld] == ["sea070.29.pld1.raw.2.gz", "sea070.29.pld1.raw.10.gz"]
+    nrt_files = raw_catalog.mission_files("SEA045", 12, source="nrt", pattern="*gli*", db_path=db)
+    assert os.path.basename(nrt_files[-1]) == "sea045.12.gli.sub.10"
+
+    checkpoint = time.time()
+    (complete / "sea070.29.gli.sub.11.gz").write_text("gli 11")
+    (complete / "sea070.29.gli.sub.1.gz").unlink()
+    raw_catalog.refresh_catalog(db_path=db, root=tmp_path / "raw")
+    assert [os.path.basename(row[2]) for row in raw_catalog.files_since(checkpoint, db_path=db)] == [
+        "sea070.29.gli.sub.11.gz",
+    ]
+    gli, pld = raw_catalog.matched_files("SEA070", 29, db_path=db)
+    assert len(gli) == len(pld) == 3
+    assert len(raw_catalog.mission_files("SEA070", 29, pattern="*gli*", db_path=db)) == 3
+
+
+def test_parse_raw_name():
+    assert raw_catalog.parse_raw_name("sea045.43.pld1.raw.12.gz") == ("pld1", "raw", 12)
+    assert raw_catalog.parse_raw_name("sea045.43.gli.sub.7") == ("gli", "sub", 7)
+
+
+def test_refresh_rechecks_newest_dives(tmp_path):
+    db = tmp_path / "catalog.sqlite"
+    complete = make_raw_tree(tmp_path / "raw")
+    raw_catalog.refresh_catalog(db_path=db, root=tmp_path / "raw")
+    dir_mtime = os.stat(complete).st_mtime
+    # files still being written grow without changing their directory mtime
+    for name in ["sea070.29.pld1.raw.11.gz", "sea070.29.gli.sub.1.gz"]:
+        with open(complete / name, "a") as fout:
+            fout.write(" more rows")
+    os.utime(complete, (dir_mtime, dir_mtime))
+    raw_catalog.refresh_catalog(db_path=db, root=tmp_path / "raw")
+    con = raw_catalog.connect(db)
+    sizes = dict(con.execute("SELECT name, size FROM files"))
+    con.close()
+    assert sizes["sea070.29.pld1.raw.11.gz"] == len("pld 11 more rows")
+    assert sizes["sea070.29.gli.sub.1.gz"] == len("gli 1")
+    raw_catalog.refresh_catalog(db_path=db, root=tmp_path / "raw", full=True)
+    con = raw_catalog.connect(db)
+    sizes = dict(con.execute("SELECT name, size FROM files"))
+    con.close()
+    assert sizes["sea070.29.gli.sub.1.gz"] == len("gli 1 more rows")
+
+
+def test_refresh_hashes_outside_write_transaction(tmp_path, monkeypatch):
+    db = tmp_path / "catalog.sqlite"
+    make_raw_tree(tmp_path / "raw")
+    raw_catalog.connect(db).close()
+    hash_file = raw_catalog.file_hash
+
+    def file_hash_with_writer(path):
+        # another pipeline job writes to the catalog while files are hashed
+        con = sqlite3.connect(db, timeout=0)
+        con.execute("BEGIN IMMEDIATE")
+        con.rollback()
+        con.close()
+        return hash_file(path)
+
+    monkeypatch.setattr(raw_catalog, "file_hash", file_hash_with_writer)
+    raw_catalog.refresh_catalog(db_path=db, root=tmp_path / "raw")
+    assert len(raw_catalog.mission_files("SEA070", 29, db_path=db)) == 6
+
+
+def test_fragments_of_split_uploads(tmp_path):
+    db = tmp_path / "catalog.sqlite"
+    mission_dir = tmp_path / "raw" / "complete_mission" / "SEA061" / "M48"
+    mission_dir.mkdir(parents=True)
+    for dive in range(1, 16):
+        (mission_dir / f"sea061.48.gli.sub.{dive}.gz").write_text(f"gli {dive}")
+        (mission_dir / f"sea061.48.pld1.raw.{dive}.gz").write_text(f"pld {dive}")
+    # second parts of split uploads of dives 12 and 5, and a duplicated transfer of dive 7
+    (mission_dir / "sea061.48.pld1.raw.1248.gz").write_text("pld 12 part 2")
+    (mission_dir / "sea061.48.pld1.raw.548.gz").write_text("pld 5 part 2")
+    (mission_dir / "sea061.48.pld1.raw.7").write_text("pld 7")
+    raw_catalog.refresh_catalog(db_path=db, root=tmp_path / "raw")
+    groups = raw_catalog.fragments("SEA061", 48, db_path=db)
+    assert [[os.path.basename(path) for path in group] for group in groups] == [
+        ["sea061.48.pld1.raw.5.gz", "sea061.48.pld1.raw.548.gz"],
+        ["sea061.48.pld1.raw.7", "sea061.48.pld1.raw.7.gz"],
+        ["sea061.48.pld1.raw.12.gz", "sea061.48.pld1.raw.1248.gz"],
+    ]
+    # dive numbers within the regular sequence of a long mission are not split parts
+    assert raw_catalog.split_dives(48, set(range(1, 1300)) | {123448}) == {123448: 1234}
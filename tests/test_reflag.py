@@ -0,0 +1,103 @@
+import hashlib
+import netCDF4
+import numpy as np
+import pandas as pd
+import xarray as xr
+from votoutils.qc import flag_qartod, reflag
+
+
+def make_timeseries(n=2000):
+    rng = np.random.default_rng(1)
+    ds = xr.Dataset(coords={"time": ("time", pd.date_range("2024-05-01", periods=n, freq="2s").values)})
+
+    def add(name, values, units="1"):
+        ds[name] = ("time", values, {"long_name": name, "standard_name": name, "units": units})
+
+    add("longitude", 17 + np.cumsum(rng.normal(0, 1e-6, n)))
+    add("latitude", 57 + np.cumsum(rng.normal(0, 1e-6, n)))
+    ds = ds.set_coords(["longitude", "latitude"])
+    depth = 50 + 45 * np.sin(np.arange(n) / 300)
+    add("depth", depth)
+    add("pressure", depth * 1.01)
+    add("temperature", 10 - depth / 20 + rng.normal(0, 0.05, n))
+    add("salinity", 7 + depth / 20 + rng.normal(0, 0.02, n))
+    add("conductivity", 1.0 + depth / 200, "S m-1")
+    add("chlorophyll", np.abs(rng.normal(1, 0.5, n)))
+    ds["temperature"].values[[100, 1500]] = [25.0, 45.0]
+    ds.attrs["title"] = "test mission"
+    return ds
+
+
+def _sha(path):
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def write_stale_timeseries(nc_path):
+    ds = flag_qartod.flagger(make_timeseries(), max_workers=1)
+    # stale published flags: temperature was not flagged, salinity has an old comment, chlorophyll has no qc
+    ds["temperature_qc"].values[:] = 1
+    ds["salinity_qc"].attrs["comment"] = "old thresholds"
+    ds = ds.drop_vars("chlorophyll_qc")
+    encoding = {
+        var_name: {"dtype": "i1", "_FillValue": reflag.qc_fill_value} for var_name in ds if var_name.endswith("_qc")
+    }
+    nc_path.parent.mkdir(parents=True, exist_ok=True)
+    ds.to_netcdf(nc_path, encoding=encoding)
+    return ds
+
+
+def test_reflag_timeseries(tmp_path, monkeypatch):
+    monkeypatch.setattr(flag_qartod, "flag_pilot", lambda ds: ds)
+    nc_path = tmp_path / "mission_timeseries.nc"
+    ds = write_stale_timeseries(nc_path)
+    data_vars = [var_name for var_name in ds.variables if not var_name.endswith("_qc")]
+    with netCDF4.Dataset(nc_path) as nc:
+        before = {var_name: (nc[var_name][:].copy(), nc[var_name].__dict__) for var_name in data_vars}
+
+    updated = reflag.reflag_timeseries(nc_path)
+    assert sorted(updated) == ["chlorophyll_qc", "salinity_qc", "temperature_qc"]
+
+    expected = flag_qartod.flagger(make_timeseries(), max_workers=1)
+    expected = reflag.flag_bad_locations(expected)
+    with xr.open_dataset(nc_path) as ds_out:
+        for var_name in ["temperature_qc", "salinity_qc", "chlorophyll_qc", "longitude_qc"]:
+            np.testing.assert_array_equal(ds_out[var_name].values, expected[var_name].values)
+            assert ds_out[var_name].attrs["comment"] == expected[var_name].attrs["comment"]
+        assert (ds_out["temperature_qc"] == 4).any()
+        assert ds_out["chlorophyll_qc"].attrs["flag_values"].dtype == np.int8
+    with netCDF4.Dataset(nc_path) as nc:
+        assert nc["chlorophyll_qc"].dtype == np.int8
+        for var_name, (values, attrs) in before.items():
+            np.testing.assert_array_equal(nc[var_name][:], values)
+            assert nc[var_name][:].dtype == values.dtype
+            assert nc[var_name].__dict__.keys() == attrs.keys()
+            for key, val in attrs.items():
+                np.testing.assert_array_equal(nc[var_name].getncattr(key), val)
+
+    # a second run finds nothing to change and leaves the file untouched
+    sha = _sha(nc_path)
+    assert reflag.reflag_timeseries(nc_path) == []
+    assert _sha(nc_path) == sha
+
+
+def test_reflag_fleet(tmp_path, monkeypatch):
+    monkeypatch.setattr(flag_qartod, "flag_pilot", lambda ds: ds)
+    monkeypatch.setattr(reflag, "l0_dir", tmp_path)
+
+    def flagger(ds, max_workers=4):
+        # fleet workers must not start a process pool of their own
+        assert max_workers == 1
+        return flag_qartod.flagger(ds, max_workers=max_workers)
+
+    monkeypatch.setattr(reflag, "flagger", flagger)
+    nrt_path = reflag._timeseries_path("SEA045", 12, "sub")
+    complete_path = reflag._timeseries_path("SEA045", 12, "raw")
+    assert nrt_path == tmp_path / "nrt/SEA045/M12/timeseries/mission_timeseries.nc"
+    write_stale_timeseries(nrt_path)
+    write_stale_timeseries(complete_path)
+    assert reflag.reflag_mission("SEA045", 13, "sub") == []
+    reflag.reflag_fleet(kinds=("sub",), max_workers=1)
+    with xr.open_dataset(nrt_path) as ds_nrt, xr.open_dataset(complete_path) as ds_complete:
+        assert "chlorophyll_qc" in ds_nrt
+        assert "chlorophyll_qc" not in ds_complete
+    assert reflag.reflag_mission("SEA045", 12, "sub", max_workers=1) == []
@@ -0,0 +1,28 @@
+import gzip
+import polars as pl
+from votoutils.utilities import seaexplorer_csv
+
+pld_text = (
+    "PLD_REALTIMECLOCK;NAV_DEPTH;LEGATO_TEMPERATURE;NOC_SAMPLE_TIME;\n"
+    "01/05/2024 10:00:00.250;1.5;10.1;3;\n"
+    "01/05/2024 10:00:00.750;2;;4;\n"
+)
+
+
+def test_read_seaexplorer_csv(tmp_path):
+    plain = tmp_path / "sea070.29.pld1.raw.3"
+    plain.write_text(pld_text)
+    compressed = tmp_path / "sea070.29.pld1.raw.4.gz"
+    with gzip.open(compressed, "wt") as fout:
+        fout.write(pld_text)
+    df = seaexplorer_csv.read_seaexplorer_csv(plain)
+    assert df.schema["PLD_REALTIMECLOCK"] == pl.Datetime
+    assert df.schema["NOC_SAMPLE_TIME"] == pl.Float64
+    assert df["PLD_REALTIMECLOCK"][1].microsecond == 750000
+    assert df["LEGATO_TEMPERATURE"].null_count() == 1
+    assert df.equals(seaexplorer_csv.read_seaexplorer_csv(compressed))
+    assert seaexplorer_csv.column_schema(compressed) == seaexplorer_csv.column_schema(plain)
+    projected = seaexplorer_csv.read_seaexplorer_csv(compressed, columns=["NAV_DEPTH"], n_rows=1)
+    assert projected.columns == ["NAV_DEPTH"] and len(projected) == 1
+    strings = seaexplorer_csv.read_seaexplorer_csv(plain, cast_numeric=False, parse_time=False)
+    assert strings["NAV_DEPTH"].to_list() == ["1.5", "2"]
@@ -0,0 +1,64 @@
+import gzip
+import numpy as np
+import xarray as xr
+from votoutils.utilities import utilities
+from votoutils.utilities.utilities import set_best_dtype, apply_encoding_profile
+
+
+def test_set_best_dtype_encodes_without_copy(tmp_path):
+    ds = xr.Dataset(
+        {
+            "temperature": ("time", np.array([10.5, np.nan, 11.25])),
+            "temperature_qc": ("time", np.array([1.0, 9.0, np.nan])),
+            "backscatter_raw": ("time", np.array([100.0, np.nan, 70000.0])),
+            "nav_state": ("time", np.array([117.0, 110.0, -40000.0])),
+            "latitude": ("time", np.array([57.1, 57.2, 57.3]), {"valid_min": -90.0}),
+        },
+    )
+    temperature = ds["temperature"].values
+    ds = set_best_dtype(ds, int_vars=["nav_state"])
+    assert ds["temperature"].values is temperature
+    ds.to_netcdf(tmp_path / "ts.nc")
+    ds_raw = xr.open_dataset(tmp_path / "ts.nc", decode_cf=False)
+    assert ds_raw["temperature"].dtype == np.float32
+    assert ds_raw["temperature_qc"].dtype == np.int8
+    np.testing.assert_array_equal(ds_raw["temperature_qc"].values, [1, 9, 127])
+    assert ds_raw["backscatter_raw"].dtype == np.int32
+    assert ds_raw["nav_state"].dtype == np.int32
+    assert ds_raw["latitude"].dtype == np.float64
+    ds_in = xr.open_dataset(tmp_path / "ts.nc")
+    np.testing.assert_array_equal(ds_in["backscatter_raw"].values, [100, np.nan, 70000])
+
+
+def test_apply_encoding_profile_quantizes(tmp_path):
+    rng = np.random.default_rng(0)
+    chlorophyll = rng.gamma(2, 0.5, 100000)
+    ds = xr.Dataset(
+        {
+            "chlorophyll": ("time", chlorophyll),
+            "temperature": ("time", rng.normal(10, 1, 100000)),
+            "oxygen_concentration": ("time", rng.normal(300, 5, 100000), {"significant_digits": 2}),
+        },
+    )
+    ds = apply_encoding_profile(ds, "erddap")
+    ds.to_netcdf(tmp_path / "ts.nc")
+    ds_raw = xr.open_dataset(tmp_path / "ts.nc", decode_cf=False)
+    assert ds_raw["chlorophyll"].attrs["_QuantizeGranularBitRoundNumberOfSignificantDigits"] == 3
+    assert ds_raw["oxygen_concentration"].attrs["_QuantizeGranularBitRoundNumberOfSignificantDigits"] == 2
+    assert not any("_Quantize" in key for key in ds_raw["temperature"].attrs)
+    np.testing.assert_allclose(ds_raw["chlorophyll"].values, chlorophyll, rtol=5e-3)
+
+
+def test_sensor_sampling_period(tmp_path, monkeypatch):
+    monkeypatch.setattr(utilities, "complete_mission_raw_dir", tmp_path)
+    mission_dir = tmp_path / "SEA70" / "M29"
+    mission_dir.mkdir(parents=True)
+    lines = ["PLD_REALTIMECLOCK;LEGATO_TEMPERATURE;AROD_FT_DO;\n"]
+    for second in range(120):
+        temperature = "10.5" if second % 2 == 0 else ""
+        oxygen = "300.1" if second % 4 == 0 else ""
+        lines.append(f"01/05/2024 10:{second // 60:02d}:{second % 60:02d}.250;{temperature};{oxygen};\n")
+    with gzip.open(mission_dir / "sea070.29.pld1.raw.10.gz", "wt") as fout:
+        fout.write("".join(lines))
+    periods = utilities.sensor_sampling_period(70, 29)
+    assert periods == {"glider": 70, "mission": 29, "ctd_period": 2.0, "oxy_period": 4.0}
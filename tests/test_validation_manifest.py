@@ -0,0 +1,69 @@
+import os
+from votoutils.utilities import validation_manifest
+from votoutils.utilities.validation_manifest import validate_files, read_manifest
+
+
+def test_unchanged_files_are_skipped(tmp_path):
+    in_dir = tmp_path / "C-Csv"
+    in_dir.mkdir()
+    for dive in range(1, 6):
+        (in_dir / f"sea070.29.gli.sub.{dive}").write_text(f"dive {dive}\n")
+    manifest_file = tmp_path / "manifest.csv"
+    calls = []
+
+    def validator(path):
+        calls.append(os.path.basename(path))
+        if path.endswith(".2"):
+            os.unlink(path)
+            return "deleted"
+        if path.endswith(".3"):
+            with open(path, "a") as fout:
+                fout.write("repaired\n")
+            return "repaired"
+        return "ok"
+
+    verdicts = validate_files(sorted(in_dir.glob("sea*")), "test", validator, manifest_file)
+    assert len(verdicts) == 5
+    df = read_manifest(manifest_file)
+    assert len(df) == 4
+    assert df.set_index("path").loc[str(in_dir / "sea070.29.gli.sub.3"), "verdict"] == "repaired"
+
+    calls.clear()
+    (in_dir / "sea070.29.gli.sub.6").write_text("dive 6\n")
+    # same content with a new mtime is not validated again
+    os.utime(in_dir / "sea070.29.gli.sub.1", (0, 0))
+    validate_files(sorted(in_dir.glob("sea*")), "test", validator, manifest_file)
+    assert calls == ["sea070.29.gli.sub.6"]
+
+    calls.clear()
+    (in_dir / "sea070.29.gli.sub.4").write_text("dive 4 changed\n")
+    validate_files(sorted(in_dir.glob("sea*")), "test", validator, manifest_file)
+    assert calls == ["sea070.29.gli.sub.4"]
+    # a different check validates every file again
+    calls.clear()
+    validate_files(sorted(in_dir.glob("sea*")), "other", validator, manifest_file)
+    assert len(calls) == 5
+    assert len(read_manifest(manifest_file)) == 10
+
+
+def test_second_run_hashes_nothing(tmp_path, monkeypatch):
+    in_dir = tmp_path / "C-Csv"
+    in_dir.mkdir()
+    for dive in range(1, 301):
+        path = in_dir / f"sea070.29.gli.sub.{dive}"
+        path.write_text(f"dive {dive}\n")
+        # nanosecond mtimes, as written by the filesystem, that a float does not hold exactly
+        os.utime(path, ns=(1714557600123456789 + dive * 1000003, 1714557600123456789 + dive * 1000003))
+    manifest_file = tmp_path / "manifest.csv"
+    hashed = []
+
+    def file_hash(path):
+        hashed.append(path)
+        return str(path)
+
+    monkeypatch.setattr(validation_manifest, "file_hash", file_hash)
+    validate_files(sorted(in_dir.glob("sea*")), "test", lambda path: "ok", manifest_file)
+    assert len(hashed) == 300
+    hashed.clear()
+    assert validate_files(sorted(in_dir.glob("sea*")), "test", lambda path: "ok", manifest_file) == {}
+    assert hashed == []
@@ -0,0 +1,37 @@
+import pytest
+import xarray as xr
+from votoutils.glider.convert_to_og1 import add_sensors
+from votoutils.utilities import vocabularies
+from votoutils.utilities.vocab_registry import get_registry
+
+
+def test_views_do_not_modify_registry():
+    registry = get_registry()
+    view = registry.sensor("RBR legato CTD")
+    view["long_name"] += ":1234"
+    view["serial_number"] = "1234"
+    assert registry.sensor("RBR legato CTD")["long_name"] == "RBR Legato3 CTD"
+    assert "serial_number" not in registry.sensor_vocabs["RBR legato CTD"]
+    assert vocabularies.sensor_vocabs["RBR legato CTD"]["long_name"] == "RBR Legato3 CTD"
+    with pytest.raises(TypeError):
+        registry.sensor_vocabs["RBR legato CTD"]["long_name"] = "changed"
+
+
+def test_reverse_indexes():
+    registry = get_registry()
+    uri = registry.vocab_attrs["TEMP"]["vocabulary"]
+    assert registry.name_from_uri(uri) == "TEMP"
+    assert registry.name_from_uri(uri.replace("http://", "https://").rstrip("/") + "/") == "TEMP"
+    assert registry.name_from_uri("https://example.org/not/a/vocab") is None
+    assert "RBR legato CTD" in registry.make_models("CTD")
+    assert registry.make_models("not a sensor type") == ()
+
+
+def test_add_sensors_repeatable():
+    attrs = {"ctd": str({"make_model": "RBR legato CTD", "serial": 12345})}
+    long_names = []
+    for i in range(3):
+        ds = xr.Dataset(attrs=dict(attrs))
+        ds, dsa = add_sensors(ds, xr.Dataset())
+        long_names.append(dsa["SENSOR_CTD_12345"].attrs["long_name"])
+    assert long_names == ["RBR Legato3 CTD:12345"] * 3
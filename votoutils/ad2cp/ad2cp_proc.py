@@ -6,6 +6,7 @@ import pandas as pd
 import subprocess
 from votoutils.upload.sync_functions import sync_script_dir
 from votoutils.utilities.utilities import missions_no_proc
+from votoutils.utilities import raw_catalog
 import logging
 _log = logging.getLogger(__name__)
 
@@ -203,12 +204,10 @@ def proc_gliderad2cp(platform_serial, mission, reprocess=False):
 
 
 def proc_all_ad2cp():
-    in_paths = list(Path("/data/data_raw/complete_mission").glob("S*/M*"))
-    print(in_paths)
-    for inpath in in_paths:
-        parts = inpath.parts
-        platform_serial = parts[-2]
-        mission = int(parts[-1][1:])
+    raw_catalog.refresh_catalog()
+    for platform_serial, mission in raw_catalog.missions(source="complete_mission"):
+        if not platform_serial.startswith("S"):
+            continue
         if [platform_serial, mission] in missions_no_proc:
             print(f"{platform_serial} M{mission} in mission_no_proc. Skipping")
             continue
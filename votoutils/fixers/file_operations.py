@@ -1,7 +1,11 @@
+import os
+import shutil
 import subprocess
 import logging
 import polars as pl
 from pathlib import Path
+from votoutils.utilities.seaexplorer_csv import read_seaexplorer_csv
+from votoutils.utilities.validation_manifest import validate_files, manifest_path
 
 _log = logging.getLogger(__name__)
 
@@ -13,65 +17,74 @@ bad_dives = [
 ]
 
 
+def repair_nrt_file(file_path):
+    """
+    Remove spaces, lines missing ; delimiters and short lines from a csv in a single streaming pass. The repaired
+    file is written to a temporary file that replaces the original, so an interrupted repair leaves the
+    original untouched. Returns a dict of line statistics
+    """
+    file_path = Path(file_path)
+    fn = file_path.name
+    tmp_path = file_path.with_name(f".{fn}.tmp")
+    stats = {"lines": 0, "kept": 0, "missing_delimiter": 0, "short": 0, "spaces_removed": 0}
+    goodline_len = 0
+    i = 0
+    num_semi = 0
+    try:
+        with open(file_path) as fin, open(tmp_path, "w") as fout:
+            for line in fin:
+                stats["lines"] += 1
+                stripped = line.replace(" ", "")
+                stats["spaces_removed"] += len(line) - len(stripped)
+                line = stripped
+                if i > 3:
+                    if not num_semi:
+                        num_semi = line.count(";")
+                    if line.count("9999.0") < 4 and not goodline_len:
+                        goodline_len = len(line)
+                if line.count(";") < num_semi:
+                    _log.info(f"MISSING ; in {fn}: {line}")
+                    stats["missing_delimiter"] += 1
+                    continue
+                if len(line) + 30 < goodline_len:
+                    _log.info(f"SHORT LINE {fn}: {line}")
+                    stats["short"] += 1
+                    continue
+                fout.write(line)
+                stats["kept"] += 1
+                i += 1
+            fout.flush()
+            os.fsync(fout.fileno())
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    shutil.copymode(file_path, tmp_path)
+    os.replace(tmp_path, file_path)
+    _log.info(f"repaired {fn}: {stats}")
+    return stats
+
+
+def clean_nrt_file(file_path):
+    file_path = Path(file_path)
+    fn = file_path.name
+    if fn in bad_dives:
+        _log.info(f"Removing bad dive {fn}")
+        subprocess.check_call(["/usr/bin/rm", str(file_path)])
+        return "removed"
+    try:
+        read_seaexplorer_csv(file_path)
+    except (pl.exceptions.ComputeError, pl.exceptions.InvalidOperationError):
+        _log.info(f"Error reading {fn}. Removing whitespace and malformed lines from this file")
+        repair_nrt_file(file_path)
+        return "repaired"
+    return "ok"
+
+
 def clean_nrt_bad_files(in_dir):
     _log.info(f"Start cleanup of nrt files from {in_dir}")
     in_dir = Path(in_dir)
     file_paths = in_dir.glob("sea*sub*")
-    for file_path in file_paths:
-        fn = file_path.name
-        if fn in bad_dives:
-            _log.info(f"Removing bad dive {fn}")
-            subprocess.check_call(["/usr/bin/rm", str(file_path)])
-            continue
-        try:
-            out = pl.read_csv(file_path, separator=";")
-            if "Timestamp" in out.columns:
-                out.with_columns(
-                    pl.col("Timestamp").str.strptime(
-                        pl.Datetime,
-                        format="%d/%m/%Y %H:%M:%S",
-                    ),
-                )
-            else:
-                out.with_columns(
-                    pl.col("PLD_REALTIMECLOCK").str.strptime(
-                        pl.Datetime,
-                        format="%d/%m/%Y %H:%M:%S.%3f",
-                    ),
-                )
-            for col_name in out.columns:
-                if "time" not in col_name.lower() or col_name == "NOC_SAMPLE_TIME":
-                    out = out.with_columns(pl.col(col_name).cast(pl.Float64))
-        except (pl.exceptions.ComputeError, pl.exceptions.InvalidOperationError):
-            _log.info(f"Error reading {fn}. Removing whitespace from this file")
-            with open(file_path, 'r') as infile:
-                content = infile.read()
-            content = content.replace(' ', '')
-            with open(file_path, 'w') as infile:
-                infile.write(content)
-            goodlines = []
-            with open(file_path) as f:
-                goodline_len = 0
-                i = 0
-                num_semi = 0
-                for line in f.readlines():
-                    if i > 3:
-                        if not num_semi:
-                            num_semi = line.count(';')
-                        if line.count("9999.0") < 4 and not goodline_len:
-                            goodline_len = len(line)
-                    if line.count(';') < num_semi:
-                        _log.info(f"MISSING ; in {fn}: {line}")
-                        continue
-                    if len(line) + 30 < goodline_len:
-                        _log.info(f"SHORT LINE {fn}: {line}")
-                        continue
-                    goodlines.append(line)
-                    i += 1
-
-            with open(file_path, "w") as f:
-                for line in goodlines:
-                    f.write(line)
+    validate_files(file_paths, "nrt_parse", clean_nrt_file, manifest_path(in_dir))
     _log.info(f"Complete cleanup of nrt files from {in_dir}")
 
 
@@ -0,0 +1,237 @@
+"""
+Run data fixes across the processed missions of the fleet. Each fix declares the variables it reads and the
+variables it may write. Only the read variables are loaded, and only written variables or global attributes
+whose encoded values changed are overwritten in place in the netCDF, so files are never copied and rewritten.
+Finished missions are recorded in a done-manifest with the mtime in nanoseconds of the patched file. Interrupted runs
+resume from there and missions are fixed again only if their file was reprocessed since.
+
+python votoutils/fixers/fleet_fixer.py adcp_times --kind raw
+python votoutils/fixers/fleet_fixer.py dark_counts --kind sub --missions SEA076_M21
+"""
+import argparse
+import datetime
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+import netCDF4
+import numpy as np
+import pandas as pd
+import xarray as xr
+from votoutils.glider.fix_chla import fix_dark_counts
+from votoutils.glider.fix_oxygen_alseamar_bug import recalc_oxygen
+from votoutils.utilities.utilities import encode_times
+
+_log = logging.getLogger(__name__)
+
+manifest_file = Path("/home/pipeline/fixer_manifest.csv")
+manifest_columns = ["fix", "path", "mtime_ns", "changed", "done"]
+creation_keys = ["zlib", "complevel", "shuffle", "chunksizes", "compression", "contiguous"]
+
+fixes = {
+    "adcp_times": {
+        "function": encode_times,
+        "reads": ["time", "ad2cp_time"],
+        "writes": ["ad2cp_time"],
+        "all_missions": True,
+    },
+    "dark_counts": {
+        "function": fix_dark_counts,
+        "reads": ["time", "depth", "chlorophyll", "chlorophyll_raw"],
+        "writes": ["chlorophyll", "chlorophyll_uncorrected"],
+        # dark counts are corrected per mission after inspection, never fleet wide
+        "all_missions": False,
+    },
+    "alseamar_oxygen": {
+        "function": recalc_oxygen,
+        "reads": [
+            "time",
+            "oxygen_concentration",
+            "oxygen_led_counts",
+            "oxygen_ad_counts",
+            "temperature_oxygen",
+            "pressure",
+            "salinity",
+            "potential_temperature",
+        ],
+        "writes": ["oxygen_concentration", "oxygen_concentration_uncorrected"],
+        "all_missions": True,
+    },
+}
+
+
+def _encoded(da, name, dtype=None):
+    variable = da.variable
+    if dtype is not None:
+        variable = variable.copy(deep=False)
+        variable.encoding = {**variable.encoding, "dtype": dtype}
+    var = xr.conventions.encode_cf_variable(variable, name=name)
+    return np.asarray(var.values), dict(var.attrs), var.encoding
+
+
+def _encoded_as(da, name, dtype):
+    """
+    Encode da with the dtype already on disk, e.g. int64 times with whatever units keep them exact. Raises if
+    the values cannot be stored faithfully in that dtype
+    """
+    values, attrs, encoding = _encoded(da, name, dtype=dtype)
+    decoded = xr.conventions.decode_cf_variable(name, xr.Variable(da.dims, values, attrs))
+    if values.dtype != dtype or not decoded.equals(da.variable):
+        raise ValueError(f"cannot patch {name} in place: values do not fit the stored dtype {dtype}")
+    return values, attrs, encoding
+
+
+def _same(a, b):
+    if a.dtype != b.dtype or a.shape != b.shape:
+        return False
+    if a.dtype.kind == "f":
+        return np.array_equal(a, b, equal_nan=True)
+    return np.array_equal(a, b)
+
+
+def _same_attr(a, b):
+    a = np.asarray(a)
+    b = np.asarray(b)
+    return np.array_equal(a, b, equal_nan=a.dtype.kind == "f" and b.dtype.kind == "f")
+
+
+def _same_attrs(a, b):
+    if a.keys() != b.keys():
+        return False
+    return all(_same_attr(a[key], b[key]) for key in a.keys())
+
+
+def patch_netcdf(nc_path, ds_fixed, ds_orig, writes):
+    """
+    Overwrite in place the variables in writes, and the global attributes, that differ between ds_fixed and
+    ds_orig. Variables not yet in the file are created, existing variables keep their stored dtype. Returns the
+    names of the changed variables and attributes
+    """
+    changed = []
+    with netCDF4.Dataset(nc_path, "a") as nc:
+        for name in writes:
+            if name not in ds_fixed.variables:
+                continue
+            values, attrs, encoding = _encoded(ds_fixed[name], name)
+            if name in nc.variables and nc.variables[name].dtype != values.dtype:
+                # variables cannot be removed from a netCDF, so keep the stored dtype
+                values, attrs, encoding = _encoded_as(ds_fixed[name], name, nc.variables[name].dtype)
+            orig_attrs = {}
+            if name in ds_orig.variables:
+                orig_values, orig_attrs, orig_encoding = _encoded(ds_orig[name], name)
+                if _same(values, orig_values) and _same_attrs(attrs, orig_attrs):
+                    continue
+            fill_value = attrs.pop("_FillValue", None)
+            if name not in nc.variables:
+                kwargs = {key: val for key, val in encoding.items() if key in creation_keys}
+                nc.createVariable(name, values.dtype, ds_fixed[name].dims, fill_value=fill_value, **kwargs)
+            ncvar = nc.variables[name]
+            ncvar.set_auto_maskandscale(False)
+            ncvar[:] = values
+            # attributes xarray keeps in encoding, e.g. coordinates, are not in attrs and must be left alone
+            for key in ncvar.ncattrs():
+                if key in orig_attrs.keys() and key not in attrs.keys() and key != "_FillValue":
+                    ncvar.delncattr(key)
+            ncvar.setncatts(attrs)
+            changed.append(name)
+        for key, val in ds_fixed.attrs.items():
+            if key not in ds_orig.attrs.keys() or not _same_attr(val, ds_orig.attrs[key]):
+                nc.setncattr(key, val)
+                changed.append(key)
+    return changed
+
+
+def fix_mission(fix_name, nc_path):
+    """Apply a fix to one mission file in place. Returns a done-manifest row"""
+    fix = fixes[fix_name]
+    with xr.open_dataset(nc_path) as ds_file:
+        reads = [name for name in fix["reads"] if name in ds_file.variables]
+        ds_orig = ds_file[reads].load()
+    ds_fixed = fix["function"](ds_orig.copy(deep=True))
+    changed = patch_netcdf(nc_path, ds_fixed, ds_orig, fix["writes"])
+    if changed:
+        _log.info(f"{fix_name}: patched {', '.join(changed)} in {nc_path}")
+    return {
+        "fix": fix_name,
+        "path": str(nc_path),
+        "mtime_ns": os.stat(nc_path).st_mtime_ns,
+        "changed": " ".join(changed),
+        "done": datetime.datetime.now().isoformat(timespec="seconds"),
+    }
+
+
+def read_manifest():
+    if not manifest_file.exists():
+        return pd.DataFrame(columns=manifest_columns)
+    return pd.read_csv(manifest_file, dtype={"mtime_ns": "Int64"})
+
+
+def write_manifest(rows):
+    tmp_file = manifest_file.with_suffix(".tmp")
+    df = pd.DataFrame(rows, columns=manifest_columns)
+    # rows from an older manifest have no mtime_ns, keep the column integer rather than float
+    df["mtime_ns"] = pd.array([row.get("mtime_ns") for row in rows], dtype="Int64")
+    df.to_csv(tmp_file, index=False)
+    tmp_file.rename(manifest_file)
+
+
+def mission_files(kinds=("raw",), missions=None):
+    nc_paths = []
+    for kind in kinds:
+        infix = "nrt" if kind == "sub" else "complete_mission"
+        for nc_path in sorted(
+            Path(f"/data/data_l0_pyglider/{infix}").glob("*/M*/timeseries/mission_timeseries.nc"),
+        ):
+            glidermission = f"{nc_path.parts[-4]}_{nc_path.parts[-3]}"
+            if missions and glidermission not in missions:
+                continue
+            nc_paths.append(nc_path)
+    return nc_paths
+
+
+def run_fix(fix_name, kinds=("raw",), missions=None, max_workers=4):
+    """
+    Apply a fix to all missions of kinds, or to the missions listed as e.g. SEA076_M21. Missions already in
+    the done-manifest with an unchanged file are skipped
+    """
+    if not fixes[fix_name]["all_missions"] and not missions:
+        raise ValueError(f"fix {fix_name} must be run on explicitly listed missions")
+    rows = {(row["fix"], row["path"]): row for row in read_manifest().to_dict("records")}
+    todo = []
+    for nc_path in mission_files(kinds, missions):
+        previous = rows.get((fix_name, str(nc_path)))
+        # integer nanoseconds, a float mtime does not survive the csv round trip exactly
+        if previous and previous.get("mtime_ns") == os.stat(nc_path).st_mtime_ns:
+            continue
+        todo.append(nc_path)
+    _log.info(f"{fix_name}: {len(todo)} missions to fix")
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(fix_mission, fix_name, nc_path): nc_path for nc_path in todo}
+        for future in as_completed(futures):
+            try:
+                row = future.result()
+            except Exception as e:
+                _log.error(f"{fix_name} failed for {futures[future]}: {e}")
+                continue
+            rows[(fix_name, row["path"])] = row
+            write_manifest(list(rows.values()))
+    _log.info(f"{fix_name}: done")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="apply a data fix to processed missions in place")
+    parser.add_argument("fix", type=str, choices=list(fixes.keys()), help="fix to apply")
+    parser.add_argument("--kind", type=str, help="Kind of input. Can specify sub or raw. Defaults to raw")
+    parser.add_argument("--missions", nargs="+", help="Only fix these missions, e.g. SEA076_M21")
+    parser.add_argument("--workers", type=int, default=4, help="Number of missions to fix in parallel")
+    args = parser.parse_args()
+    if args.kind not in ["raw", "sub", None]:
+        raise ValueError("kind must be raw or sub")
+    logging.basicConfig(
+        filename="/data/log/fixer.log",
+        filemode="a",
+        format="%(asctime)s %(levelname)-8s %(message)s",
+        level=logging.INFO,
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+    run_fix(args.fix, kinds=(args.kind or "raw",), missions=args.missions, max_workers=args.workers)
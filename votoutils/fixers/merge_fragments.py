@@ -0,0 +1,143 @@
+"""
+Merge fragments of the same SeaExplorer dive file, e.g. split uploads or duplicated transfers, into one gzipped
+file. Fragments are streamed and merged by timestamp without being loaded into memory, rows that appear in more
+than one fragment are written once and the original lines are kept unchanged.
+
+python votoutils/fixers/merge_fragments.py sea061.48.pld1.raw.1234.gz sea061.48.pld1.raw.123448.gz --outfile fix_pld/sea061.48.pld1.raw.1234.gz
+"""
+import argparse
+import gzip
+import heapq
+import logging
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from votoutils.utilities import raw_catalog
+
+_log = logging.getLogger(__name__)
+
+
+def _open(path, mode="rt"):
+    opener = gzip.open if str(path).endswith(".gz") else open
+    return opener(path, mode, encoding="utf-8", errors="surrogateescape", newline="")
+
+
+def time_key(line):
+    # dd/mm/YYYY HH:MM:SS.fff to YYYYmmdd HH:MM:SS.fff, which sorts as text
+    stamp = line.split(";", 1)[0]
+    return stamp[6:10] + stamp[3:5] + stamp[0:2] + stamp[10:]
+
+
+def _rows(fin, path):
+    last_key = ""
+    for line in fin:
+        if not line.strip():
+            continue
+        if not line.endswith("\n"):
+            line += "\n"
+        key = time_key(line)
+        if key < last_key:
+            _log.warning(f"{path} is not sorted by time at {line.strip()}")
+        last_key = key
+        yield key, line
+
+
+def merge_files(paths, outfile):
+    """
+    k-way merge of time sorted SeaExplorer csv fragments with identical headers into a gzipped outfile.
+    Returns a dict with the number of rows read and written
+    """
+    outfile = Path(outfile)
+    tmp_file = outfile.with_name(f".{outfile.name}.tmp")
+    stats = {"rows_in": 0, "rows_out": 0}
+    fins = []
+    try:
+        for path in paths:
+            fins.append(_open(path))
+        headers = [fin.readline() for fin in fins]
+        if len(set(header.rstrip("\r\n") for header in headers)) > 1:
+            raise ValueError(f"cannot merge fragments with different headers: {paths}")
+        with gzip.open(tmp_file, "wt", encoding="utf-8", errors="surrogateescape", newline="") as fout:
+            fout.write(headers[0])
+            current_key = None
+            current_lines = set()
+            for key, line in heapq.merge(*[_rows(fin, path) for fin, path in zip(fins, paths)], key=lambda row: row[0]):
+                stats["rows_in"] += 1
+                if key != current_key:
+                    current_key = key
+                    current_lines = set()
+                if line in current_lines:
+                    continue
+                current_lines.add(line)
+                fout.write(line)
+                stats["rows_out"] += 1
+    except BaseException:
+        tmp_file.unlink(missing_ok=True)
+        raise
+    finally:
+        for fin in fins:
+            fin.close()
+    os.replace(tmp_file, outfile)
+    return stats
+
+
+def merge_dive_fragments(paths):
+    """
+    Merge the fragments of one dive in a mission directory to a single .gz file. The original fragments are
+    kept in a fragments subdirectory
+    """
+    paths = [Path(path) for path in paths]
+    base_name = min((path.name for path in paths), key=len)
+    if base_name.endswith(".gz"):
+        base_name = base_name[:-3]
+    outfile = paths[0].parent / f"{base_name}.gz"
+    fragment_dir = paths[0].parent / "fragments"
+    fragment_dir.mkdir(exist_ok=True)
+    merged = outfile.with_name(f".{outfile.name}.merged")
+    stats = merge_files(paths, merged)
+    # keep a copy of the fragment that is overwritten, then move the rest aside once the merged file is in place
+    # so an interrupted merge can be rerun. A rerun must not replace the copy of the original with the merged file
+    backup = fragment_dir / outfile.name
+    if outfile in paths and not backup.exists():
+        shutil.copy2(outfile, backup)
+    os.replace(merged, outfile)
+    for path in paths:
+        if path != outfile:
+            os.replace(path, fragment_dir / path.name)
+    _log.info(f"merged {len(paths)} fragments into {outfile}: {stats}")
+    return outfile
+
+
+def merge_mission_fragments(platform_serial, mission, source="complete_mission", max_workers=4):
+    """
+    Merge all fragmented dives of a mission found by the raw catalog. Returns the merged files. Dives that fail
+    to merge, e.g. fragments with different headers, are logged and their fragments are left in place
+    """
+    groups = raw_catalog.fragments(platform_serial, mission, source=source)
+    if not groups:
+        return []
+    _log.info(f"merging {len(groups)} fragmented files for {platform_serial} M{mission}")
+    merged = []
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(merge_dive_fragments, group) for group in groups]
+        for group, future in zip(groups, futures):
+            try:
+                merged.append(future.result())
+            except Exception as e:
+                _log.error(f"failed to merge fragments {[str(path) for path in group]}: {e}")
+    raw_catalog.refresh_catalog()
+    return merged
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="merge fragments of a SeaExplorer dive file")
+    parser.add_argument("fragments", nargs="+", help="fragment files to merge")
+    parser.add_argument("--outfile", type=str, required=True, help="merged gzip file to write")
+    args = parser.parse_args()
+    logging.basicConfig(
+        format="%(asctime)s %(levelname)-8s %(message)s",
+        level=logging.INFO,
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+    _log.info(merge_files(args.fragments, args.outfile))
@@ -70,7 +70,7 @@ if __name__ == "__main__":
         root_dir = f"/data/data_l0_pyglider/{sub_dir}/SEA{str(args.glider)}/M{str(args.mission)}"
         _log.info(f"working on ncs in {root_dir}")
         nc_files = []
-        for sub in ("profiles", "timeseries", "gridfiles"):
+        for sub in ("profiles", "timeseries", "gridfiles", "gridfiles_coarse"):
             nc_files.append(list(pathlib.Path(root_dir).glob(f"**/{sub}/*.nc")))
         nc_files_flat = list(chain.from_iterable(nc_files))
         if not nc_files:
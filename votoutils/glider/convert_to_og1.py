@@ -2,8 +2,13 @@ import datetime
 import pandas as pd
 import numpy as np
 import xarray as xr
-from votoutils.utilities.utilities import encode_times_og1, set_best_dtype
+from votoutils.utilities.utilities import (
+    encode_times_og1,
+    set_best_dtype,
+    apply_encoding_profile,
+)
 from votoutils.utilities import vocabularies
+from votoutils.utilities.vocab_registry import get_registry
 import logging
 
 _log = logging.getLogger(__name__)
@@ -32,22 +37,23 @@ def add_sensors(ds, dsa):
         if isinstance(eval(var), dict):
             sensors.append(key)
 
+    registry = get_registry()
     sensor_name_type = {}
     for instr in sensors:
         if instr in ["altimeter"]:
             continue
         attr_dict = eval(attrs[instr])
-        if attr_dict["make_model"] not in vocabularies.sensor_vocabs.keys():
+        if attr_dict["make_model"] not in registry.sensor_vocabs.keys():
             _log.error(f"sensor {attr_dict['make_model']} not found")
             continue
-        var_dict = vocabularies.sensor_vocabs[attr_dict["make_model"]]
+        var_dict = registry.sensor(attr_dict["make_model"])
         if "serial" in attr_dict.keys():
             var_dict["serial_number"] = str(attr_dict["serial"])
             var_dict["long_name"] += f":{str(attr_dict['serial'])}"
         for var_name in ["calibration_date", "calibration_parameters"]:
             if var_name in attr_dict.keys():
                 var_dict[var_name] = str(attr_dict[var_name])
-        da = xr.DataArray(attrs=var_dict)
+        da = xr.DataArray(attrs=dict(var_dict))
         sensor_var_name = f"sensor_{var_dict['sensor_type']}_{var_dict['serial_number']}".upper().replace(
             " ",
             "_",
@@ -71,6 +77,20 @@ def add_sensors(ds, dsa):
     return ds, dsa
 
 
+def seaex_to_og1_phase(seaex_phase):
+    standard_phase = np.zeros(len(seaex_phase)).astype(int)
+    standard_phase[seaex_phase == 115] = 3
+    standard_phase[seaex_phase == 116] = 3
+    standard_phase[seaex_phase == 119] = 3
+    standard_phase[seaex_phase == 110] = 5
+    standard_phase[seaex_phase == 118] = 5
+    standard_phase[seaex_phase == 100] = 2
+    standard_phase[seaex_phase == 117] = 1
+    standard_phase[seaex_phase == 123] = 4
+    standard_phase[seaex_phase == 124] = 4
+    return standard_phase
+
+
 def convert_to_og1(ds, num_vals=None):
     """
     Based on example by Jen Seva https://github.com/OceanGlidersCommunity/OG-format-user-manual/pull/136/files
@@ -79,7 +99,8 @@ def convert_to_og1(ds, num_vals=None):
     e.g. mass_concentration_of_chlorophyll_a_in_sea_water from https://vocab.nerc.ac.uk/collection/P07/current/CF14N7/
     :param ds: dataset to convert
     :param num_vals: optional argument to subset input dataset to first num_values values default=None for no subset
-    :return: converted dataset
+    :return: converted dataset. If ds is backed by dask arrays, so is the output: variables are
+    mapped lazily and only computed when written
     """
     dsa = xr.Dataset()
     for var_name in list(ds) + list(ds.coords):
@@ -87,14 +108,14 @@ def convert_to_og1(ds, num_vals=None):
             continue
         dsa[var_name] = (
             "N_MEASUREMENTS",
-            ds[var_name].values[:num_vals],
+            ds[var_name].data[:num_vals],
             ds[var_name].attrs,
         )
         qc_name = f"{var_name}_QC"
         if qc_name in list(ds):
             dsa[qc_name] = (
                 "N_MEASUREMENTS",
-                ds[qc_name].values[:num_vals].astype("int8"),
+                ds[qc_name].data[:num_vals],
                 ds[qc_name].attrs,
             )
             dsa[qc_name].attrs["long_name"] = (
@@ -104,15 +125,27 @@ def convert_to_og1(ds, num_vals=None):
             dsa[qc_name].attrs["flag_values"] = np.array((1, 2, 3, 4, 9)).astype("int8")
             dsa[qc_name].attrs["flag_meanings"] = "GOOD UNKNOWN SUSPECT FAIL MISSING"
             dsa[var_name].attrs["ancillary_variables"] = qc_name
+    dsa = add_og1_derived_variables(ds, dsa, num_vals=num_vals)
+    # coordinates are included, their dtype encoding from standardise_og10 is not carried over
+    dsa = set_best_dtype(dsa, var_names=list(dsa.variables))
+    return dsa
+
+
+def add_og1_derived_variables(ds, dsa, num_vals=None):
+    """
+    Add the variables and attributes derived from the mapped measurements: TIME in seconds, *_GPS, PHASE,
+    sensors, platform and deployment metadata
+    :param ds: source dataset, used for global attributes
+    :param dsa: dataset of measurement variables on the N_MEASUREMENTS dimension
+    :param num_vals: number of values ds was truncated to, recorded in the comment
+    """
     if "time" in str(dsa.TIME.dtype):
-        var_name = "TIME"
-        dsa[var_name].values = dsa[var_name].values.astype(float)
-        if np.nanmean(dsa[var_name].values) > 1e12:
-            dsa[var_name].values = dsa[var_name].values / 1e9
+        dsa["TIME"] = dsa["TIME"].astype(float)
+        if dsa["TIME"].mean().values > 1e12:
+            dsa["TIME"] = dsa["TIME"].copy(data=dsa["TIME"].data / 1e9)
     dsa = dsa.set_coords(("TIME", "LATITUDE", "LONGITUDE", "DEPTH"))
     for vname in ["LATITUDE", "LONGITUDE", "TIME"]:
-        dsa[f"{vname}_GPS"] = dsa[vname].copy()
-        dsa[f"{vname}_GPS"].values[dsa["NAV_STATE"].values != 119] = np.nan
+        dsa[f"{vname}_GPS"] = dsa[vname].where(dsa["NAV_STATE"] == 119)
         dsa[f"{vname}_GPS"].attrs["long_name"] = f"{vname.lower()} of each GPS location"
     dsa["LATITUDE_GPS"].attrs["vocabulary"] = (
         "https://vocab.nerc.ac.uk/collection/OG1/current/LAT_GPS/"
@@ -120,25 +153,16 @@ def convert_to_og1(ds, num_vals=None):
     dsa["LONGITUDE_GPS"].attrs["vocabulary"] = (
         "https://vocab.nerc.ac.uk/collection/OG1/current/LON_GPS/"
     )
-    seaex_phase = dsa["NAV_STATE"].values
-    standard_phase = np.zeros(len(seaex_phase)).astype(int)
-    standard_phase[seaex_phase == 115] = 3
-    standard_phase[seaex_phase == 116] = 3
-    standard_phase[seaex_phase == 119] = 3
-    standard_phase[seaex_phase == 110] = 5
-    standard_phase[seaex_phase == 118] = 5
-    standard_phase[seaex_phase == 100] = 2
-    standard_phase[seaex_phase == 117] = 1
-    standard_phase[seaex_phase == 123] = 4
-    standard_phase[seaex_phase == 124] = 4
-    dsa["PHASE"] = xr.DataArray(
-        standard_phase,
-        coords=dsa["LATITUDE"].coords,
-        attrs={
-            "long_name": "behavior of the glider at sea",
-            "phase_vocabulary": "https://github.com/OceanGlidersCommunity/OG-format-user-manual/blob/main/vocabularyCollection/phase.md",
-        },
+    dsa["PHASE"] = xr.apply_ufunc(
+        seaex_to_og1_phase,
+        dsa["NAV_STATE"],
+        dask="parallelized",
+        output_dtypes=[int],
     )
+    dsa["PHASE"].attrs = {
+        "long_name": "behavior of the glider at sea",
+        "phase_vocabulary": "https://github.com/OceanGlidersCommunity/OG-format-user-manual/blob/main/vocabularyCollection/phase.md",
+    }
     ds, dsa = add_sensors(ds, dsa)
     attrs = {}  # ds.attrs
     for key in ["glider_serial", "dataset_id", "contributor_name", "comment"]:
@@ -146,7 +170,8 @@ def convert_to_og1(ds, num_vals=None):
     for drop_attr in ["Metadata_Conventions"]:
         if drop_attr in attrs.keys():
             attrs.pop(drop_attr)
-    start_datetime = pd.to_datetime(dsa.TIME.values, unit="s").min()
+    deployment_time = float(dsa.TIME.min())
+    start_datetime = pd.to_datetime(deployment_time, unit="s")
     ts = start_datetime.strftime("%Y%m%dT%H%M")
     dt_created = datetime.datetime.now().strftime("%Y%m%dT%H%M")
     if "delayed" in ds.attrs["dataset_id"]:
@@ -205,19 +230,18 @@ def convert_to_og1(ds, num_vals=None):
         f"sea{ds.attrs['glider_serial'].zfill(3)}",
         attrs={"long_name": "glider serial number"},
     )
-    dsa["DEPLOYMENT_TIME"] = np.nanmin(dsa.TIME.values)
+    dsa["DEPLOYMENT_TIME"] = deployment_time
     dsa["DEPLOYMENT_TIME"].attrs = {
         "long_name": "date of deployment",
         "standard_name": "time",
         "units": "seconds since 1970-01-01T00:00:00Z",
         "calendar": "gregorian",
     }
-    dsa["DEPLOYMENT_LATITUDE"] = dsa.LATITUDE.values[0]
+    dsa["DEPLOYMENT_LATITUDE"] = dsa.LATITUDE[0].values
     dsa["DEPLOYMENT_LATITUDE"].attrs = {"long_name": "latitude of deployment"}
-    dsa["DEPLOYMENT_LONGITUDE"] = dsa.LONGITUDE.values[0]
+    dsa["DEPLOYMENT_LONGITUDE"] = dsa.LONGITUDE[0].values
     dsa["DEPLOYMENT_LONGITUDE"].attrs = {"long_name": "longitude of deployment"}
     dsa = encode_times_og1(dsa)
-    dsa = set_best_dtype(dsa)
     return dsa
 
 
@@ -249,6 +273,68 @@ vars_as_is = [
 ]
 
 
+def build_og1_plan():
+    """
+    Map each pyglider variable name to its OG1 name and vocabulary attributes. Variables in vars_as_is
+    have no vocabulary attributes and keep their own
+    """
+    registry = get_registry()
+    plan = {}
+    for var_name in vars_as_is:
+        plan[var_name] = (var_name.upper(), None)
+    for var_name, name in registry.standard_names.items():
+        plan[var_name] = (name, registry.vocab_attrs.get(name, {}))
+    return plan
+
+
+og1_plan = build_og1_plan()
+
+
+def timeseries_to_og1(ds, num_vals=None):
+    """
+    Single pass equivalent of convert_to_og1(standardise_og10(ds)). Following og1_plan, each variable is
+    renamed, re-attributed, paired with its QC variable and cast to its final dtype once.
+    :param ds: pyglider timeseries dataset
+    :param num_vals: optional argument to subset input dataset to first num_values values default=None for no subset
+    :return: converted dataset
+    """
+    dsa = xr.Dataset()
+    for var_name in list(ds) + list(ds.coords):
+        if "qc" in var_name:
+            continue
+        if var_name not in og1_plan.keys():
+            _log.error(f"variable {var_name} not to be included. Dropping")
+            continue
+        name, vocab_attrs = og1_plan[var_name]
+        if vocab_attrs is None:
+            _log.error(f"variable {var_name} not translated. Will be added as-is")
+            attrs = dict(ds[var_name].attrs)
+        else:
+            attrs = dict(vocab_attrs)
+            for key, val in ds[var_name].attrs.items():
+                if key not in attrs.keys():
+                    attrs[key] = val
+        da = xr.DataArray(ds[var_name].data[:num_vals], dims="N_MEASUREMENTS", attrs=attrs)
+        qc_name = f"{var_name}_qc"
+        if vocab_attrs is not None and qc_name in list(ds):
+            da.attrs["ancillary_variables"] = f"{name}_QC"
+            qc = xr.DataArray(ds[qc_name].data[:num_vals], dims="N_MEASUREMENTS", attrs=ds[qc_name].attrs)
+            qc.attrs["long_name"] = f'{da.attrs["long_name"]} Quality Flag'
+            qc.attrs["standard_name"] = "status_flag"
+            qc.attrs["flag_values"] = np.array((1, 2, 3, 4, 9)).astype("int8")
+            qc.attrs["flag_meanings"] = "GOOD UNKNOWN SUSPECT FAIL MISSING"
+            dsa[name] = da
+            dsa[f"{name}_QC"] = qc
+        else:
+            dsa[name] = da
+    # add_sensors strips sensor attributes from ds, work on a shallow copy
+    dsa = add_og1_derived_variables(ds.copy(), dsa, num_vals=num_vals)
+    # plan every dtype together, coordinates included, so the value ranges of a lazily opened input are
+    # computed in one pass
+    dsa = set_best_dtype(dsa, var_names=list(dsa.variables))
+    return dsa
+
+
 # + ['backscatter_raw', 'oxygen_phase', 'phycocyanin', 'phycocyanin_raw', 'down_irradiance_532', 'turbidity_raw', 'internal_temperature_PAR', 'methane_concentration', 'methane_raw_concentration', 'mets_raw_temperature', 'mets_temperature', 'nitrate_concentration', 'nitrate_molar_concentration', 'suna_internal_humidity', 'suna_internal_temperature'] # DELETE
 
 
@@ -260,19 +346,19 @@ def standardise_og10(ds):
             continue
         if var_name in vocabularies.standard_names.keys():
             name = vocabularies.standard_names[var_name]
-            dsa[name] = ("time", ds[var_name].values, vocabularies.vocab_attrs[name])
+            dsa[name] = ("time", ds[var_name].data, vocabularies.vocab_attrs[name])
             for key, val in ds[var_name].attrs.items():
                 if key not in dsa[name].attrs.keys():
                     dsa[name].attrs[key] = val
             qc_name = f"{var_name}_qc"
             if qc_name in list(ds):
-                dsa[f"{name}_QC"] = ("time", ds[qc_name].values, ds[qc_name].attrs)
+                dsa[f"{name}_QC"] = ("time", ds[qc_name].data, ds[qc_name].attrs)
                 dsa[name].attrs["ancillary_variables"] = f"{name}_QC"
         else:
             if var_name in vars_as_is:
                 dsa[var_name.upper()] = (
                     "time",
-                    ds[var_name].values,
+                    ds[var_name].data,
                     ds[var_name].attrs,
                 )
                 _log.error(f"variable {var_name} not translated. Will be added as-is")
@@ -283,10 +369,23 @@ def standardise_og10(ds):
     return dsa
 
 
+def export_og1(infile, outfile, chunk_size=100000, encoding_profile="erddap"):
+    """
+    Convert a pyglider timeseries netCDF to OG1 and write it to outfile with roughly constant memory.
+    The input is opened as dask arrays chunk_size samples long, so variables are mapped lazily and
+    only the derived variables are computed as each chunk is streamed to disk. Compression and chunking
+    follow utilities.encoding_profiles[encoding_profile]
+    """
+    with xr.open_dataset(infile, chunks={"time": chunk_size}) as ds:
+        dsa = timeseries_to_og1(ds)
+        dsa = apply_encoding_profile(dsa, encoding_profile)
+        dsa.to_netcdf(outfile)
+    _log.info(f"wrote OG1 file {outfile}")
+    return dsa.attrs["id"]
+
+
 if __name__ == "__main__":
-    dsn = xr.open_dataset(
+    export_og1(
         "/data/data_l0_pyglider/nrt/SEA76/M19/timeseries/mission_timeseries.nc",
+        "new.nc",
     )
-    dsn = standardise_og10(dsn)
-    dsn = convert_to_og1(dsn)
-    dsn.to_netcdf("new.nc")
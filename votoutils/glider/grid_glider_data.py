@@ -1,4 +1,6 @@
 import logging
+import warnings
+import netCDF4
 import xarray as xr
 import numpy as np
 import yaml
@@ -6,9 +8,12 @@ import pandas as pd
 import scipy.stats as stats
 from pathlib import Path
 from votoutils.ad2cp.ad2cp_proc import adcp_data_present, proc_gliderad2cp
+from votoutils.utilities.utilities import apply_encoding_profile
 from gliderad2cp.tools import grid2d
 _log = logging.getLogger(__name__)
 
+l0_dir = Path("/data/data_l0_pyglider")
+
 def _get_deployment(deploymentyaml):
     """
     Take the list of files in *deploymentyaml* and parse them
@@ -30,21 +35,272 @@ def _get_deployment(deploymentyaml):
 def gappy_fill_vertical(data):
     """
     Fill vertical gaps from the first to last bin with data in them.
-    Applied column-wise.
+    Applied column-wise, to columns where more than 5 % of the bins between
+    the first and last bin with data have data. All columns are filled in one
+    pass: each gap is linearly interpolated between the nearest bins with data
+    above and below, found by a binary search over the column-major positions
+    of all bins with data.
 
     data = gappy_fill_vertical(data)
     """
+    if data.size == 0:
+        return data
     m, n = np.shape(data)
-    for j in range(n):
-        ind = np.where(~np.isnan(data[:, j]))[0]
-        if (0 < len(ind) < (ind[-1] - ind[0])
-                and len(ind) > (ind[-1] - ind[0]) * 0.05):
-            int = np.arange(ind[0], ind[-1])
-            data[:, j][ind[0]:ind[-1]] = np.interp(int, ind, data[ind, j])
+    valid = ~np.isnan(data)
+    count = valid.sum(axis=0)
+    first = np.argmax(valid, axis=0)
+    last = m - 1 - np.argmax(valid[::-1], axis=0)
+    span = last - first
+    fill_cols = (0 < count) & (count < span) & (count > span * 0.05)
+    rows = np.arange(m)[:, np.newaxis]
+    gaps = ~valid & (rows > first) & (rows < last) & fill_cols
+    if not gaps.any():
+        return data
+    # column-major flat positions, so neighbouring bins in a column are adjacent
+    data_pos = np.flatnonzero(valid.T)
+    gap_pos = np.flatnonzero(gaps.T)
+    after = np.searchsorted(data_pos, gap_pos)
+    above = data_pos[after - 1]
+    below = data_pos[after]
+    data_above = data[above % m, above // m].astype(np.float64)
+    data_below = data[below % m, below // m].astype(np.float64)
+    # same arithmetic as np.interp, so results are identical to interpolating column by column
+    slope = (data_below - data_above) / (below - above)
+    data[gap_pos % m, gap_pos // m] = slope * (gap_pos - above) + data_above
     return data
 
 
-def make_gridfile_gliderad2cp(platform_serial, mission, kind):
+def bin_indices(x, y, xi, yi):
+    """
+    Flat index of the (depth, profile) bin of each sample on a grid of shape (len(yi), len(xi)).
+    Bins are left-closed [xi[i], xi[i + 1]) as in gliderad2cp.tools.grid2d, so the last row and
+    column of the grid are never populated. Samples outside the grid or with nan coordinates get -1
+    """
+    ix = np.searchsorted(xi, x, side="right") - 1
+    iy = np.searchsorted(yi, y, side="right") - 1
+    valid = (ix >= 0) & (ix < len(xi) - 1) & (iy >= 0) & (iy < len(yi) - 1)
+    return np.where(valid, iy * len(xi) + ix, -1)
+
+
+def _segment_reduce(keys, values, average_method):
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    counts = np.diff(np.r_[starts, len(keys)])
+    if average_method == "median":
+        values = values[np.lexsort((values, keys))].astype(np.float64)
+        low = values[starts + (counts - 1) // 2]
+        high = values[starts + counts // 2]
+        return keys[starts], (low + high) / 2
+    if average_method == "mean":
+        # pandas compensated summation, so results match grid2d to the last bit
+        return keys[starts], pd.Series(values).groupby(keys, sort=False).mean().values
+    if average_method is stats.gmean:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            log_sum = np.add.reduceat(np.log(values.astype(np.float64)), starts)
+        return keys[starts], np.exp(log_sum / counts)
+    return None, None
+
+
+def grid_variables(x, y, variables, xi, yi, mask=None):
+    """
+    Grid several variables sampled at the same x, y coordinates in a single pass.
+    The bin of each sample is computed once and the samples sorted by bin once. Each variable then
+    takes a boolean view of that ordering for its non-nan values and is reduced per bin.
+    Output matches calling gliderad2cp.tools.grid2d for each variable (geometric means to within
+    float32 rounding)
+
+    Parameters
+    ----------
+    x, y: sample coordinates, e.g. profile_num and depth
+    variables: dict of variable name: (values, average_method). average_method is "median", "mean",
+        scipy.stats.gmean or anything else accepted by grid2d, which is used as a fallback
+    xi, yi: bin edges
+    mask: optional boolean array of samples to use for all variables
+
+    Returns
+    -------
+    grids: dict of variable name: 2D array of shape (len(yi), len(xi))
+    """
+    flat = bin_indices(x, y, xi, yi)
+    in_grid = flat >= 0
+    if mask is not None:
+        in_grid &= mask
+    order = np.argsort(flat, kind="stable")
+    order = order[in_grid[order]]
+    grids = {}
+    for var_name, (values, average_method) in variables.items():
+        values = np.asarray(values)
+        out_dtype = values.dtype if values.dtype.kind == "f" else np.float64
+        if values.dtype.kind in "mM":
+            good = ~np.isnat(values)
+            values = values.view("int64")
+        else:
+            good = ~np.isnan(values)
+        sel = order[good[order]]
+        grid = np.full(len(yi) * len(xi), np.nan)
+        if len(sel):
+            keys, reduced = _segment_reduce(flat[sel], values[sel], average_method)
+            if keys is None:
+                grids[var_name] = grid2d(x[sel], y[sel], values[sel], xi=xi, yi=yi, fn=average_method)[0]
+                continue
+            # reduce in double precision, but round to the input precision as pandas does
+            grid[keys] = reduced.astype(out_dtype)
+        grids[var_name] = grid.reshape(len(yi), len(xi))
+    return grids
+
+
+def last_gridded_profile(ds_grid):
+    """
+    Find the last profile in a gridded dataset that has any data in it. This profile may have been
+    incomplete when the grid was made, so incremental updates regrid from this profile onwards
+    """
+    has_data = np.zeros(len(ds_grid.profile), dtype=bool)
+    for var_name in ds_grid.data_vars:
+        if ds_grid[var_name].dims != ('depth', 'profile'):
+            continue
+        has_data |= np.any(~np.isnan(ds_grid[var_name].values), axis=0)
+    if not has_data.any():
+        return None
+    return ds_grid.profile.values[np.flatnonzero(has_data)[-1]]
+
+
+def append_profiles(ds_old, dsout, start_profile):
+    """
+    Combine the profiles before start_profile from an existing gridded dataset with newly gridded
+    profiles from start_profile onwards. dsout must have the depth axis of ds_old, or a deeper one
+    with no samples of the old profiles below the bottom of ds_old
+    """
+    ds_old = ds_old.copy()
+    if 'time' in ds_old.dims:
+        old_time = ds_old['time'].values
+        ds_old = ds_old.drop_vars('time')
+        ds_old['time'] = ('profile', old_time)
+    ds_old = ds_old.drop_vars([var_name for var_name in ds_old.data_vars
+                               if 'profile' not in ds_old[var_name].dims])
+    ds_old = ds_old.isel(profile=ds_old.profile.values < start_profile)
+    ds_old = ds_old.reindex(depth=dsout.depth)
+    return xr.concat([ds_old, dsout], dim='profile', data_vars='minimal', coords='minimal',
+                     compat='override', join='outer', combine_attrs='override')
+
+
+def grid_in_chunks(ds, average_methods, xi, yi, dsout, tmpname, chunk_profiles=500):
+    """
+    Grid the variables of a lazily opened timeseries chunk_profiles profiles at a time.
+    profile_num increases monotonically in time, so each chunk is a contiguous slice of the
+    timeseries holding every sample of its bins and the result is identical to gridding all
+    at once. Gridded columns are written to the temporary netCDF tmpname as each chunk is
+    done, so only one chunk of samples is held in memory.
+
+    Returns
+    -------
+    dsout: with the gridded variables added, lazily loaded from tmpname. If time is gridded,
+        it is added as the median time of each profile
+    """
+    profile_num = ds.profile_num.values
+    grid_vars = [var_name for var_name in average_methods if var_name != 'time']
+    profile_time = np.full(len(xi), np.nan)
+    with netCDF4.Dataset(tmpname, 'w') as nc:
+        nc.createDimension('depth', len(yi))
+        nc.createDimension('profile', len(xi))
+        for var_name in grid_vars:
+            nc.createVariable(var_name, 'f8', ('depth', 'profile'), fill_value=np.nan)
+        # the last bin [xi[-1], xi[-1] + 1) is never populated, as in grid2d
+        for start in range(0, len(xi) - 1, chunk_profiles):
+            end = min(start + chunk_profiles, len(xi) - 1)
+            first, last = np.searchsorted(profile_num, [xi[start], xi[end]])
+            chunk = ds.isel(time=slice(first, last))
+            to_grid = {var_name: (chunk[var_name].values, average_method)
+                       for var_name, average_method in average_methods.items()}
+            grids = grid_variables(chunk.profile_num.values, chunk.depth.values, to_grid,
+                                   xi[start:end + 1], yi, mask=chunk['profile_index'].values % 1 == 0)
+            for var_name, grid in grids.items():
+                if var_name == 'time':
+                    with warnings.catch_warnings():
+                        warnings.simplefilter("ignore", category=RuntimeWarning)
+                        profile_time[start:end] = np.nanmedian(grid[:, :-1], axis=0)
+                    continue
+                nc[var_name][:, start:end] = grid[:, :-1]
+            _log.info(f'Gridded profiles {xi[start]} - {xi[end]}')
+    dsgrid = xr.open_dataset(tmpname)
+    for var_name in grid_vars:
+        dsout[var_name] = dsgrid[var_name]
+        dsout[var_name].attrs = ds[var_name].attrs
+    if 'time' in average_methods:
+        dsout['time'] = ('profile', pd.to_datetime(profile_time).values, ds['time'].attrs)
+    return dsout
+
+
+# Coarser gridded products as integer multiples of the standard 2 m x 1 profile bins,
+# (depth factor, profile factor). i.e. 10 m x 5 profiles and 50 m x 25 profiles
+pyramid_levels = ((5, 5), (25, 25))
+
+
+def _block_reduce(data, factors, average_method):
+    # Reduce blocks of bins, padding the grid with nan to a whole number of blocks
+    pad = [(0, -size % factor) for size, factor in zip(data.shape, factors)]
+    data = np.pad(data.astype(np.float64), pad, constant_values=np.nan)
+    shape = []
+    for size, factor in zip(data.shape, factors):
+        shape += [size // factor, factor]
+    blocks = data.reshape(shape)
+    blocks = blocks.transpose([2 * i for i in range(len(factors))] + [2 * i + 1 for i in range(len(factors))])
+    blocks = blocks.reshape(blocks.shape[:len(factors)] + (-1,))
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        if average_method == "mean":
+            return np.nanmean(blocks, axis=-1)
+        if average_method == "geometric mean":
+            return np.exp(np.nanmean(np.log(blocks), axis=-1))
+        return np.nanmedian(blocks, axis=-1)
+
+
+def coarsen_gridded(dsout, depth_factor, profile_factor):
+    """
+    Make a coarser version of a gridded dataset by aggregating blocks of depth_factor x profile_factor
+    bins. Works from the gridded bin values only, so no samples are re-read. Each variable is aggregated
+    with its average_method (median by default). Variables on other dims, e.g. ADCP cells, are dropped.
+    Because the bin values are aggregated rather than the samples, a coarse median is the median of bin
+    medians and a coarse mean the unweighted mean of bin means, not the median or mean of the samples.
+    The grid is padded with nan to a whole number of blocks, so the last depth and profile coordinates
+    are the mean of a partial block and are not evenly spaced with the others
+    """
+    n_profile = len(dsout.profile)
+    factors = {'depth': depth_factor, 'profile': profile_factor}
+    dscoarse = xr.Dataset(attrs=dsout.attrs)
+    for var_name in dsout.variables:
+        da = dsout[var_name]
+        dims = da.dims
+        if dims == ('time',) and len(da) == n_profile:
+            dims = ('profile',)
+        if not dims:
+            dscoarse[var_name] = da
+            continue
+        if not set(dims).issubset(factors.keys()) or var_name in factors.keys():
+            continue
+        values = da.values
+        time_like = values.dtype.kind == 'M'
+        if time_like:
+            values = values.astype('datetime64[ns]').astype(np.float64)
+            values[da.isnull().values] = np.nan
+        average_method = da.attrs.get('average_method', 'median')
+        coarse = _block_reduce(values, [factors[dim] for dim in dims], average_method)
+        if time_like:
+            coarse = pd.to_datetime(coarse).values
+        dscoarse[var_name] = (dims, coarse, da.attrs)
+    for dim, factor in factors.items():
+        coords = _block_reduce(dsout[dim].values[:, np.newaxis], [factor, 1], 'mean')[:, 0]
+        dscoarse[dim] = (dim, coords, dsout[dim].attrs)
+    if 'time' in dscoarse.variables:
+        dscoarse = dscoarse.assign_coords(time=('time', dscoarse.time.values))
+    dscoarse.attrs['processing'] = (f"Coarsened from the standard gridded product by aggregating blocks of "
+                                    f"{depth_factor} depth bins x {profile_factor} profiles. Each block is "
+                                    f"aggregated from bin values, not samples: medians are medians of bin "
+                                    f"medians and means are unweighted means of bin means. Depth and profile "
+                                    f"coordinates are block means; the last block of each may be partial, so "
+                                    f"its coordinate is not evenly spaced with the others")
+    return dscoarse
+
+
+def make_gridfile_gliderad2cp(platform_serial, mission, kind, incremental=False, chunk_profiles=None):
     """
     Turn a timeseries netCDF file into a vertically gridded netCDF. Adds ad2cp data if present
 
@@ -52,6 +308,13 @@ def make_gridfile_gliderad2cp(platform_serial, mission, kind):
     ----------
     glider: glider number
     mission: mission number
+    kind: 'sub' for nrt data, 'raw' for complete mission data
+    incremental: for nrt data only. If a gridded file already exists, only regrid profiles from the
+        last profile with data in the existing file onwards and append them to the existing grid. If the
+        mission has samples below the bottom of the existing grid, all profiles are regridded, so the
+        output is the same as a full regrid
+    chunk_profiles: if set, stream the timeseries this many profiles at a time rather than loading
+        it all at once. Output is identical, but peak memory does not grow with mission length
 
     Returns
     -------
@@ -66,25 +329,46 @@ def make_gridfile_gliderad2cp(platform_serial, mission, kind):
         infix = 'nrt'
     else:
         infix = 'complete_mission'
-    inname = f"/data/data_l0_pyglider/{infix}/{platform_serial}/M{str(mission)}/timeseries/mission_timeseries.nc"
-    outdir = Path(f"/data/data_l0_pyglider/{infix}/{platform_serial}/M{str(mission)}/gridfiles/")
+    inname = l0_dir / infix / platform_serial / f"M{mission}" / "timeseries" / "mission_timeseries.nc"
+    outdir = l0_dir / infix / platform_serial / f"M{mission}" / "gridfiles"
     outname = outdir / 'gridded.nc'
     if not outdir.exists():
         outdir.mkdir(parents=True)
 
 
     ds = xr.open_dataset(inname, decode_times=True)
+    ds_old = None
+    start_profile = None
+    if incremental and kind == 'sub' and outname.exists():
+        with xr.open_dataset(outname) as ds_grid:
+            ds_old = ds_grid.load()
+        start_profile = last_gridded_profile(ds_old)
+        if start_profile is None:
+            ds_old = None
+        elif np.nanmax(ds.depth.values) > ds_old.depth.values.max():
+            # bins are left-closed, so the bottom row of the existing grid holds no samples. Once the grid
+            # extends below it, samples of old profiles fall in that row, so regrid the whole mission
+            _log.info('New profiles extend below the existing grid, regridding all profiles')
+            ds_old = None
+        else:
+            # profile_num increases monotonically in time, so the new profiles are a contiguous slice
+            first = np.searchsorted(ds.profile_num.values, start_profile)
+            ds = ds.isel(time=slice(first, None))
+            _log.info(f'Incremental grid update from profile {start_profile}')
     yi = 2
     xi = 1
     xi = np.arange(np.nanmin(ds.profile_num.values), np.nanmax(ds.profile_num.values) + xi, xi)
-    yi = np.arange(0, np.nanmax(np.nanmax(ds.depth)) + yi, yi)
+    max_depth = np.nanmax(np.nanmax(ds.depth))
+    if ds_old is not None:
+        max_depth = max(max_depth, ds_old.depth.values.max())
+    yi = np.arange(0, max_depth + yi, yi)
     # Create structure
     dsout = xr.Dataset(coords={"depth": yi, "profile": xi})
 
     dsout["depth"].attrs = {"units": 'm', 'description': 'Central measurement depth in meters.'}
     dsout["profile"].attrs = {"units": '', 'description': 'Central profile number of measurement.'}
     if adcp_data_present(platform_serial, mission) and kind!='sub':
-        adcp_file = Path(f"/data/data_l0_pyglider/complete_mission/{platform_serial}/M{mission}/gliderad2cp/{platform_serial}_M{mission}_adcp_proc.nc")
+        adcp_file = l0_dir / "complete_mission" / platform_serial / f"M{mission}" / "gliderad2cp" / f"{platform_serial}_M{mission}_adcp_proc.nc"
         if not adcp_file.exists():
             proc_gliderad2cp(platform_serial, mission)
         dsout = xr.open_dataset(adcp_file)
@@ -97,6 +381,7 @@ def make_gridfile_gliderad2cp(platform_serial, mission, kind):
         dsout = dsout.drop_vars('time')
         dsout = dsout.rename({'time2': 'time'})
 
+    average_methods = {}
     for var_name in ds.variables:
         if var_name in dsout.variables or var_name in dsout.dims:
             continue
@@ -111,15 +396,26 @@ def make_gridfile_gliderad2cp(platform_serial, mission, kind):
                                               "scipy.stats.gmean")
         else:
             average_method = "median"
-        good = np.where(~np.isnan(ds[var_name]) & (ds['profile_index'] % 1 == 0))[0]
-        dsout[var_name] = (('depth', 'profile'),
-                       grid2d(ds.profile_num.values[good], ds.depth.values[good],
-                         ds[var_name].values[good], xi=xi, yi=yi, fn=average_method)[0],
-                           ds[var_name].attrs
-                      )
-
-    if len(dsout.time.dims) == 2:
-        dsout['time'] = ('profile', pd.to_datetime(dsout.time.median(dim='depth').values), dsout.time.attrs)
+        average_methods[var_name] = average_method
+    tmpname = outdir / 'gridded_chunks.tmp.nc'
+    if chunk_profiles and not np.all(np.diff(ds.profile_num.values) >= 0):
+        _log.warning('profile_num is not monotonic, cannot grid in chunks')
+        chunk_profiles = None
+    if chunk_profiles:
+        dsout = grid_in_chunks(ds, average_methods, xi, yi, dsout, tmpname, chunk_profiles)
+    else:
+        to_grid = {var_name: (ds[var_name].values, average_method)
+                   for var_name, average_method in average_methods.items()}
+        grids = grid_variables(ds.profile_num.values, ds.depth.values, to_grid, xi, yi,
+                               mask=ds['profile_index'].values % 1 == 0)
+        for var_name, grid in grids.items():
+            dsout[var_name] = (('depth', 'profile'), grid, ds[var_name].attrs)
+
+    if 'time' in average_methods:
+        if len(dsout.time.dims) == 2:
+            dsout['time'] = ('profile', pd.to_datetime(dsout.time.median(dim='depth').values), dsout.time.attrs)
+        if ds_old is not None:
+            dsout = append_profiles(ds_old, dsout, start_profile)
         dsout = dsout.assign_coords(time=("time", dsout.time.values))
 
     dsout.attrs = ds.attrs
@@ -170,10 +466,25 @@ def make_gridfile_gliderad2cp(platform_serial, mission, kind):
     _log.info(f'cutting down to {vmin} - {vmax} m depth')
     dsout = dsout.sel(depth=slice(vmin, vmax+2))
 
+    encoding_profile = "nrt" if kind == "sub" else "erddap"
+    dsout = apply_encoding_profile(dsout, encoding_profile)
     _log.info('Writing %s', outname)
     dsout.to_netcdf(
         outname,
     )
+    depth_step = float(dsout.depth[1] - dsout.depth[0]) if len(dsout.depth) > 1 else 2
+    # coarse products go in their own directory, so gridfiles/ only holds gridded.nc
+    coarse_dir = outdir.parent / 'gridfiles_coarse'
+    coarse_dir.mkdir(exist_ok=True)
+    for depth_factor, profile_factor in pyramid_levels:
+        dscoarse = coarsen_gridded(dsout, depth_factor, profile_factor)
+        coarse_name = coarse_dir / f"gridded_{int(depth_step * depth_factor)}m_{profile_factor}profiles.nc"
+        dscoarse = apply_encoding_profile(dscoarse, encoding_profile)
+        _log.info('Writing %s', coarse_name)
+        dscoarse.to_netcdf(coarse_name)
+    dsout.close()
+    if tmpname.exists():
+        tmpname.unlink()
     _log.info('Done gridding')
 
     return outname
@@ -1,9 +1,37 @@
+import argparse
+import ast
+import datetime
+import hashlib
+import importlib.util
+import logging
+import warnings
+import netCDF4
 import xarray as xr
-from votoutils.glider.convert_to_og1 import convert_to_og1, standardise_og10
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from votoutils.glider import convert_to_og1 as og1_converter
+from votoutils.glider.convert_to_og1 import timeseries_to_og1, export_og1
+from votoutils.utilities.utilities import missions_no_proc
 import subprocess
 from pathlib import Path
 import requests
 
+_log = logging.getLogger(__name__)
+
+l0_dir = Path("/data/data_l0_pyglider")
+og1_dir = l0_dir / "og1"
+manifest_file = og1_dir / "og1_manifest.csv"
+manifest_columns = [
+    "glider",
+    "mission",
+    "kind",
+    "source",
+    "source_hash",
+    "converter_version",
+    "og1_file",
+    "export_time",
+]
+
 
 def lots():
     from erddapy import ERDDAP
@@ -22,8 +50,7 @@ def lots():
         print(ds_id)
         e.dataset_id = ds_id
         ds = e.to_xarray().drop_dims("timeseries")
-        ds_standard = standardise_og10(ds)
-        ds_og1 = convert_to_og1(ds_standard)
+        ds_og1 = timeseries_to_og1(ds)
         print(ds_og1.attrs["title"])
 
 
@@ -54,8 +81,7 @@ def multi():
             with open(data_file, "wb") as wfile:
                 wfile.write(req.content)
         ds = xr.open_dataset(data_file)
-        ds_standard = standardise_og10(ds)
-        ds_og1 = convert_to_og1(ds_standard)
+        ds_og1 = timeseries_to_og1(ds)
         outfile = data_dir / f"{ds_og1.attrs['id']}.nc"
         ds_og1.to_netcdf(outfile)
 
@@ -73,8 +99,7 @@ def single():
     # ds = xr.open_dataset(
     #    "/data/data_l0_pyglider/complete_mission/SEA44/M33/timeseries/mission_timeseries.nc",
     # )
-    ds_standard = standardise_og10(ds)
-    ds_og1 = convert_to_og1(ds_standard)
+    ds_og1 = timeseries_to_og1(ds)
     outfile = f"/home/callum/Documents/community/OG-format-user-manual/og_format_examples_files/{ds_og1.attrs['id']}.nc"
     print(ds_og1.attrs["id"])
     cdl = f"/home/callum/Documents/community/OG-format-user-manual/og_format_examples_files/{ds_og1.attrs['id']}.cdl"
@@ -84,6 +109,173 @@ def single():
         subprocess.run(my_cmd, stdout=outfile)
 
 
+def file_hash(path, block_size=2**20):
+    sha = hashlib.sha256()
+    with open(path, "rb") as fin:
+        for block in iter(lambda: fin.read(block_size), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def _imported_votoutils_modules(path):
+    names = []
+    with warnings.catch_warnings():
+        # invalid escape sequences in the parsed source are not our concern here
+        warnings.simplefilter("ignore", category=DeprecationWarning)
+        warnings.simplefilter("ignore", category=SyntaxWarning)
+        tree = ast.parse(Path(path).read_text())
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names += [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            # from package import module, or from module import function
+            names += [node.module] + [f"{node.module}.{alias.name}" for alias in node.names]
+    return [name for name in names if name.split(".")[0] == "votoutils"]
+
+
+def converter_modules(module_name=og1_converter.__name__):
+    """Source files of module_name and of every votoutils module it imports, directly or indirectly"""
+    found = {}
+    todo = [module_name]
+    while todo:
+        name = todo.pop()
+        if name in found:
+            continue
+        try:
+            spec = importlib.util.find_spec(name)
+        except ModuleNotFoundError:
+            spec = None
+        found[name] = None
+        if spec is None or not spec.origin or not spec.origin.endswith(".py"):
+            continue
+        found[name] = Path(spec.origin)
+        todo += _imported_votoutils_modules(spec.origin)
+    return sorted(path for path in found.values() if path)
+
+
+def converter_version():
+    # changes whenever the conversion code, any votoutils module it imports, or the netCDF writers change
+    sha = hashlib.sha256()
+    sha.update(f"xarray {xr.__version__} netCDF4 {netCDF4.__version__}".encode())
+    for path in converter_modules():
+        sha.update(path.name.encode())
+        sha.update(path.read_bytes())
+    return sha.hexdigest()[:12]
+
+
+def read_manifest():
+    if not manifest_file.exists():
+        return pd.DataFrame(columns=manifest_columns)
+    return pd.read_csv(manifest_file, dtype={"source_hash": str, "converter_version": str})
+
+
+def export_mission(platform_serial, mission, kind, nc_path, version, previous=None):
+    """
+    Convert one local timeseries to OG1 unless its source hash and the converter version match
+    the previous manifest entry. Returns the manifest entry, or None if the export was skipped
+    """
+    source_hash = file_hash(nc_path)
+    if (
+        previous is not None
+        and previous["source_hash"] == source_hash
+        and previous["converter_version"] == version
+        and (og1_dir / previous["og1_file"]).exists()
+    ):
+        return None
+    tmp_file = og1_dir / f"{platform_serial}_M{mission}_{kind}.tmp.nc"
+    try:
+        og1_id = export_og1(nc_path, tmp_file)
+        og1_file = f"{og1_id}.nc"
+        tmp_file.rename(og1_dir / og1_file)
+    finally:
+        tmp_file.unlink(missing_ok=True)
+    if previous is not None and previous["og1_file"] != og1_file:
+        (og1_dir / previous["og1_file"]).unlink(missing_ok=True)
+    return {
+        "glider": platform_serial,
+        "mission": mission,
+        "kind": kind,
+        "source": str(nc_path),
+        "source_hash": source_hash,
+        "converter_version": version,
+        "og1_file": og1_file,
+        "export_time": datetime.datetime.now(),
+    }
+
+
+def export_fleet(kinds=("sub", "raw"), max_workers=4, reprocess=False):
+    """
+    Export OG1 files for every mission in the local processed archive. Missions whose source timeseries
+    and converter are unchanged since the last export are skipped. Results are recorded in manifest_file
+    """
+    if not og1_dir.exists():
+        og1_dir.mkdir(parents=True)
+    version = converter_version()
+    df_manifest = read_manifest()
+    previous_exports = {
+        (row["glider"], row["mission"], row["kind"]): row
+        for row in df_manifest.to_dict("records")
+    }
+    glidermissions = []
+    for kind in kinds:
+        infix = "nrt" if kind == "sub" else "complete_mission"
+        for nc_path in (l0_dir / infix).glob(
+            "*/M*/timeseries/mission_timeseries.nc",
+        ):
+            platform_serial = nc_path.parts[-4]
+            mission = int(nc_path.parts[-3][1:])
+            if (platform_serial, mission) in missions_no_proc:
+                _log.info(f"skipping {platform_serial, mission}")
+                continue
+            glidermissions.append((platform_serial, mission, kind, nc_path))
+    _log.info(f"checking {len(glidermissions)} datasets with converter version {version}")
+    exported = []
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {}
+        for platform_serial, mission, kind, nc_path in glidermissions:
+            previous = None if reprocess else previous_exports.get((platform_serial, mission, kind))
+            future = executor.submit(export_mission, platform_serial, mission, kind, nc_path, version, previous)
+            futures[future] = (platform_serial, mission, kind)
+        for future, (platform_serial, mission, kind) in futures.items():
+            try:
+                entry = future.result()
+            except Exception as e:
+                _log.error(f"failed to export OG1 for {platform_serial} M{mission} {kind}: {e}")
+                continue
+            if entry:
+                _log.info(f"exported {entry['og1_file']}")
+                previous_exports[(platform_serial, mission, kind)] = entry
+                exported.append(entry)
+    df_manifest = pd.DataFrame(list(previous_exports.values()), columns=manifest_columns)
+    df_manifest.sort_values(["kind", "glider", "mission"]).to_csv(manifest_file, index=False)
+    _log.info(f"exported {len(exported)} OG1 files. {len(glidermissions) - len(exported)} unchanged or failed")
+    return exported
+
+
 if __name__ == "__main__":
-    multi()
-    # lots()
+    parser = argparse.ArgumentParser(
+        description="export OG1 files for all missions in the local processed archive",
+    )
+    parser.add_argument(
+        "--kind",
+        type=str,
+        help="Kind of input. Can specify sub or raw. Defaults to both",
+    )
+    parser.add_argument("--workers", type=int, default=4, help="Number of missions to convert in parallel")
+    parser.add_argument(
+        "--reprocess",
+        action="store_true",
+        help="Export every mission, even if unchanged since the last export",
+    )
+    args = parser.parse_args()
+    if args.kind not in ["raw", "sub", None]:
+        raise ValueError("kind must be raw or sub")
+    logging.basicConfig(
+        filename="/data/log/og1_export.log",
+        filemode="a",
+        format="%(asctime)s %(levelname)-8s %(message)s",
+        level=logging.INFO,
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+    kinds_in = [args.kind] if args.kind else ["sub", "raw"]
+    export_fleet(kinds=kinds_in, max_workers=args.workers, reprocess=args.reprocess)
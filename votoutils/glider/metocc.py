@@ -1,30 +1,39 @@
 import xarray as xr
-import pandas as pd
+import numpy as np
+import polars as pl
 import yaml
 from pathlib import Path
 
+metocc_vars = (
+    "longitude",
+    "latitude",
+    "depth",
+    "temperature",
+    "conductivity",
+    "salinity",
+)
+# high-water marks are kept outside the metocc directory so they are not rsynced
+state_dir = Path("/data/data_l0_pyglider/metocc_state")
 
-def create_csv(ds_file):
-    # Open timeseries file as a dataset
-    timeseries = xr.open_dataset(ds_file)
-    # Extract only core variables of interest. Append units to the variable names
-    data = {}
-    for var in (
-        "longitude",
-        "latitude",
-        "depth",
-        "temperature",
-        "conductivity",
-        "salinity",
-    ):
-        name = f"{timeseries[var].attrs['standard_name']} ({timeseries[var].attrs['units']})"
-        data[name] = timeseries[var].values
-    # Create dataframe and add name for index
-    df = pd.DataFrame(data, index=timeseries.time)
-    df.index.name = "datetime"
 
+def read_state(state_file):
+    if not state_file.exists():
+        return {}
+    with open(state_file, encoding="utf-8") as fin:
+        return yaml.safe_load(fin) or {}
+
+
+def write_state(state_file, state):
+    state_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = state_file.with_suffix(".tmp")
+    with open(tmp_file, "w", encoding="utf-8") as fout:
+        yaml.dump(state, fout)
+    tmp_file.rename(state_file)
+
+
+def essential_metadata(timeseries):
     # Extract metadata from dataset. Change datatype to simple float for writing to text file
-    meta = timeseries.attrs
+    meta = dict(timeseries.attrs)
     meta["geospatial_lat_max"] = float(meta["geospatial_lat_max"])
     meta["geospatial_lon_max"] = float(meta["geospatial_lon_max"])
     meta["geospatial_lat_min"] = float(meta["geospatial_lat_min"])
@@ -55,23 +64,78 @@ def create_csv(ds_file):
     for key, val in meta.items():
         if key in essential_vars:
             meta_ess[key] = val
+    return meta_ess
 
-    # Create standard filenames
-    file_name_base = f"{meta['glider_serial']}_M{meta['deployment_id']}"
+
+def metocc_dir(meta):
     sea_name = meta["sea_name"]
     sea_name_clean = sea_name.replace(",", "_").replace(" ", "")
     if "basin" in meta.keys():
         if len(meta["basin"]) > 5:
             basin = meta["basin"]
             sea_name_clean = basin.split(",")[0].replace(" ", "_")
-    dir_name = f"/data/data_l0_pyglider/metocc/{sea_name_clean}"
+    return Path(f"/data/data_l0_pyglider/metocc/{sea_name_clean}")
 
+
+def create_csv(ds_file, rewrite=False):
+    """
+    Write the core variables of a timeseries to the metocc csv. Only rows newer than the last exported
+    timestamp, tracked in a sidecar under state_dir, are read and appended, so rsync only sends the new rows.
+    The csv is rewritten from scratch if rewrite is True, the columns change or the timeseries is shorter than
+    what was already exported. The yml metadata is only rewritten when it changes
+    """
+    timeseries = xr.open_dataset(ds_file)
+    meta = timeseries.attrs
+    # Create standard filenames
+    file_name_base = f"{meta['glider_serial']}_M{meta['deployment_id']}"
+    output_dir = metocc_dir(meta)
     # Make output directory and parents if they don't already exist
-    output_dir = Path(dir_name)
     output_dir.mkdir(parents=True, exist_ok=True)
+    csv_file = output_dir / f"{file_name_base}.csv"
+    state_file = state_dir / f"{file_name_base}.yml"
+
+    # Append units to the variable names
+    columns = ["datetime"] + [
+        f"{timeseries[var].attrs['standard_name']} ({timeseries[var].attrs['units']})" for var in metocc_vars
+    ]
+    state = read_state(state_file)
+    times = timeseries.time.values
+    last_time = np.datetime64(state["last_time"]) if "last_time" in state.keys() else None
+    if (
+        rewrite
+        or not csv_file.exists()
+        or state.get("columns") != columns
+        or last_time is None
+        or len(times) == 0
+        or times[-1] < last_time
+    ):
+        start = 0
+        with open(csv_file, "w", encoding="utf-8") as fout:
+            fout.write(",".join(columns) + "\n")
+        state = {"columns": columns}
+    else:
+        # drop anything appended after the last recorded high-water mark, e.g. by an interrupted run
+        with open(csv_file, "r+b") as fout:
+            fout.truncate(state["csv_bytes"])
+        start = int(np.searchsorted(times, last_time, side="right"))
+
+    if start < len(times):
+        new_rows = timeseries[list(metocc_vars)].isel(time=slice(start, None))
+        data = {"datetime": new_rows.time.values}
+        for var, name in zip(metocc_vars, columns[1:]):
+            data[name] = new_rows[var].values
+        # polars writes float NaN as "NaN", keep missing values as empty fields like the old pandas csv
+        df = pl.DataFrame(data).fill_nan(None)
+        with open(csv_file, "ab") as fout:
+            df.write_csv(fout, include_header=False, null_value="", datetime_format="%Y-%m-%d %H:%M:%S%.3f")
+        state["last_time"] = str(times[-1])
+    state["csv_bytes"] = csv_file.stat().st_size
+    yml_text = yaml.dump(essential_metadata(timeseries))
+    timeseries.close()
 
-    # Write dataframe and metadata to matching files
-    df.to_csv(output_dir / f"{file_name_base}.csv")
-    with open(output_dir / f"{file_name_base}.yml", "w", encoding="utf-8") as file:
-        yaml.dump(meta_ess, file)
+    yml_file = output_dir / f"{file_name_base}.yml"
+    if not yml_file.exists() or yml_file.read_text(encoding="utf-8") != yml_text:
+        with open(yml_file, "w", encoding="utf-8") as file:
+            file.write(yml_text)
+    write_state(state_file, state)
     return output_dir / file_name_base
@@ -11,7 +11,8 @@ from votoutils.glider import grid_glider_data
 from votoutils.glider.pre_process import clean_infiles
 from votoutils.utilities.geocode import get_seas_merged_nav_nc
 from votoutils.glider.post_process_dataset import post_process
-from votoutils.utilities.utilities import encode_times, set_best_dtype
+from votoutils.utilities.utilities import encode_times, set_best_dtype, apply_encoding_profile
+from votoutils.utilities.mission_store import write_mission_store
 from votoutils.fixers.file_operations import clean_nrt_bad_files
 from votoutils.qc.flag_qartod import flagger
 
@@ -91,9 +92,19 @@ def set_profile_numbers(ds):
     return ds
 
 
-def proc_pyglider_l0(platform_serial, mission, kind, input_dir, output_dir):
+def proc_pyglider_l0(
+    platform_serial,
+    mission,
+    kind,
+    input_dir,
+    output_dir,
+    incremental_grid=False,
+    columnar_store=False,
+):
     if kind not in ["raw", "sub"]:
         raise ValueError("kind must be raw or sub")
+    # incremental gridding appends new profiles to the existing nrt gridded file
+    incremental_grid = incremental_grid and kind == "sub"
     if kind == "sub":
         clean_nrt_bad_files(input_dir)
     rawdir = str(pathlib.Path(input_dir)) + "/"
@@ -104,12 +115,16 @@ def proc_pyglider_l0(platform_serial, mission, kind, input_dir, output_dir):
     l0tsdir = output_dir + "timeseries/"
     profiledir = output_dir + "profiles/"
     griddir = output_dir + "gridfiles/"
+    coarsegriddir = output_dir + "gridfiles_coarse/"
     original_deploymentyaml = (
         f"/data/deployment_yaml/mission_yaml/{platform_serial}_M{str(mission)}.yml"
     )
     deploymentyaml = f"/data/tmp/deployment_yml/{platform_serial}_M{str(mission)}.yml"
 
-    safe_delete([rawncdir, l0tsdir, profiledir, griddir])
+    if incremental_grid:
+        safe_delete([rawncdir, l0tsdir, profiledir])
+    else:
+        safe_delete([rawncdir, l0tsdir, profiledir, griddir, coarsegriddir])
     clean_infiles(input_dir)
     seaexplorer.raw_to_rawnc(rawdir, rawncdir, original_deploymentyaml)
     # merge individual netcdf files into single netcdf files *.gli*.nc and *.pld1*.nc
@@ -157,24 +172,31 @@ def proc_pyglider_l0(platform_serial, mission, kind, input_dir, output_dir):
         "dive_num",
         "desired_heading",
     ]
-    ds = xr.open_dataset(outname)
+    # load and close the file, it is overwritten below
+    ds = xr.load_dataset(outname)
     ds = flagger(ds)
-    ds_variables = list(ds)
-    for var in ds_variables:
-        if var in int_vars or var[-2:] == "qc":
-            ds[var] = np.around(ds[var]).astype(int)
-        elif var[-3:] == "raw":
-            ds[var] = np.around(ds[var])
     ds = set_profile_numbers(ds)
     ds = post_process(ds)
-    ds = set_best_dtype(ds)
+    # int, qc and raw variables are rounded and stored as integers when written
+    ds = set_best_dtype(ds, int_vars=int_vars)
     ds = encode_times(ds)
+    ds = apply_encoding_profile(ds, "nrt" if kind == "sub" else "erddap")
     ds.to_netcdf(outname)
+    if columnar_store:
+        write_mission_store(ds, pathlib.Path(l0tsdir) / "mission_timeseries.parquet")
     if kind=='raw':
         from votoutils.ad2cp.ad2cp_proc import adcp_data_present, proc_gliderad2cp
         if adcp_data_present(platform_serial, mission):
             proc_gliderad2cp(platform_serial, mission)
-    grid_glider_data.make_gridfile_gliderad2cp(platform_serial, mission, kind)
+    # complete missions can be too large to grid in memory, stream them in profile chunks
+    chunk_profiles = 500 if kind == "raw" else None
+    grid_glider_data.make_gridfile_gliderad2cp(
+        platform_serial,
+        mission,
+        kind,
+        incremental=incremental_grid,
+        chunk_profiles=chunk_profiles,
+    )
 
 if __name__ == '__main__':
     glider = "SEA045"
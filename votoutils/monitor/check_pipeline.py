@@ -15,6 +15,7 @@ _log = logging.getLogger(__name__)
 files_collection = (
     ("voto_stats_data.log", "Finished computing stats", 2),
     ("pyglider_nrt.log", "Finished nrt processing", 2),
+    ("pyglider_nrt_watcher_heartbeat.log", "watching", 2),
     ("voto_add_sailbuoy.log", "Finished download of sailbuoy data", 2),
     ("sailbuoy.log", "Finished processing nrt sailbuoy data", 2),
     ("voto_add_data.log", "nrt mission add complete", 2),
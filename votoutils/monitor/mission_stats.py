@@ -1,37 +1,65 @@
-from pathlib import Path
+import argparse
+import logging
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
-import numpy as np
-from votoutils.utilities import utilities
+from votoutils.utilities import utilities, raw_catalog
 
+_log = logging.getLogger(__name__)
 
-def compute_glider_stats():
+stats_file = "/home/pipeline/stats.csv"
+# version 2: periods are total seconds, version 1 rows only held the sub-second part of the period
+stats_version = 2
+
+
+def compute_glider_stats(max_workers=8):
     try:
-        df_stats = pd.read_csv("/home/pipeline/stats.csv")
+        df_stats = pd.read_csv(stats_file)
     except FileNotFoundError:
         df_stats = pd.DataFrame(
-            {"glider": [], "mission": [], "ctd_period": [], "oxy_period": []},
+            {"glider": [], "mission": [], "ctd_period": [], "oxy_period": [], "version": []},
         )
-
-    glider_paths = list(Path("/data/data_raw/complete_mission").glob("SEA*"))
-    for glider_path in glider_paths:
-        mission_paths = glider_path.glob("M*")
-        for mission_path in mission_paths:
-            glider = int(glider_path.parts[-1][3:])
-            mission = int(mission_path.parts[-1][1:])
-            a = [np.logical_and(df_stats.glider == glider, df_stats.mission == mission)]
-            if sum(sum(a)):
-                continue
+    if "version" not in df_stats.columns:
+        df_stats["version"] = 1
+    current = df_stats[df_stats.version == stats_version]
+    done = set(zip(current.glider.astype(int), current.mission.astype(int)))
+    raw_catalog.refresh_catalog()
+    glidermissions = []
+    for platform_serial, mission in raw_catalog.missions(source="complete_mission"):
+        if not platform_serial.startswith("SEA"):
+            continue
+        glider = int(platform_serial[3:])
+        if (glider, mission) not in done:
+            glidermissions.append((glider, mission))
+    _log.info(f"computing sampling periods for {len(glidermissions)} missions")
+    new_rows = []
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(utilities.sensor_sampling_period, glider, mission): (glider, mission)
+            for glider, mission in glidermissions
+        }
+        for future, (glider, mission) in futures.items():
             try:
-                sampling_periods = utilities.sensor_sampling_period(glider, mission)
-                new_row = pd.DataFrame(
-                    sampling_periods,
-                    index=[len(df_stats)],
-                )
-                df_stats = pd.concat((df_stats, new_row))
-            except IndexError:
-                print(f"fail for SEA{glider} M{mission}")
-        df_stats.to_csv("/home/pipeline/stats.csv", index=False)
+                new_rows.append({**future.result(), "version": stats_version})
+            except Exception as e:
+                _log.warning(f"fail for SEA{glider} M{mission}: {e}")
+    if not new_rows:
+        return
+    # recomputed missions replace their rows from an older version
+    df_stats = pd.concat((df_stats, pd.DataFrame(new_rows)), ignore_index=True)
+    df_stats = df_stats.drop_duplicates(["glider", "mission"], keep="last")
+    df_stats.sort_values(["glider", "mission"]).to_csv(stats_file, index=False)
+    _log.info(f"added {len(new_rows)} missions to {stats_file}")
 
 
 if __name__ == "__main__":
-    compute_glider_stats()
+    parser = argparse.ArgumentParser(description="compute sensor sampling periods for new complete missions")
+    parser.add_argument("--workers", type=int, default=8, help="Number of missions to read in parallel")
+    args = parser.parse_args()
+    logging.basicConfig(
+        filename="/data/log/mission_stats.log",
+        filemode="a",
+        format="%(asctime)s %(levelname)-8s %(message)s",
+        level=logging.INFO,
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+    compute_glider_stats(max_workers=args.workers)
@@ -1,18 +1,9 @@
 import pandas as pd
 import datetime
+from votoutils.utilities import job_state
 
-df = pd.read_csv("/home/pipeline/reprocess.csv", parse_dates=["proc_time"])
-
-dts = []
-for i, row in df.iterrows():
-    dur = row.duration
-    if "day" in dur:
-        dur = dur.split(" ")[-1]
-
-    hours, mins, secs = dur.split(":")
-    dt = datetime.timedelta(hours=int(hours), minutes=int(mins), seconds=int(secs[:2]))
-    dts.append(dt)
-df["dtime"] = dts
+df = job_state.jobs(kind="raw", status="done")
+df["dtime"] = pd.to_timedelta(df.duration, unit="s")
 
 print(f"Total time: {df.dtime.sum()}")
 print(df.dtime.describe())
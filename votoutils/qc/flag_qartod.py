@@ -7,6 +7,7 @@ from ioos_qc.streams import XarrayStream
 from ioos_qc.results import collect_results, CollectedResult
 import datetime
 import logging
+from concurrent.futures import ProcessPoolExecutor
 
 _log = logging.getLogger(__name__)
 
@@ -160,7 +161,7 @@ def apply_ioos_flags(ds, config):
     return flag_vals, proc_record
 
 
-def flag_ioos(ds):
+def flag_ioos(ds, max_workers=4):
     configs = get_configs()
     for config_name, config in configs.items():
         config[config_name]['qartod']['location_test'] = {'bbox': location_bbox_baltic}
@@ -171,12 +172,26 @@ def flag_ioos(ds):
             "fail_span": [0.3, 4.5],
         }
     configs = derive_configs(configs)
+    todo = {}
     for config_name, config in configs.items():
         if config_name not in list(ds.variables) + list(ds.coords):
             _log.warning(f"{config_name} not found in dataset")
             continue
-        # extract ioos flags for these variables
-        flags, comment = apply_ioos_flags(ds, config)
+        todo[config_name] = config
+    # extract ioos flags for these variables. The QARTOD tests are python loops that hold the GIL, so the
+    # independent configs are evaluated in worker processes, each sent only the variables its config tests.
+    # max_workers=1 runs sequentially in this process
+    if max_workers == 1:
+        results = {config_name: apply_ioos_flags(ds, config) for config_name, config in todo.items()}
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                config_name: executor.submit(apply_ioos_flags, ds[list(config.keys())], config)
+                for config_name, config in todo.items()
+            }
+            results = {config_name: future.result() for config_name, future in futures.items()}
+    for config_name, config in todo.items():
+        flags, comment = results[config_name]
         flagged_prop = 100 * sum(np.logical_and(flags > 1, flags < 9)) / len(flags)
         _log.info(f"Flagged {flagged_prop.round(3)} % of {config_name} as bad")
         # Apply flags and add comment
@@ -301,8 +316,8 @@ def flag_pilot(ds):
     return ds
 
 
-def flagger(ds):
-    ds = flag_ioos(ds)
+def flagger(ds, max_workers=4):
+    ds = flag_ioos(ds, max_workers=max_workers)
     ds = flag_oxygen(ds)
     ds = flag_pilot(ds)
     ds.attrs["processing_level"] = (
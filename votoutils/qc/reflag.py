@@ -0,0 +1,169 @@
+"""
+Re-apply QC flags to published timeseries without reprocessing. Opens an existing mission_timeseries.nc,
+runs flagger and overwrites only the *_qc variables and their attributes in place.
+Use after adding a qc: block to a mission yaml, or after changing thresholds in flag_qartod.get_configs
+"""
+
+import argparse
+import logging
+import pathlib
+from concurrent.futures import ProcessPoolExecutor
+import netCDF4
+import numpy as np
+import xarray as xr
+from votoutils.qc.flag_qartod import flagger
+from votoutils.utilities.geocode import flag_bad_locations
+from votoutils.utilities.utilities import missions_no_proc
+
+_log = logging.getLogger(__name__)
+
+l0_dir = pathlib.Path("/data/data_l0_pyglider")
+qc_fill_value = 127
+qc_int_attrs = ["valid_min", "valid_max", "flag_values"]
+# attributes managed by the netCDF writer rather than by flagger
+nc_keep_attrs = {"_FillValue", "coordinates"}
+
+
+def _timeseries_path(platform_serial, mission, kind):
+    infix = "nrt" if kind == "sub" else "complete_mission"
+    return l0_dir / infix / platform_serial / f"M{mission}" / "timeseries" / "mission_timeseries.nc"
+
+
+def _write_attrs(nc_var, attrs):
+    changed = False
+    for key in set(nc_var.ncattrs()) - set(attrs.keys()) - nc_keep_attrs:
+        nc_var.delncattr(key)
+        changed = True
+    for key, val in attrs.items():
+        if key in qc_int_attrs:
+            val = np.array(val).astype(np.int8)
+        if key in nc_var.ncattrs() and np.array_equal(nc_var.getncattr(key), val):
+            continue
+        nc_var.setncattr(key, val)
+        changed = True
+    return changed
+
+
+def reflag_timeseries(nc_path, max_workers=4):
+    """
+    Recompute QC flags for a processed timeseries and write the changed *_qc variables back in place.
+    Data variables are never rewritten. max_workers is passed to flagger. Returns a list of the qc variables
+    that changed
+    """
+    _log.info(f"re-flagging {nc_path}")
+    with xr.open_dataset(nc_path) as ds_in:
+        qc_vars = [var_name for var_name in list(ds_in) if var_name[-3:] == "_qc"]
+        ds = ds_in.drop_vars(qc_vars).load()
+    ds = flagger(ds, max_workers=max_workers)
+    # location flags are further refined in post-processing, repeat that step here
+    ds = flag_bad_locations(ds)
+    updated = []
+    with netCDF4.Dataset(nc_path, "a") as nc:
+        for var_name in list(ds):
+            if var_name[-3:] != "_qc":
+                continue
+            flags = np.around(ds[var_name].values).astype(np.int8)
+            if var_name not in nc.variables:
+                nc_var = nc.createVariable(
+                    var_name,
+                    "i1",
+                    ds[var_name].dims,
+                    fill_value=qc_fill_value,
+                )
+                nc_var[:] = flags
+                _write_attrs(nc_var, ds[var_name].attrs)
+                parent_name = var_name[:-3]
+                if parent_name in nc.variables and "coordinates" in nc[parent_name].ncattrs():
+                    nc_var.setncattr("coordinates", nc[parent_name].getncattr("coordinates"))
+                updated.append(var_name)
+                continue
+            nc_var = nc[var_name]
+            nc_var.set_auto_mask(False)
+            changed = False
+            if not np.array_equal(nc_var[:], flags):
+                nc_var[:] = flags
+                changed = True
+            if _write_attrs(nc_var, ds[var_name].attrs):
+                changed = True
+            if changed:
+                updated.append(var_name)
+        for key in ["processing_level", "disclaimer"]:
+            if key not in nc.ncattrs() or nc.getncattr(key) != ds.attrs[key]:
+                nc.setncattr(key, ds.attrs[key])
+    _log.info(f"updated {len(updated)} qc variables in {nc_path}: {updated}")
+    return updated
+
+
+def reflag_mission(platform_serial, mission, kind="raw", max_workers=4):
+    if kind not in ["raw", "sub"]:
+        raise ValueError("kind must be raw or sub")
+    nc_path = _timeseries_path(platform_serial, mission, kind)
+    if not nc_path.exists():
+        _log.warning(f"no timeseries found at {nc_path}. Skipping")
+        return []
+    return reflag_timeseries(nc_path, max_workers=max_workers)
+
+
+def reflag_fleet(kinds=("sub", "raw"), max_workers=4):
+    glidermissions = []
+    for kind in kinds:
+        infix = "nrt" if kind == "sub" else "complete_mission"
+        for nc_path in (l0_dir / infix).glob(
+            "*/M*/timeseries/mission_timeseries.nc",
+        ):
+            platform_serial = nc_path.parts[-4]
+            mission = int(nc_path.parts[-3][1:])
+            if (platform_serial, mission) in missions_no_proc:
+                _log.info(f"skipping {platform_serial, mission}")
+                continue
+            glidermissions.append((platform_serial, mission, kind))
+    _log.info(f"will re-flag {len(glidermissions)} datasets")
+    # missions are already flagged in parallel, so each one is flagged sequentially in its worker
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(reflag_mission, platform_serial, mission, kind, max_workers=1): (
+                platform_serial,
+                mission,
+                kind,
+            )
+            for platform_serial, mission, kind in glidermissions
+        }
+        for future, (platform_serial, mission, kind) in futures.items():
+            try:
+                future.result()
+            except Exception as e:
+                _log.error(f"failed to re-flag {platform_serial} M{mission} {kind}: {e}")
+    _log.info("Finished fleet re-flag")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="re-apply qc flags to processed timeseries netCDFs in place",
+    )
+    parser.add_argument("--glider", type=str, help="glider serial, e.g. SEA070. Defaults to all gliders")
+    parser.add_argument("--mission", type=int, help="Mission number, e.g. 23")
+    parser.add_argument(
+        "--kind",
+        type=str,
+        help="Kind of input. Can specify sub or raw. Defaults to both",
+    )
+    parser.add_argument("--workers", type=int, default=4, help="Number of missions to re-flag in parallel")
+    args = parser.parse_args()
+    if args.kind not in ["raw", "sub", None]:
+        raise ValueError("kind must be raw or sub")
+    logging.basicConfig(
+        filename="/data/log/reflag.log",
+        filemode="a",
+        format="%(asctime)s %(levelname)-8s %(message)s",
+        level=logging.INFO,
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+    kinds_in = [args.kind] if args.kind else ["sub", "raw"]
+    if args.glider:
+        glider = args.glider
+        if len(glider) < 4:
+            glider = f"SEA{str(glider).zfill(3)}"
+        for kind_in in kinds_in:
+            reflag_mission(glider, args.mission, kind_in)
+    else:
+        reflag_fleet(kinds=kinds_in, max_workers=args.workers)
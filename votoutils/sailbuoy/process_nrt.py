@@ -7,6 +7,7 @@ import xarray as xr
 from votoutils.utilities.geocode import locs_to_seas
 from votoutils.sailbuoy.sailbuoy_functions import get_attrs, clean_names_nrt, add_sensors
 from votoutils.utilities import vocabularies
+from votoutils.utilities.utilities import apply_encoding_profile
 
 
 _log = logging.getLogger(__name__)
@@ -128,6 +129,7 @@ def make_sailbuoy_ds(df, sb, mission):
     directory = Path(f"/data/sailbuoy/nrt/{ds.attrs['platform_serial']}")
     if not directory.exists():
         directory.mkdir(parents=True)
+    ds = apply_encoding_profile(ds, "nrt")
     ds.to_netcdf(directory / f"{ds.attrs['id']}.nc")
 
 
@@ -155,6 +157,7 @@ def make_sailbuoy_ds_legacy(df, sb, mission):
         "basin": basin_str,
     }
     ds.attrs = attrs
+    ds = apply_encoding_profile(ds, "nrt")
     ds.to_netcdf(f"/data/sailbuoy/nrt_proc/SB{sb}_M{mission}.nc")
 
 
@@ -6,6 +6,7 @@ import pynmea2
 import xarray as xr
 import logging
 from votoutils.utilities import utilities, vocabularies
+from votoutils.utilities.vocab_registry import get_registry
 _log = logging.getLogger(__name__)
 
 
@@ -41,19 +42,20 @@ clean_names_nrt = {
 }
 
 def add_sensors(ds, sensors):
+    registry = get_registry()
     for sensor_id, serial_dict in sensors.items():
         make_model = serial_dict['make_model']
         if make_model in ['Sailbuoy datalogger', 'Sailbuoy autopilot']:
             continue
-        if make_model not in vocabularies.sailbuoy_sensors_vocabs.keys():
+        if make_model not in registry.sailbuoy_sensors_vocabs.keys():
             _log.warning(f"could not find sensor {make_model} in vocabs dict. Skipping")
             continue
-        sensor_dict = vocabularies.sailbuoy_sensors_vocabs[make_model]
+        sensor_dict = registry.sailbuoy_sensor(make_model)
         for key, item in serial_dict.items():
             if key == "make_model":
                 continue
             sensor_dict[key] = item
-        ds.attrs[sensor_id] = str(sensor_dict)
+        ds.attrs[sensor_id] = str(dict(sensor_dict))
     return ds
 
 
@@ -808,6 +810,7 @@ def export_netcdf(output_dir, yml_dict):
     ds.attrs["variables"] = list(ds.variables)
     ds["trajectory"] = xr.DataArray(1, attrs={"cf_role": "trajectory_id"})
     outfile = output_dir / f"{ds.attrs['id']}.nc"
+    ds = utilities.apply_encoding_profile(ds, "erddap")
     ds.to_netcdf(outfile)
     _log.info(f'Wrote nc out to {outfile}')
     for var_name in ds.variables:
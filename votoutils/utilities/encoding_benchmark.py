@@ -0,0 +1,77 @@
+"""
+Compare the netCDF encoding profiles in utilities.encoding_profiles on real files. For each profile, reports
+file size, write time and the latency of the reads ERDDAP and the plotting scripts typically make: one day of
+a timeseries, or a block of profiles from a gridded file.
+
+python votoutils/utilities/encoding_benchmark.py /data/data_l0_pyglider/complete_mission/SEA070/M29/timeseries/mission_timeseries.nc
+"""
+import argparse
+import logging
+import tempfile
+import time
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import xarray as xr
+from votoutils.utilities.utilities import apply_encoding_profile, encoding_profiles
+
+_log = logging.getLogger(__name__)
+
+
+def typical_read(ds):
+    if "profile" in ds.dims:
+        start = ds.sizes["profile"] // 2
+        return ds.isel(profile=slice(start, start + 20))
+    if "time" in ds.dims and np.issubdtype(ds.time.dtype, np.datetime64):
+        start = ds.time.values[ds.sizes["time"] // 2]
+        return ds.sel(time=slice(start, start + np.timedelta64(1, "D")))
+    dim = list(ds.dims)[0]
+    start = ds.sizes[dim] // 2
+    return ds.isel({dim: slice(start, start + 20000)})
+
+
+def benchmark_file(nc_path, out_dir, repeats=3):
+    ds_in = xr.load_dataset(nc_path)
+    results = []
+    for profile in ["none"] + list(encoding_profiles.keys()):
+        ds = ds_in.copy()
+        if profile == "none":
+            for var in ds.variables.values():
+                for key in ["chunksizes", "zlib", "complevel", "compression", "shuffle", "preferred_chunks"]:
+                    var.encoding.pop(key, None)
+                var.encoding["contiguous"] = var.ndim > 0 and var.dtype.kind not in "OSU"
+        else:
+            ds = apply_encoding_profile(ds, profile)
+        outfile = Path(out_dir) / f"{profile}.nc"
+        start = time.perf_counter()
+        ds.to_netcdf(outfile)
+        write_seconds = time.perf_counter() - start
+        read_seconds = []
+        for i in range(repeats):
+            start = time.perf_counter()
+            with xr.open_dataset(outfile) as ds_read:
+                typical_read(ds_read).load()
+            read_seconds.append(time.perf_counter() - start)
+        results.append(
+            {
+                "file": Path(nc_path).name,
+                "profile": profile,
+                "size_mb": round(outfile.stat().st_size / 1e6, 2),
+                "write_s": round(write_seconds, 3),
+                "read_s": round(float(np.median(read_seconds)), 4),
+            },
+        )
+        outfile.unlink()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="benchmark netCDF encoding profiles on existing files")
+    parser.add_argument("files", nargs="+", help="netCDF files to benchmark, e.g. timeseries and gridded files")
+    parser.add_argument("--repeats", type=int, default=3, help="number of timed reads per file and profile")
+    args = parser.parse_args()
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for nc_file in args.files:
+            rows += benchmark_file(nc_file, tmp_dir, repeats=args.repeats)
+    print(pd.DataFrame(rows).to_string(index=False))
@@ -101,7 +101,7 @@ def update_ncs(glider, mission, sub_dir):
     root_dir = f"/data/data_l0_pyglider/{sub_dir}/SEA{str(glider)}/M{str(mission)}"
     _log.info(f"add basin to ncs in {root_dir}")
     nc_files = []
-    for sub in ("profiles", "timeseries", "gridfiles"):
+    for sub in ("profiles", "timeseries", "gridfiles", "gridfiles_coarse"):
         nc_files.append(list(pathlib.Path(root_dir).glob(f"**/{sub}/*.nc")))
     nc_files_flat = list(chain.from_iterable(nc_files))
     if not nc_files:
@@ -110,7 +110,7 @@ def update_ncs(glider, mission, sub_dir):
     gridfile_dir = pathlib.Path(
         f"/data/data_l0_pyglider/{sub_dir}/SEA{str(glider)}/M{str(mission)}/gridfiles",
     )
-    gridfile = list(gridfile_dir.glob("*.nc"))[0]
+    gridfile = gridfile_dir / "gridded.nc"
     basin = get_seas(gridfile)
     _log.info(f"Basin: {basin}")
     for nc in nc_files_flat:
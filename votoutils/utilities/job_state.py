@@ -0,0 +1,203 @@
+"""
+Pipeline job state in SQLite (WAL mode), one row per (platform_serial, mission, kind) with status, processing
+time, duration, input hash and number of attempts. Replaces /home/pipeline/reprocess.csv, which is imported
+the first time the store is opened. Advisory flock locks per mission, or per named job, let parallel workers
+and overlapping cron runs skip work that is already in progress. The kernel releases a lock if its process dies.
+"""
+import datetime
+import fcntl
+import hashlib
+import logging
+import os
+import sqlite3
+from contextlib import contextmanager
+from pathlib import Path
+import pandas as pd
+
+_log = logging.getLogger(__name__)
+
+state_db = Path("/home/pipeline/job_state.sqlite")
+lock_dir = Path("/home/pipeline/locks")
+legacy_csv = Path("/home/pipeline/reprocess.csv")
+
+schema = """
+CREATE TABLE IF NOT EXISTS jobs (
+    platform_serial TEXT NOT NULL,
+    mission INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    started TEXT,
+    proc_time TEXT,
+    duration REAL,
+    input_hash TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    PRIMARY KEY (platform_serial, mission, kind)
+);
+CREATE INDEX IF NOT EXISTS jobs_proc_time ON jobs (kind, proc_time);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status);
+"""
+
+
+def _now():
+    return datetime.datetime.now().isoformat(timespec="seconds")
+
+
+def connect(db_path=state_db):
+    con = sqlite3.connect(db_path, timeout=60)
+    con.row_factory = sqlite3.Row
+    con.execute("PRAGMA journal_mode=WAL")
+    con.executescript(schema)
+    if db_path == state_db and legacy_csv.exists() and not con.execute("SELECT 1 FROM jobs LIMIT 1").fetchone():
+        import_legacy_csv(con, legacy_csv)
+    return con
+
+
+def import_legacy_csv(con, csv_path):
+    df = pd.read_csv(csv_path)
+    df["proc_time"] = pd.to_datetime(df.proc_time, format="mixed")
+    rows = [
+        (
+            row.glider,
+            int(row.mission),
+            "raw",
+            "done",
+            row.proc_time.isoformat(timespec="seconds"),
+            pd.to_timedelta(row.duration).total_seconds(),
+        )
+        for row in df.itertuples()
+    ]
+    with con:
+        con.executemany(
+            "INSERT OR IGNORE INTO jobs (platform_serial, mission, kind, status, proc_time, duration) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+    _log.info(f"imported {len(rows)} jobs from {csv_path}")
+
+
+def get_job(platform_serial, mission, kind, db_path=state_db):
+    con = connect(db_path)
+    row = con.execute(
+        "SELECT * FROM jobs WHERE platform_serial=? AND mission=? AND kind=?",
+        (platform_serial, int(mission), kind),
+    ).fetchone()
+    con.close()
+    return dict(row) if row else None
+
+
+def start_job(platform_serial, mission, kind, input_hash=None, db_path=state_db):
+    con = connect(db_path)
+    with con:
+        con.execute(
+            "INSERT INTO jobs (platform_serial, mission, kind, status, started, input_hash, attempts) "
+            "VALUES (?, ?, ?, 'running', ?, ?, 1) "
+            "ON CONFLICT (platform_serial, mission, kind) DO UPDATE SET "
+            "status='running', started=excluded.started, input_hash=excluded.input_hash, "
+            "attempts=attempts + 1, error=NULL",
+            (platform_serial, int(mission), kind, _now(), input_hash),
+        )
+    con.close()
+
+
+def finish_job(platform_serial, mission, kind, duration, input_hash=None, db_path=state_db):
+    """
+    Mark a job done. duration is a datetime.timedelta or seconds. input_hash, if given, replaces the hash
+    recorded by start_job, e.g. when processing repaired or removed some input files
+    """
+    if hasattr(duration, "total_seconds"):
+        duration = duration.total_seconds()
+    con = connect(db_path)
+    with con:
+        con.execute(
+            "INSERT INTO jobs (platform_serial, mission, kind, status, proc_time, duration, input_hash) "
+            "VALUES (?, ?, ?, 'done', ?, ?, ?) "
+            "ON CONFLICT (platform_serial, mission, kind) DO UPDATE SET "
+            "status='done', proc_time=excluded.proc_time, duration=excluded.duration, "
+            "input_hash=COALESCE(excluded.input_hash, input_hash), error=NULL",
+            (platform_serial, int(mission), kind, _now(), duration, input_hash),
+        )
+    con.close()
+
+
+def fail_job(platform_serial, mission, kind, error, db_path=state_db):
+    """
+    Mark a job failed. A failure before start_job, which already counted the attempt of a running job, counts
+    as an attempt too
+    """
+    con = connect(db_path)
+    with con:
+        con.execute(
+            "INSERT INTO jobs (platform_serial, mission, kind, status, error, attempts) "
+            "VALUES (?, ?, ?, 'failed', ?, 1) "
+            "ON CONFLICT (platform_serial, mission, kind) DO UPDATE SET "
+            "attempts=attempts + (status != 'running'), status='failed', error=excluded.error",
+            (platform_serial, int(mission), kind, str(error)),
+        )
+    con.close()
+
+
+def can_retry(job, max_attempts):
+    """
+    True if a job failed, or was left running by a process that died, fewer than max_attempts times. A running
+    job is only considered dead if no process holds its mission lock
+    """
+    if job["attempts"] >= max_attempts:
+        return False
+    if job["status"] == "failed":
+        return True
+    if job["status"] == "running":
+        with mission_lock(job["platform_serial"], job["mission"], job["kind"]) as locked:
+            return locked
+    return False
+
+
+def jobs(kind=None, status=None, db_path=state_db):
+    """pandas DataFrame of jobs sorted by proc_time, optionally filtered by kind and status"""
+    query = "SELECT * FROM jobs WHERE 1=1"
+    args = []
+    if kind:
+        query += " AND kind=?"
+        args.append(kind)
+    if status:
+        query += " AND status=?"
+        args.append(status)
+    con = connect(db_path)
+    df = pd.read_sql_query(query + " ORDER BY proc_time", con, params=args, parse_dates=["started", "proc_time"])
+    con.close()
+    return df
+
+
+def input_hash(paths):
+    """Combined hash of input files, from their names, sizes and mtimes"""
+    sha = hashlib.sha256()
+    for path in sorted(str(path) for path in paths):
+        stat = os.stat(path)
+        sha.update(f"{Path(path).name};{stat.st_size};{stat.st_mtime}\n".encode())
+    return sha.hexdigest()
+
+
+@contextmanager
+def named_lock(name, blocking=False):
+    """
+    Advisory lock on /home/pipeline/locks/<name>.lock. Yields True if the lock was acquired, False if another
+    process holds it and blocking is False
+    """
+    lock_dir.mkdir(parents=True, exist_ok=True)
+    with open(lock_dir / f"{name}.lock", "a") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            lock_file.truncate(0)
+            lock_file.write(f"{os.getpid()} {_now()}\n")
+            lock_file.flush()
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def mission_lock(platform_serial, mission, kind, blocking=False):
+    return named_lock(f"{platform_serial}_M{mission}_{kind}", blocking=blocking)
@@ -0,0 +1,120 @@
+"""
+Columnar copy of a mission timeseries, written next to mission_timeseries.nc as a Parquet dataset partitioned
+by blocks of dives. Rows are sorted by time and Parquet keeps min/max statistics of every column per row
+group, so readers only touch the partitions, row groups and columns they ask for.
+"""
+import logging
+import shutil
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as pds
+
+_log = logging.getLogger(__name__)
+
+dives_per_partition = 50
+rows_per_group = 20000
+
+
+def mission_store_path(platform_serial, mission, kind):
+    infix = "nrt" if kind == "sub" else "complete_mission"
+    return Path(f"/data/data_l0_pyglider/{infix}/{platform_serial}/M{mission}/timeseries/mission_timeseries.parquet")
+
+
+def _column(da):
+    values = da.values
+    stored_dtype = np.dtype(da.encoding.get("dtype", values.dtype))
+    if values.dtype.kind != "f" or stored_dtype.kind not in "fiu":
+        return pa.array(values)
+    # store as the dtype planned for the netCDF, with missing values as nulls
+    missing = np.isnan(values)
+    if stored_dtype.kind in "iu":
+        values = np.where(missing, 0, values).round()
+    return pa.array(values.astype(stored_dtype), mask=missing)
+
+
+def write_mission_store(ds, store_path):
+    """
+    Write the 1D time variables of ds to a Parquet dataset at store_path, replacing any existing store
+    """
+    store_path = Path(store_path)
+    columns = {"time": pa.array(ds.time.values)}
+    for var_name in ds.variables:
+        if var_name == "time" or ds[var_name].dims != ("time",):
+            continue
+        columns[var_name] = _column(ds[var_name])
+    columns["dive_block"] = pa.array(
+        (np.nan_to_num(ds["dive_num"].values) // dives_per_partition * dives_per_partition).astype(np.int32),
+    )
+    table = pa.table(columns)
+    tmp_path = store_path.with_suffix(".tmp")
+    if tmp_path.exists():
+        shutil.rmtree(tmp_path)
+    pds.write_dataset(
+        table,
+        tmp_path,
+        format="parquet",
+        partitioning=pds.partitioning(pa.schema([("dive_block", pa.int32())]), flavor="hive"),
+        min_rows_per_group=rows_per_group,
+        max_rows_per_group=rows_per_group,
+    )
+    if store_path.exists():
+        shutil.rmtree(store_path)
+    tmp_path.rename(store_path)
+    _log.info(f"wrote columnar store {store_path}")
+
+
+def _open_store(store_path):
+    return pds.dataset(store_path, format="parquet", partitioning="hive")
+
+
+def profile_range(store_path):
+    """Min and max profile_num in the store, from the Parquet footers only"""
+    min_profile, max_profile = np.inf, -np.inf
+    for fragment in _open_store(store_path).get_fragments():
+        for row_group in fragment.row_groups:
+            stats = row_group.statistics.get("profile_num")
+            if not stats:
+                continue
+            min_profile = min(min_profile, stats["min"])
+            max_profile = max(max_profile, stats["max"])
+    return min_profile, max_profile
+
+
+def read_mission_store(store_path, columns=None, start=None, end=None, profiles=None):
+    """
+    Read from a mission store. Only the requested columns, and the partitions and row groups that can hold
+    matching rows, are read.
+    :param columns: variables to read, time is always included. Default all variables
+    :param start: optional start time, inclusive
+    :param end: optional end time, exclusive
+    :param profiles: optional (first, last) profile_num, inclusive
+    :return: pandas DataFrame indexed by time
+    """
+    dataset = _open_store(store_path)
+    if columns is not None:
+        columns = ["time"] + [col for col in columns if col != "time"]
+    condition = None
+    conditions = []
+    if start is not None:
+        conditions.append(pc.field("time") >= pd.Timestamp(start).to_datetime64())
+    if end is not None:
+        conditions.append(pc.field("time") < pd.Timestamp(end).to_datetime64())
+    if profiles is not None:
+        conditions.append(pc.field("profile_num") >= profiles[0])
+        conditions.append(pc.field("profile_num") <= profiles[1])
+    for expression in conditions:
+        condition = expression if condition is None else condition & expression
+    table = dataset.to_table(columns=columns, filter=condition)
+    df = table.to_pandas().sort_values("time").set_index("time")
+    if "dive_block" in df.columns:
+        df = df.drop(columns="dive_block")
+    return df
+
+
+def read_last_profiles(store_path, num_profiles, columns=None):
+    """Read the last num_profiles profiles of a mission store, e.g. for plotting recent data"""
+    min_profile, max_profile = profile_range(store_path)
+    return read_mission_store(store_path, columns=columns, profiles=(max_profile - num_profiles + 1, max_profile))
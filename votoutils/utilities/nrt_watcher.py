@@ -0,0 +1,111 @@
+"""
+Watch the nrt C-Csv directories for new glider files by polling their mtimes. A directory mtime changes when a
+file is created, renamed into place or removed, so one stat per mission is enough to notice an upload without
+listing or opening any file. Changes are debounced: a mission is handed on once its directory has been quiet
+for debounce seconds, or after max_wait seconds if files keep arriving.
+"""
+import datetime
+import logging
+import os
+import time
+from pathlib import Path
+from votoutils.utilities import raw_catalog
+
+_log = logging.getLogger(__name__)
+
+
+def dir_mtimes(root=raw_catalog.raw_dir):
+    """dict of (platform_serial, mission): mtime of every nrt C-Csv directory under root"""
+    mtimes = {}
+    for source, platform_serial, mission, files_dir in raw_catalog.mission_dirs(root, sources=("nrt",)):
+        try:
+            mtimes[(platform_serial, mission)] = os.stat(files_dir).st_mtime
+        except FileNotFoundError:
+            continue
+    return mtimes
+
+
+def latest_missions(mtimes):
+    """The highest mission number of each platform in mtimes"""
+    latest = {}
+    for platform_serial, mission in mtimes.keys():
+        latest[platform_serial] = max(mission, latest.get(platform_serial, mission))
+    return sorted(latest.items())
+
+
+def update_pending(pending, previous, current, now):
+    """
+    Record in pending the missions whose directory is new or changed between the previous and current scans.
+    pending maps (platform_serial, mission) to the times of the first and the latest change
+    """
+    for key, mtime in current.items():
+        if previous.get(key) == mtime:
+            continue
+        first_change = pending[key][0] if key in pending else now
+        pending[key] = (first_change, now)
+    return pending
+
+
+def pop_due(pending, now, debounce=60, max_wait=600):
+    """Remove and return, sorted, the missions that have been quiet for debounce seconds or waited max_wait"""
+    due = sorted(
+        key
+        for key, (first_change, last_change) in pending.items()
+        if now - last_change >= debounce or now - first_change >= max_wait
+    )
+    for key in due:
+        pending.pop(key)
+    return due
+
+
+def write_heartbeat(heartbeat_file, message):
+    """Replace the content of heartbeat_file with a single timestamped line"""
+    heartbeat_file = Path(heartbeat_file)
+    tmp_file = heartbeat_file.with_name(f".{heartbeat_file.name}.tmp")
+    with open(tmp_file, "w", encoding="utf-8") as fout:
+        fout.write(f"{datetime.datetime.now():%Y-%m-%d %H:%M:%S} {message}\n")
+    os.replace(tmp_file, heartbeat_file)
+
+
+def watch(
+    handler,
+    root=raw_catalog.raw_dir,
+    interval=10,
+    debounce=60,
+    max_wait=600,
+    heartbeat=3600,
+    heartbeat_file=None,
+    startup=True,
+):
+    """
+    Call handler(platform_serial, mission) for every nrt mission that received files, once its uploads are
+    debounced. With startup, the latest mission of each platform is handed on when the watcher starts, to pick
+    up files that arrived while it was not running. Errors in handler are logged and do not stop the watcher.
+    Every heartbeat seconds the watcher logs that it is alive and, if heartbeat_file is given, overwrites it with
+    the same line, so a monitor can check that file alone without other log lines following the heartbeat
+    """
+    previous = dir_mtimes(root)
+    pending = {}
+    if startup:
+        now = time.monotonic()
+        for key in latest_missions(previous):
+            pending[key] = (now - max_wait, now - debounce)
+    last_heartbeat = None
+    while True:
+        now = time.monotonic()
+        current = dir_mtimes(root)
+        update_pending(pending, previous, current, now)
+        previous = current
+        for platform_serial, mission in pop_due(pending, now, debounce=debounce, max_wait=max_wait):
+            _log.info(f"new files for {platform_serial} M{mission}")
+            try:
+                handler(platform_serial, mission)
+            except Exception as e:
+                _log.error(f"failed to process {platform_serial} M{mission}: {e}")
+        if last_heartbeat is None or now - last_heartbeat >= heartbeat:
+            message = f"watching {len(current)} nrt missions, {len(pending)} pending"
+            _log.info(message)
+            if heartbeat_file:
+                write_heartbeat(heartbeat_file, message)
+            last_heartbeat = now
+        time.sleep(interval)
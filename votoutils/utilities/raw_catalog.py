@@ -0,0 +1,346 @@
+"""
+Persistent SQLite catalog of the raw glider files under /data/data_raw. refresh_catalog only re-lists mission
+directories whose mtime changed since the last refresh and only hashes new or changed files, so pipeline
+scripts can query missions and files here instead of globbing and sorting the raw directories on every run.
+Files modified in place do not change their directory mtime. The newest dives of every mission are rechecked on
+each refresh, older files modified in place need refresh_catalog(full=True), e.g. from a nightly --full run.
+"""
+import argparse
+import hashlib
+import logging
+import os
+import sqlite3
+import time
+from pathlib import Path
+
+_log = logging.getLogger(__name__)
+
+raw_dir = Path("/data/data_raw")
+catalog_db = Path("/home/pipeline/raw_catalog.sqlite")
+sources = ("nrt", "complete_mission")
+
+schema = """
+CREATE TABLE IF NOT EXISTS missions (
+    source TEXT NOT NULL,
+    platform_serial TEXT NOT NULL,
+    mission INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    dir_mtime REAL,
+    PRIMARY KEY (source, platform_serial, mission)
+);
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    source TEXT NOT NULL,
+    platform_serial TEXT NOT NULL,
+    mission INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    file_type TEXT,
+    kind TEXT,
+    dive INTEGER,
+    size INTEGER,
+    mtime REAL,
+    hash TEXT,
+    cataloged REAL
+);
+CREATE INDEX IF NOT EXISTS files_mission ON files (source, platform_serial, mission, dive);
+CREATE INDEX IF NOT EXISTS files_cataloged ON files (cataloged);
+"""
+
+
+def connect(db_path=catalog_db):
+    con = sqlite3.connect(db_path, timeout=60)
+    con.execute("PRAGMA journal_mode=WAL")
+    con.executescript(schema)
+    return con
+
+
+def parse_raw_name(name):
+    """
+    File type, kind and dive number of a raw SeaExplorer file name, e.g. sea045.43.pld1.raw.12.gz gives
+    ("pld1", "raw", 12). Parts that are not found are None
+    """
+    parts = name.split(".")
+    file_type = None
+    kind = None
+    for part in parts[2:]:
+        if part == "gli" or part.startswith("pld"):
+            file_type = part
+        elif part in ["sub", "raw"]:
+            kind = part
+    dive = None
+    # dive number is the last part, or the one before a compression suffix, as in match_input_files
+    for part in parts[-1:-3:-1]:
+        if part.isdigit():
+            dive = int(part)
+            break
+    return file_type, kind, dive
+
+
+def file_hash(path, block_size=2**20):
+    sha = hashlib.sha256()
+    with open(path, "rb") as fin:
+        for block in iter(lambda: fin.read(block_size), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def _subdirs(path):
+    try:
+        return [entry for entry in os.scandir(path) if entry.is_dir()]
+    except FileNotFoundError:
+        return []
+
+
+def mission_dirs(root=raw_dir, sources=sources):
+    """
+    Yield source, platform_serial, mission and file directory of every mission under root. nrt files are in
+    nrt/SEA070/000029/C-Csv, complete mission files in complete_mission/SEA070/M29
+    """
+    for source in sources:
+        for platform_entry in _subdirs(Path(root) / source):
+            for mission_entry in _subdirs(platform_entry.path):
+                if source == "nrt" and mission_entry.name.isdigit():
+                    yield source, platform_entry.name, int(mission_entry.name), Path(mission_entry.path) / "C-Csv"
+                elif source == "complete_mission" and mission_entry.name[0] == "M" and mission_entry.name[1:].isdigit():
+                    yield source, platform_entry.name, int(mission_entry.name[1:]), Path(mission_entry.path)
+
+
+def _known_files(con, source, platform_serial, mission, newest_dives=None):
+    query = "SELECT path, size, mtime FROM files WHERE source=? AND platform_serial=? AND mission=?"
+    args = [source, platform_serial, mission]
+    if newest_dives:
+        query += (
+            " AND dive > (SELECT MAX(dive) FROM files WHERE source=? AND platform_serial=? AND mission=?) - ?"
+        )
+        args += [source, platform_serial, mission, newest_dives]
+    return {path: (size, mtime) for path, size, mtime in con.execute(query, args)}
+
+
+def _scan_mission(source, platform_serial, mission, files, known, hash_files):
+    """
+    Catalog rows for the files, (path, name) pairs, that are new or changed since known. Reads the disk only,
+    so hashing does not hold the catalog's write lock
+    """
+    rows = []
+    now = time.time()
+    for path, name in files:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        if known.get(path) == (stat.st_size, stat.st_mtime):
+            continue
+        file_type, kind, dive = parse_raw_name(name)
+        rows.append(
+            (
+                path,
+                source,
+                platform_serial,
+                mission,
+                name,
+                file_type,
+                kind,
+                dive,
+                stat.st_size,
+                stat.st_mtime,
+                file_hash(path) if hash_files else None,
+                now,
+            ),
+        )
+    return rows
+
+
+def refresh_catalog(db_path=catalog_db, root=raw_dir, full=False, hash_files=True, recheck_dives=2):
+    """
+    Bring the catalog up to date with the raw directories. Only mission directories whose mtime changed are
+    listed, unless full is True. Files written in place do not change their directory mtime, so in the other
+    missions the files of the newest recheck_dives dives, the ones that may still be uploading, are checked
+    for changes in size or mtime. Older files modified in place are only picked up with full=True.
+    Files are listed and hashed before the catalog is written in a single short transaction
+    """
+    con = connect(db_path)
+    known_missions = {
+        (source, platform_serial, mission): dir_mtime
+        for source, platform_serial, mission, dir_mtime in con.execute(
+            "SELECT source, platform_serial, mission, dir_mtime FROM missions",
+        )
+    }
+    seen = set()
+    file_rows = []
+    removed_files = []
+    mission_rows = []
+    added = 0
+    for source, platform_serial, mission, files_dir in mission_dirs(root):
+        key = (source, platform_serial, mission)
+        seen.add(key)
+        try:
+            dir_mtime = os.stat(files_dir).st_mtime
+        except FileNotFoundError:
+            dir_mtime = None
+        if not full and key in known_missions and known_missions[key] == dir_mtime:
+            if dir_mtime is not None and recheck_dives:
+                known = _known_files(con, source, platform_serial, mission, newest_dives=recheck_dives)
+                files = [(path, os.path.basename(path)) for path in known.keys()]
+                file_rows += _scan_mission(source, platform_serial, mission, files, known, hash_files)
+            continue
+        known = _known_files(con, source, platform_serial, mission)
+        try:
+            files = [(entry.path, entry.name) for entry in os.scandir(files_dir) if entry.is_file()]
+        except FileNotFoundError:
+            files = []
+        file_rows += _scan_mission(source, platform_serial, mission, files, known, hash_files)
+        found = {path for path, name in files}
+        added += len(found - set(known.keys()))
+        removed_files += [(path,) for path in set(known.keys()) - found]
+        mission_rows.append((source, platform_serial, mission, str(files_dir), dir_mtime))
+    gone_missions = list(set(known_missions.keys()) - seen)
+    with con:
+        con.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", file_rows)
+        con.executemany("DELETE FROM files WHERE path=?", removed_files)
+        con.executemany("INSERT OR REPLACE INTO missions VALUES (?, ?, ?, ?, ?)", mission_rows)
+        con.executemany("DELETE FROM missions WHERE source=? AND platform_serial=? AND mission=?", gone_missions)
+        con.executemany("DELETE FROM files WHERE source=? AND platform_serial=? AND mission=?", gone_missions)
+    con.close()
+    _log.info(
+        f"raw catalog refreshed: {added} new files, {len(file_rows) - added} changed, {len(removed_files)} removed",
+    )
+
+
+def missions(source="complete_mission", platform_serial=None, with_files_dir=False, db_path=catalog_db):
+    """
+    List of (platform_serial, mission) in the catalog, sorted. with_files_dir only returns missions whose
+    file directory exists, e.g. nrt missions with a C-Csv directory
+    """
+    query = "SELECT platform_serial, mission FROM missions WHERE source=?"
+    args = [source]
+    if platform_serial:
+        query += " AND platform_serial=?"
+        args.append(platform_serial)
+    if with_files_dir:
+        query += " AND dir_mtime IS NOT NULL"
+    con = connect(db_path)
+    rows = con.execute(query + " ORDER BY platform_serial, mission", args).fetchall()
+    con.close()
+    return rows
+
+
+def mission_files(platform_serial, mission, source="complete_mission", pattern="*", db_path=catalog_db):
+    """
+    Paths of the files of a mission whose name matches the glob pattern, sorted by dive number
+    """
+    con = connect(db_path)
+    rows = con.execute(
+        "SELECT path FROM files WHERE source=? AND platform_serial=? AND mission=? AND name GLOB ? "
+        "ORDER BY dive, name",
+        (source, platform_serial, mission, pattern),
+    ).fetchall()
+    con.close()
+    return [row[0] for row in rows]
+
+
+def matched_files(
+    platform_serial,
+    mission,
+    source="complete_mission",
+    gli_pattern="*gli*.gz",
+    pld_pattern="*pld1.raw*.gz",
+    db_path=catalog_db,
+):
+    """
+    gli and pld files of a mission for the dives that have both, sorted by dive number. Equivalent to
+    match_input_files on the naturally sorted globs
+    """
+    con = connect(db_path)
+    query = (
+        "SELECT path, dive FROM files WHERE source=? AND platform_serial=? AND mission=? AND name GLOB ? "
+        "AND dive IN (SELECT dive FROM files WHERE source=? AND platform_serial=? AND mission=? AND name GLOB ?) "
+        "ORDER BY dive, name"
+    )
+    gli_files = [
+        row[0]
+        for row in con.execute(
+            query,
+            (source, platform_serial, mission, gli_pattern, source, platform_serial, mission, pld_pattern),
+        )
+    ]
+    pld_files = [
+        row[0]
+        for row in con.execute(
+            query,
+            (source, platform_serial, mission, pld_pattern, source, platform_serial, mission, gli_pattern),
+        )
+    ]
+    con.close()
+    return gli_files, pld_files
+
+
+def split_dives(mission, dives):
+    """
+    Dives of a split upload, named with the mission number appended to the dive number of the first part, e.g.
+    sea061.48.pld1.raw.123448.gz next to sea061.48.pld1.raw.1234.gz. Numbers within the mission's regular
+    sequence of dives are never taken for split parts. Returns a dict of split part dive: first part dive
+    """
+    suffix = str(mission)
+    candidates = {
+        dive: int(str(dive)[: -len(suffix)])
+        for dive in dives
+        if str(dive).endswith(suffix) and len(str(dive)) > len(suffix) and int(str(dive)[: -len(suffix)]) in dives
+    }
+    regular = set(dives) - set(candidates)
+    last_regular = max(regular) if regular else 0
+    return {dive: base_dive for dive, base_dive in candidates.items() if dive > last_regular}
+
+
+def fragments(platform_serial, mission, source="complete_mission", db_path=catalog_db):
+    """
+    Groups of files of a mission that hold the same dive of the same file type and kind, e.g. a transfer that
+    arrived both compressed and uncompressed, or the parts of a split upload found by split_dives. Returns a list
+    of lists of paths
+    """
+    con = connect(db_path)
+    rows = con.execute(
+        "SELECT file_type, kind, dive, path FROM files WHERE source=? AND platform_serial=? AND mission=? "
+        "AND dive IS NOT NULL AND file_type IS NOT NULL ORDER BY file_type, kind, dive, name",
+        (source, platform_serial, mission),
+    ).fetchall()
+    con.close()
+    groups = {}
+    for file_type, kind, dive, path in rows:
+        groups.setdefault((file_type, kind, dive), []).append(path)
+    for dive, base_dive in split_dives(mission, {dive for file_type, kind, dive, path in rows}).items():
+        for file_type, kind, group_dive in list(groups.keys()):
+            if group_dive == dive and (file_type, kind, base_dive) in groups:
+                groups[(file_type, kind, base_dive)] += groups.pop((file_type, kind, dive))
+    return [paths for paths in groups.values() if len(paths) > 1]
+
+
+def files_since(timestamp, source=None, db_path=catalog_db):
+    """
+    Files first cataloged, or changed, after timestamp (seconds since epoch or datetime). Returns a list of
+    (platform_serial, mission, path) sorted by mission and dive
+    """
+    if hasattr(timestamp, "timestamp"):
+        timestamp = timestamp.timestamp()
+    query = "SELECT platform_serial, mission, path FROM files WHERE cataloged > ?"
+    args = [timestamp]
+    if source:
+        query += " AND source=?"
+        args.append(source)
+    con = connect(db_path)
+    rows = con.execute(query + " ORDER BY platform_serial, mission, dive, name", args).fetchall()
+    con.close()
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="refresh the catalog of raw glider files")
+    parser.add_argument("--full", action="store_true", help="re-list every mission directory")
+    args = parser.parse_args()
+    logging.basicConfig(
+        filename="/data/log/raw_catalog.log",
+        filemode="a",
+        format="%(asctime)s %(levelname)-8s %(message)s",
+        level=logging.INFO,
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+    refresh_catalog(full=args.full)
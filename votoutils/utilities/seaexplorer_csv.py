@@ -0,0 +1,81 @@
+"""
+Shared reader for SeaExplorer ;-separated gli and pld files, raw or sub, plain or gzipped. The column schema is
+built from the first line of each file, so polars never infers types: timestamp columns are read as strings and
+parsed in polars with a fixed format, all other columns as Float64.
+"""
+import gzip
+import polars as pl
+
+time_formats = {
+    "Timestamp": "%d/%m/%Y %H:%M:%S",
+    "PLD_REALTIMECLOCK": "%d/%m/%Y %H:%M:%S.%3f",
+}
+
+def is_time_column(name):
+    return "time" in name.lower() and name != "NOC_SAMPLE_TIME"
+
+
+def read_header(path):
+    opener = gzip.open if str(path).endswith(".gz") else open
+    with opener(path, "rt") as fin:
+        return tuple(fin.readline().rstrip("\r\n").split(";"))
+
+
+def column_schema(path):
+    """Column schema of a SeaExplorer file, built from its header"""
+    return {name: pl.String if is_time_column(name) else pl.Float64 for name in read_header(path)}
+
+
+def parse_time_columns(frame, strict=True):
+    """Parse Timestamp and PLD_REALTIMECLOCK string columns of a polars DataFrame or LazyFrame to Datetime"""
+    names = frame.collect_schema().names()
+    return frame.with_columns(
+        [
+            pl.col(name).str.strptime(pl.Datetime, format=time_format, strict=strict)
+            for name, time_format in time_formats.items()
+            if name in names
+        ],
+    )
+
+
+def scan_seaexplorer_csv(
+    path,
+    columns=None,
+    n_rows=None,
+    ignore_errors=False,
+    truncate_ragged_lines=False,
+    cast_numeric=True,
+    parse_time=True,
+    strict_time=True,
+):
+    """
+    Lazily scan a SeaExplorer csv.
+    :param columns: optional list of columns to read
+    :param n_rows: optional maximum number of rows to read
+    :param ignore_errors: set values that cannot be cast to Float64 to null instead of raising
+    :param cast_numeric: if False, every column is read as a string, e.g. to write the values back unchanged
+    :param parse_time: parse Timestamp or PLD_REALTIMECLOCK to Datetime, keeping the column name
+    :param strict_time: raise on timestamps that do not match the format, otherwise set them to null
+    :return: polars LazyFrame
+    """
+    schema = column_schema(path)
+    if not cast_numeric:
+        schema = {name: pl.String for name in schema.keys()}
+    lf = pl.scan_csv(
+        path,
+        separator=";",
+        schema=schema,
+        n_rows=n_rows,
+        ignore_errors=ignore_errors,
+        truncate_ragged_lines=truncate_ragged_lines,
+    )
+    if columns is not None:
+        lf = lf.select(columns)
+    if parse_time:
+        lf = parse_time_columns(lf, strict=strict_time)
+    return lf
+
+
+def read_seaexplorer_csv(path, **kwargs):
+    """Read a SeaExplorer csv to a polars DataFrame. Takes the same arguments as scan_seaexplorer_csv"""
+    return scan_seaexplorer_csv(path, **kwargs).collect()
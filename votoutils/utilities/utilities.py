@@ -1,13 +1,20 @@
 import re
 import numpy as np
-import pandas as pd
+import polars as pl
+import xarray as xr
 import logging
+import netCDF4
 import subprocess
 import datetime
+from pathlib import Path
 from votoutils.upload.sync_functions import sync_script_dir
+from votoutils.utilities.vocab_registry import get_registry
+from votoutils.utilities.seaexplorer_csv import scan_seaexplorer_csv
 
 _log = logging.getLogger(__name__)
 
+complete_mission_raw_dir = Path("/data/data_raw/complete_mission")
+
 
 def natural_sort(unsorted_list):
     convert = lambda text: int(text) if text.isdigit() else text.lower()  # noqa: E731
@@ -83,7 +90,16 @@ def encode_times_og1(ds):
     return ds
 
 
-def find_best_dtype(var_name, da):
+def needs_value_range(var_name, da, int_vars=()):
+    # variables that may be stored as integers, depending on the range of their values
+    if "latitude" in var_name.lower() or "longitude" in var_name.lower():
+        return False
+    if var_name[-2:].lower() == "qc" or "time" in var_name.lower():
+        return False
+    return var_name[-3:] == "raw" or var_name in int_vars or "int" in str(da.dtype.type)
+
+
+def find_best_dtype(var_name, da, value_range=None, int_vars=()):
     input_dtype = da.dtype.type
     if "latitude" in var_name.lower() or "longitude" in var_name.lower():
         return np.double
@@ -91,10 +107,13 @@ def find_best_dtype(var_name, da):
         return np.int8
     if "time" in var_name.lower():
         return input_dtype
-    if var_name[-3:] == "raw" or "int" in str(input_dtype):
-        if np.nanmax(da.values) < 2**16 / 2:
+    if needs_value_range(var_name, da, int_vars=int_vars):
+        if value_range is None:
+            value_range = (da.min().values, da.max().values)
+        min_val, max_val = value_range
+        if -(2**16 / 2) <= min_val and max_val < 2**16 / 2:
             return np.int16
-        elif np.nanmax(da.values) < 2**32 / 2:
+        elif -(2**32 / 2) <= min_val and max_val < 2**32 / 2:
             return np.int32
     if input_dtype == np.float64:
         return np.float32
@@ -106,52 +125,152 @@ def set_fill_value(new_dtype):
     return fill_val
 
 
-def set_best_dtype(ds):
-    bytes_in = ds.nbytes
-    for var_name in list(ds):
-        da = ds[var_name]
-        input_dtype = da.dtype.type
+def plan_best_dtypes(ds, var_names=None, int_vars=()):
+    """
+    Choose the storage dtype of each variable. The value ranges needed to decide on integer dtypes are
+    reduced together, so dask-backed datasets are read only once.
+    :param int_vars: names of float variables that hold integer values, e.g. nav_state
+    :return: dict of variable name to dtype
+    """
+    if var_names is None:
+        var_names = list(ds)
+    range_vars = [var_name for var_name in var_names if needs_value_range(var_name, ds[var_name], int_vars)]
+    ranges = xr.Dataset()
+    for var_name in range_vars:
+        ranges[f"{var_name}:min"] = ds[var_name].min()
+        ranges[f"{var_name}:max"] = ds[var_name].max()
+    ranges = ranges.compute()
+    plan = {}
+    for var_name in var_names:
+        value_range = None
+        if var_name in range_vars:
+            value_range = (ranges[f"{var_name}:min"].values, ranges[f"{var_name}:max"].values)
+        plan[var_name] = find_best_dtype(var_name, ds[var_name], value_range=value_range, int_vars=int_vars)
+    return plan
+
+
+def set_best_da_dtype(var_name, da, new_dtype=None):
+    """
+    Encode da to be written with the dtype chosen by find_best_dtype, with valid_min and valid_max cast to match.
+    Only the netCDF encoding is changed: data are cast when written, with NaN stored as _FillValue for
+    integer dtypes, so no copy of the data is made
+    """
+    input_dtype = da.dtype.type
+    if new_dtype is None:
         new_dtype = find_best_dtype(var_name, da)
-        for att in ["valid_min", "valid_max"]:
-            if att in da.attrs.keys():
-                da.attrs[att] = np.array(da.attrs[att]).astype(new_dtype)
-        if new_dtype == input_dtype:
-            continue
-        _log.debug(f"{var_name} input dtype {input_dtype} change to {new_dtype}")
-        da_new = da.astype(new_dtype)
-        ds = ds.drop_vars(var_name)
-        if "int" in str(new_dtype):
-            fill_val = set_fill_value(new_dtype)
-            da_new[np.isnan(da)] = fill_val
-            da_new.encoding["_FillValue"] = fill_val
-        ds[var_name] = da_new
-    bytes_out = ds.nbytes
+    for att in ["valid_min", "valid_max"]:
+        if att in da.attrs.keys():
+            da.attrs[att] = np.array(da.attrs[att]).astype(new_dtype)
+    if new_dtype == input_dtype:
+        return da
+    _log.debug(f"{var_name} input dtype {input_dtype} change to {new_dtype}")
+    da.encoding["dtype"] = np.dtype(new_dtype)
+    if "int" in str(new_dtype):
+        da.encoding["_FillValue"] = set_fill_value(new_dtype)
+    return da
+
+
+def set_best_dtype(ds, var_names=None, int_vars=()):
+    plan = plan_best_dtypes(ds, var_names=var_names, int_vars=int_vars)
+    bytes_in = ds.nbytes
+    bytes_out = bytes_in
+    for var_name, new_dtype in plan.items():
+        da = set_best_da_dtype(var_name, ds[var_name], new_dtype=new_dtype)
+        bytes_out -= da.nbytes - da.size * np.dtype(da.encoding.get("dtype", da.dtype)).itemsize
     _log.info(
         f"Space saved by dtype downgrade: {int(100 * (bytes_in - bytes_out) / bytes_in)} %",
     )
     return ds
 
 
-def sensor_sampling_period(glider, mission):
-    # Get sampling period of CTD in seconds for a given glider mission
-    fn = f"/data/data_raw/complete_mission/SEA{glider}/M{mission}/sea{str(glider).zfill(3)}.{mission}.pld1.raw.10.gz"
-    df = pd.read_csv(fn, sep=";", dayfirst=True, parse_dates=["PLD_REALTIMECLOCK"])
-    if "LEGATO_TEMPERATURE" in list(df):
-        df_ctd = df.dropna(subset=["LEGATO_TEMPERATURE"])
-    else:
-        df_ctd = df.dropna(subset=["GPCTD_TEMPERATURE"])
-    ctd_seconds = df_ctd["PLD_REALTIMECLOCK"].diff().median().microseconds / 1e6
-
-    if "AROD_FT_DO" in list(df):
-        df_oxy = df.dropna(subset=["AROD_FT_DO"])
-    else:
-        df_oxy = df.dropna(subset=["LEGATO_CODA_DO"])
-    oxy_seconds = df_oxy["PLD_REALTIMECLOCK"].diff().median().microseconds / 1e6
+# netCDF encoding profiles. nrt files are rewritten every few hours, so they favour write speed. erddap files
+# are read by time range and plotted by profile, so chunks match those reads, using zlib that netcdf-java can
+# read. archive files favour size. Float variables with declared significant digits are quantized with
+# quantize_mode before compression
+encoding_profiles = {
+    "nrt": {
+        "compression": "zlib",
+        "complevel": 1,
+        "shuffle": True,
+        "quantize_mode": "GranularBitRound",
+        "chunks": {"time": 4096, "N_MEASUREMENTS": 4096, "profile": 16},
+    },
+    "erddap": {
+        "compression": "zlib",
+        "complevel": 4,
+        "shuffle": True,
+        "quantize_mode": "GranularBitRound",
+        "chunks": {"time": 32768, "N_MEASUREMENTS": 32768, "profile": 64},
+    },
+    "archive": {
+        "compression": "zstd" if netCDF4.__has_zstandard_support__ else "zlib",
+        "complevel": 6,
+        "shuffle": True,
+        "quantize_mode": "GranularBitRound",
+        "chunks": {"time": 262144, "N_MEASUREMENTS": 262144, "profile": 256},
+    },
+}
+
+
+def apply_encoding_profile(ds, profile):
+    """
+    Set the compression and chunking encoding of every variable in ds from encoding_profiles[profile].
+    Dimensions not named in the profile, e.g. depth, are kept whole in each chunk. Scalar and string
+    variables are left uncompressed. Float variables with significant digits declared in their attributes or
+    in vocabularies.significant_digits are quantized, netCDF records this in a _Quantize* attribute
+    """
+    settings = encoding_profiles[profile]
+    registry = get_registry()
+    for var_name, var in ds.variables.items():
+        for key in [
+            "chunksizes",
+            "contiguous",
+            "zlib",
+            "complevel",
+            "compression",
+            "shuffle",
+            "preferred_chunks",
+            "significant_digits",
+            "quantize_mode",
+        ]:
+            var.encoding.pop(key, None)
+        if var.ndim == 0 or var.size == 0 or var.dtype.kind in "OSU":
+            continue
+        digits = var.attrs.get("significant_digits", registry.variable_significant_digits(var_name))
+        stored_kind = np.dtype(var.encoding.get("dtype", var.dtype)).kind
+        if digits and var.dtype.kind == "f" and stored_kind == "f":
+            var.encoding["significant_digits"] = int(digits)
+            var.encoding["quantize_mode"] = settings["quantize_mode"]
+        var.encoding["compression"] = settings["compression"]
+        var.encoding["complevel"] = settings["complevel"]
+        var.encoding["shuffle"] = settings["shuffle"]
+        var.encoding["chunksizes"] = tuple(
+            min(size, settings["chunks"].get(dim, size)) for dim, size in zip(var.dims, var.shape)
+        )
+    return ds
+
+
+def _median_period(df, sensor_col):
+    times = df.filter(pl.col(sensor_col).is_not_null())["time"]
+    if len(times) < 2:
+        return np.nan
+    return times.diff().median().total_seconds()
+
+
+def sensor_sampling_period(glider, mission, max_rows=20000):
+    # Get sampling period of CTD and oxygen sensor in seconds for a given glider mission. Only reads the clock
+    # and sensor columns of the first max_rows lines of dive 10
+    fn = complete_mission_raw_dir / f"SEA{glider}/M{mission}/sea{str(glider).zfill(3)}.{mission}.pld1.raw.10.gz"
+    lf = scan_seaexplorer_csv(fn, n_rows=max_rows, ignore_errors=True, strict_time=False)
+    columns = lf.collect_schema().names()
+    ctd_col = "LEGATO_TEMPERATURE" if "LEGATO_TEMPERATURE" in columns else "GPCTD_TEMPERATURE"
+    oxy_col = "AROD_FT_DO" if "AROD_FT_DO" in columns else "LEGATO_CODA_DO"
+    df = lf.select(pl.col("PLD_REALTIMECLOCK").alias("time"), pl.col(ctd_col), pl.col(oxy_col)).collect()
     sample_dict = {
         "glider": glider,
         "mission": mission,
-        "ctd_period": ctd_seconds,
-        "oxy_period": oxy_seconds,
+        "ctd_period": _median_period(df, ctd_col),
+        "oxy_period": _median_period(df, oxy_col),
     }
     return sample_dict
 
@@ -0,0 +1,89 @@
+"""
+Manifest of raw file validation results, shared by the cleaning passes that run before pyglider processing.
+Each file is recorded with its size, mtime in integer nanoseconds and sha256 per check, along with the verdict
+of the check. Files that are unchanged since they were last validated are skipped, new or changed files are
+validated on a thread pool.
+"""
+import datetime
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import pandas as pd
+from votoutils.utilities.raw_catalog import file_hash
+
+_log = logging.getLogger(__name__)
+
+manifest_dir = Path("/home/pipeline/validation_manifests")
+manifest_columns = ["path", "check", "size", "mtime_ns", "hash", "verdict", "checked"]
+
+
+def manifest_path(in_dir):
+    name = str(Path(in_dir).absolute()).strip("/").replace("/", "_")
+    return manifest_dir / f"{name}.csv"
+
+
+def read_manifest(manifest_file):
+    if not Path(manifest_file).exists():
+        return pd.DataFrame(columns=manifest_columns)
+    return pd.read_csv(manifest_file, dtype={"mtime_ns": "Int64"})
+
+
+def write_manifest(manifest_file, records):
+    manifest_file = Path(manifest_file)
+    manifest_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = manifest_file.with_suffix(".tmp")
+    df = pd.DataFrame(records, columns=manifest_columns)
+    # rows from an older manifest have no mtime_ns, keep the column integer rather than float
+    df["mtime_ns"] = pd.array([record.get("mtime_ns") for record in records], dtype="Int64")
+    df.sort_values(["check", "path"]).to_csv(tmp_file, index=False)
+    tmp_file.rename(manifest_file)
+
+
+def validate_files(file_paths, check, validator, manifest_file, max_workers=8):
+    """
+    Run validator on every file in file_paths that has not already been validated for check in its
+    current state. validator takes a path and returns a verdict, e.g. "ok", "repaired" or "deleted".
+    Files that are identical to when they were last validated are skipped, even if their mtime changed
+    :return: dict of path: verdict for the files that were validated on this call
+    """
+    records = {(row["path"], row["check"]): row for row in read_manifest(manifest_file).to_dict("records")}
+    to_check = {}
+    for path in file_paths:
+        path = str(path)
+        stat = os.stat(path)
+        previous = records.get((path, check))
+        # integer nanoseconds, a float mtime does not survive the csv round trip exactly
+        if previous and previous["size"] == stat.st_size and previous.get("mtime_ns") == stat.st_mtime_ns:
+            continue
+        digest = file_hash(path)
+        if previous and previous["hash"] == digest:
+            previous["size"] = stat.st_size
+            previous["mtime_ns"] = stat.st_mtime_ns
+            continue
+        to_check[path] = (stat.st_size, stat.st_mtime_ns, digest)
+    _log.info(f"{check}: validating {len(to_check)} new or changed files")
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        verdicts = dict(zip(to_check, executor.map(validator, to_check.keys())))
+    now = datetime.datetime.now().isoformat(timespec="seconds")
+    for path, verdict in verdicts.items():
+        if not os.path.exists(path):
+            records.pop((path, check), None)
+            continue
+        stat = os.stat(path)
+        size, mtime_ns, digest = to_check[path]
+        if (stat.st_size, stat.st_mtime_ns) != (size, mtime_ns):
+            # the validator repaired the file
+            digest = file_hash(path)
+        records[(path, check)] = {
+            "path": path,
+            "check": check,
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "hash": digest,
+            "verdict": verdict,
+            "checked": now,
+        }
+    records = [record for record in records.values() if os.path.exists(record["path"])]
+    write_manifest(manifest_file, records)
+    return verdicts
@@ -0,0 +1,69 @@
+"""
+Read-only compiled view of votoutils.utilities.vocabularies. The vocabularies are copied and frozen the
+first time the registry is requested. Lookups return copy-on-write views: callers can add or overwrite keys
+on a view, e.g. a sensor serial number, without changing the registry, so converters running concurrently
+can share it without defensive deep copies.
+"""
+import copy
+from collections import ChainMap
+from functools import lru_cache
+from types import MappingProxyType
+
+
+def _freeze(vocab):
+    return MappingProxyType({key: MappingProxyType(copy.deepcopy(val)) for key, val in vocab.items()})
+
+
+def _normalise_uri(uri):
+    return uri.strip().replace("https://", "http://").rstrip("/")
+
+
+class VocabularyRegistry:
+    def __init__(self):
+        from votoutils.utilities import vocabularies
+
+        self.standard_names = MappingProxyType(dict(vocabularies.standard_names))
+        self.vocab_attrs = _freeze(vocabularies.vocab_attrs)
+        self.sensor_vocabs = _freeze(vocabularies.sensor_vocabs)
+        self.sailbuoy_sensors_vocabs = _freeze(vocabularies.sailbuoy_sensors_vocabs)
+        self.significant_digits = MappingProxyType(dict(vocabularies.significant_digits))
+        uri_names = {}
+        for name, attrs in self.vocab_attrs.items():
+            if "vocabulary" in attrs.keys():
+                uri_names.setdefault(_normalise_uri(attrs["vocabulary"]), name)
+        self._uri_names = MappingProxyType(uri_names)
+        sensor_types = {}
+        for make_model, attrs in self.sensor_vocabs.items():
+            sensor_types.setdefault(attrs["sensor_type"], []).append(make_model)
+        self._sensor_types = MappingProxyType({key: tuple(val) for key, val in sensor_types.items()})
+
+    def attrs(self, name):
+        """Copy-on-write view of the variable attributes for OG1 name"""
+        return ChainMap({}, self.vocab_attrs[name])
+
+    def sensor(self, make_model):
+        """Copy-on-write view of the glider sensor attributes for make_model"""
+        return ChainMap({}, self.sensor_vocabs[make_model])
+
+    def sailbuoy_sensor(self, make_model):
+        """Copy-on-write view of the sailbuoy sensor attributes for make_model"""
+        return ChainMap({}, self.sailbuoy_sensors_vocabs[make_model])
+
+    def name_from_uri(self, uri):
+        """OG1 variable name for a vocabulary URI, e.g. a P01 or OG1 collection link. None if not found"""
+        return self._uri_names.get(_normalise_uri(uri))
+
+    def variable_significant_digits(self, var_name):
+        """Significant digits declared for a pyglider or OG1 variable name. None if not declared"""
+        if var_name in self.significant_digits.keys():
+            return self.significant_digits[var_name]
+        return self.significant_digits.get(self.standard_names.get(var_name))
+
+    def make_models(self, sensor_type):
+        """All glider sensor make_models of sensor_type, e.g. CTD"""
+        return self._sensor_types.get(sensor_type, ())
+
+
+@lru_cache(maxsize=None)
+def get_registry():
+    return VocabularyRegistry()
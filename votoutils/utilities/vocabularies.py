@@ -409,6 +409,25 @@ vocab_attrs = {
 }
 
 
+# Significant digits worth keeping for each variable, set by sensor resolution. Writers quantize values to this
+# precision before compression. Keys are OG1 names, or pyglider names for variables without one. A
+# significant_digits attribute on a variable, e.g. from the deployment yaml, takes precedence
+significant_digits = {
+    "CHLA": 3,
+    "FLUOCHLA": 4,
+    "BBP700": 3,
+    "TURB": 3,
+    "CDOM": 3,
+    "PHYC": 3,
+    "PHYCOCYANIN": 3,
+    "DOXY": 4,
+    "ED380": 4,
+    "ED490": 4,
+    "DPAR": 4,
+    "oxygen_phase": 4,
+}
+
+
 sensor_vocabs = {
     "RBR legato CTD": {
         "sensor_type": "CTD",